@@ -1,17 +1,28 @@
 # agent.py
 import os
+import asyncio
 import logging
 import json
-from typing import List, Dict, Any, Optional, TypedDict, Annotated
+from typing import List, Dict, Any, Optional, Tuple, TypedDict, Annotated, Awaitable, Callable
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, AIMessage, ToolMessage, SystemMessage
 from langchain_core.tools import Tool, tool
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, START, END
+from langgraph.constants import TAG_NOSTREAM
 from langgraph.graph.message import add_messages
-from langgraph.prebuilt import ToolNode  # Import ToolNode
+from langgraph.prebuilt import ToolNode, InjectedState  # Import ToolNode
+from langgraph.prebuilt.tool_node import TOOL_CALL_ERROR_TEMPLATE
 from langgraph.checkpoint.memory import MemorySaver
 
+from context import build_context
+from documents import describe_changes, parse_patches, apply_patches, PatchError, FULL_REWRITE
+from llm_cache import create_llm_cache, bypass_llm_cache
+from providers import create_chat_model
+from metrics import timed, record_llm_exchange, GRAPH_NODE_SECONDS, LLM_CALL_SECONDS
+from concurrency import PriorityLimiter, LLMOverloadedError, INTERACTIVE, BATCH
+from resilience import ResilientCaller, CircuitBreaker, CircuitOpenError, TRANSIENT_ERRORS
+
 # Set up logger
 logger = logging.getLogger(__name__)
 
@@ -27,33 +38,78 @@ class AgentState(TypedDict):
     personal_summary: str
     optimized_resume: str
     cover_letter: str
+    # Running summary of older turns and the message_key of the last message it covers
+    conversation_summary: str
+    summarized_through: str
 
 
 # Tool definitions with improved error handling and logging
-@tool
-def update_resume(resume: str, feedback: str) -> str:
+def _patch_prompt(document_label: str, document: str, feedback: str) -> str:
+    return f"""
+    You are editing a {document_label}. Apply the feedback below by replying with SEARCH/REPLACE blocks only.
+    
+    Current {document_label.title()}:
+    {document}
+    
+    Feedback/Instructions:
+    {feedback}
+    
+    Format every edit as:
+    <<<<<<< SEARCH
+    exact lines copied from the current {document_label}
+    =======
+    the lines that replace them
+    >>>>>>> REPLACE
+    
+    Copy SEARCH text exactly, including punctuation, and include just enough lines to make it unique.
+    Use as many blocks as needed and nothing else. If the feedback requires rewriting most of the
+    {document_label}, reply with only the word {FULL_REWRITE}.
+    """
+
+
+async def _patch_document(document_label: str, document: str, feedback: str) -> Optional[str]:
+    """Try to apply feedback as local patches; None if the edit needs a full regeneration"""
+    if DOCUMENT_EDIT_MODE != "patch" or not document.strip():
+        return None
+    
+    # The plain chat model is used so the reply is text, not a tool call
+    response = await invoke_llm(patch_model, [HumanMessage(content=_patch_prompt(document_label, document, feedback))])
+    try:
+        patches = parse_patches(response.content)
+        updated = apply_patches(document, patches)
+    except PatchError as e:
+        logger.info("Falling back to full regeneration of the %s: %s", document_label, e)
+        return None
+    
+    logger.info("Applied %s patches to the %s", len(patches), document_label)
+    return updated
+
+
+@tool(response_format="content_and_artifact")
+async def update_resume(feedback: str, state: Annotated[dict, InjectedState]) -> Tuple[str, Dict[str, str]]:
     """
     Updates the resume based on user feedback.
     
     Args:
-        resume: The current resume text
         feedback: User's feedback or instructions for updating the resume
         
     Returns:
         Updated resume text
     """
-    logger.info(f"Executing update_resume tool with resume length {len(resume)} and feedback '{feedback}'")
-    
-    # Handle case when resume is not a string
-    if not isinstance(resume, str):
-        logger.warning(f"Expected string for resume but got {type(resume)}")
-        resume = str(resume)
+    # The current resume comes from the graph state, so the model never has to repeat it
+    resume = state.get("optimized_resume") or state.get("resume") or ""
+    logger.info("Executing update_resume tool with resume length %d and feedback length %d", len(resume), len(str(feedback)))
     
     # Handle case when feedback is not a string
     if not isinstance(feedback, str):
-        logger.warning(f"Expected string for feedback but got {type(feedback)}")
+        logger.warning("Expected string for feedback but got %s", type(feedback))
         feedback = str(feedback)
     
+    # Small edits are patched; the result scales with the change, not the document
+    result = await _patch_document("resume", resume, feedback)
+    if result is not None:
+        return result, {"previous": resume}
+    
     prompt = f"""
     You are a resume optimization expert. Your task is to update the following resume based on the feedback provided.
     
@@ -67,50 +123,43 @@ def update_resume(resume: str, feedback: str) -> str:
     """
     
     # Use direct model invocation to avoid dependency on parent_run_id
-    try:
-        # Fix: Use HumanMessage instead of SystemMessage
-        logger.info(f"Prompt: {prompt}")
-        response = llm.invoke([HumanMessage(content=prompt)])
-        logger.info(f"Resume updated successfully, result: {response.content[:100]}")
-        result = response.content.strip("`")
-        logger.info(f"Resume updated successfully, result length: {len(result)}")
+    # Fix: Use HumanMessage instead of SystemMessage
+    logger.debug("Resume update prompt: %s", prompt)
+    response = await invoke_llm(llm, [HumanMessage(content=prompt)])
+    result = response.content.strip("`")
+    logger.info("Resume updated successfully, result length: %s", len(result))
+    
+    # Ensure we're returning a non-empty string; raising leaves the resume unchanged
+    if not result or len(result.strip()) == 0:
+        logger.error("Got empty result from LLM")
+        raise ValueError("Unable to update resume. Please try again with different instructions.")
         
-        # Ensure we're returning a non-empty string
-        if not result or len(result.strip()) == 0:
-            logger.error("Got empty result from LLM")
-            return "Error: Unable to update resume. Please try again with different instructions."
-            
-        return result
-    except Exception as e:
-        logger.error(f"Error during resume update: {str(e)}", exc_info=True)
-        error_message = f"Error updating resume: {str(e)}"
-        return error_message
+    return result, {"previous": resume}
 
 
-@tool
-def update_cover_letter(cover_letter: str, feedback: str) -> str:
+@tool(response_format="content_and_artifact")
+async def update_cover_letter(feedback: str, state: Annotated[dict, InjectedState]) -> Tuple[str, Dict[str, str]]:
     """
     Updates the cover letter based on user feedback.
     
     Args:
-        cover_letter: The current cover letter text
         feedback: User's feedback or instructions for updating the cover letter
         
     Returns:
         Updated cover letter text
     """
     logger.info("Updating cover letter with feedback")
-    
-    # Handle case when cover_letter is not a string
-    if not isinstance(cover_letter, str):
-        logger.warning(f"Expected string for cover_letter but got {type(cover_letter)}")
-        cover_letter = str(cover_letter)
+    cover_letter = state.get("cover_letter") or ""
     
     # Handle case when feedback is not a string
     if not isinstance(feedback, str):
-        logger.warning(f"Expected string for feedback but got {type(feedback)}")
+        logger.warning("Expected string for feedback but got %s", type(feedback))
         feedback = str(feedback)
     
+    result = await _patch_document("cover letter", cover_letter, feedback)
+    if result is not None:
+        return result, {"previous": cover_letter}
+    
     prompt = f"""
     You are a cover letter writing expert. Your task is to update the following cover letter based on the feedback provided.
     
@@ -124,29 +173,117 @@ def update_cover_letter(cover_letter: str, feedback: str) -> str:
     """
     
     # Use direct model invocation to avoid dependency on parent_run_id
-    try:
-        response = llm.invoke([HumanMessage(content=prompt)])
-        logger.info("Cover letter updated successfully")
-        return response.content.strip("`")
-    except Exception as e:
-        logger.error(f"Error during cover letter update: {str(e)}", exc_info=True)
-        return f"Error updating cover letter: {str(e)}"
+    response = await invoke_llm(llm, [HumanMessage(content=prompt)])
+    result = response.content.strip("`")
+    logger.info("Cover letter updated successfully, result length: %s", len(result))
+    
+    # Raising leaves the cover letter unchanged
+    if not result.strip():
+        logger.error("Got empty result from LLM")
+        raise ValueError("Unable to update cover letter. Please try again with different instructions.")
+    
+    return result, {"previous": cover_letter}
 
 
 # Create tools list for LangGraph
 tools = [update_resume, update_cover_letter]
 
-# Initialize Gemini model with tools support
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.0-flash",   
-    google_api_key=os.getenv("GOOGLE_API_KEY"),
-    temperature=0.7,
-    convert_system_message_to_human=True,
-).bind_tools(tools)
+# Cache of model responses keyed by model, parameters, bound tools and messages
+llm_cache = create_llm_cache()
+
+# Chat model selected by LLM_PROVIDER: Gemini, or a local fake for benchmarks and offline runs
+chat_model = create_chat_model(cache=llm_cache)
+
+# Chat model with tools support
+llm = chat_model.bind_tools(tools)
+
+# Patch blocks are an internal format, so their tokens are kept out of streamed replies
+patch_model = chat_model.with_config(tags=[TAG_NOSTREAM])
+
+# Every model call goes through this limiter: at most LLM_MAX_CONCURRENCY calls run
+# at once, interactive calls are admitted ahead of batch ones, and callers beyond
+# the per-class queue limits get LLMOverloadedError instead of waiting
+llm_limiter = PriorityLimiter(
+    limit=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+    max_waiting={
+        INTERACTIVE: int(os.getenv("LLM_MAX_WAITING", "32")),
+        BATCH: int(os.getenv("LLM_MAX_WAITING_BATCH", "256")),
+    }
+)
+
+
+# Per-attempt timeouts, retries with jittered backoff, optional hedging (set
+# LLM_HEDGE_PERCENTILE, e.g. 95) and a circuit breaker shared by all model calls
+llm_caller = ResilientCaller(
+    timeout=float(os.getenv("LLM_TIMEOUT_SECONDS", "60")),
+    deadline=float(os.getenv("LLM_DEADLINE_SECONDS", "150")),
+    max_attempts=int(os.getenv("LLM_MAX_ATTEMPTS", "3")),
+    hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "0")) or None,
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+        reset_seconds=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+    ),
+    # A hedge would only join the queue and add load, so none while calls wait for a slot
+    busy=lambda: llm_limiter.queued() > 0
+)
+
+# Times process_message re-asks the model after a malformed tool call
+MALFORMED_CALL_RETRIES = int(os.getenv("MALFORMED_CALL_RETRIES", "1"))
+
+# How generate_tool_response explains an edit: "diff" renders a local section diff,
+# "llm" asks the model (one more round-trip per edit)
+TOOL_RESPONSE_MODE = os.getenv("TOOL_RESPONSE_MODE", "diff").lower()
+
+# How the tools edit documents: "patch" asks for SEARCH/REPLACE edits and falls back
+# to regenerating the whole document when they don't apply; "full" always regenerates
+DOCUMENT_EDIT_MODE = os.getenv("DOCUMENT_EDIT_MODE", "patch").lower()
+
+
+async def invoke_llm(model, messages: List[Any]):
+    """Call a model under the shared concurrency limit, with timeouts and retries"""
+    with LLM_CALL_SECONDS.time(mode="invoke"):
+        response = await llm_caller.call(lambda: model.ainvoke(messages), guard=llm_limiter.slot)
+    record_llm_exchange(messages, response)
+    return response
+
+
+async def stream_llm(model, messages: List[Any]):
+    """Stream a model response under the shared concurrency limit.
+    
+    Chunks can't be replayed, so streams aren't retried, but they still respect
+    and feed the circuit breaker.
+    """
+    llm_caller.breaker.before_call()
+    received = AIMessage(content="", usage_metadata={"input_tokens": 0, "output_tokens": 0, "total_tokens": 0})
+    try:
+        with LLM_CALL_SECONDS.time(mode="stream"):
+            async with llm_limiter.slot():
+                async for chunk in model.astream(messages):
+                    received.content += chunk.content if isinstance(chunk.content, str) else ""
+                    for key, value in (getattr(chunk, "usage_metadata", None) or {}).items():
+                        if key in received.usage_metadata:
+                            received.usage_metadata[key] += value
+                    yield chunk
+    except TRANSIENT_ERRORS:
+        llm_caller.breaker.record_failure()
+        raise
+    except BaseException:
+        llm_caller.breaker.release_trial()
+        raise
+    finally:
+        record_llm_exchange(messages, received)
+    llm_caller.breaker.record_success()
+
+
+def is_malformed_call(message: Any) -> bool:
+    """Whether the model gave up on a tool call it couldn't format"""
+    metadata = {**(getattr(message, "additional_kwargs", None) or {}),
+                **(getattr(message, "response_metadata", None) or {})}
+    return metadata.get("finish_reason") == "MALFORMED_FUNCTION_CALL"
 
 
 # Define the agent node for message processing
-def process_message(state: AgentState):
+async def process_message(state: AgentState):
     """Process the user message and generate a response"""
     logger.info("Processing user message")
     messages = state["messages"]
@@ -155,10 +292,15 @@ def process_message(state: AgentState):
     personal_summary = state["personal_summary"]
     optimized_resume = state.get("optimized_resume", "")
     cover_letter = state.get("cover_letter", "")
+    conversation_summary = state.get("conversation_summary", "")
     
     # Get the last message
     last_message = messages[-1]
-    logger.info(f"Last message: {last_message}")
+    logger.info("Last message: %s with %d characters", last_message.type, len(str(last_message.content)))
+    logger.debug("Last message: %s", last_message)
+    
+    # Older turns that were folded into the running summary reach the model only through it
+    summary_section = f"\nSummary of the Earlier Conversation:\n{conversation_summary}\n" if conversation_summary else ""
     
     # Add context to the messages
     context_message = SystemMessage(
@@ -173,7 +315,7 @@ Personal Summary: {personal_summary}
 Current Optimized Resume: {optimized_resume}
 
 Current Cover Letter: {cover_letter}
-
+{summary_section}
 User's Instructions:
 {last_message.content}
 
@@ -181,83 +323,193 @@ IMPORTANT:
 1. When the user asks to update their resume, use the update_resume tool.
 2. When the user asks to update their cover letter, use the update_cover_letter tool.
 3. ALWAYS use the appropriate tool for document changes instead of writing them yourself.
-4. For any resume updates, call update_resume with current resume and user's feedback.
-5. For any cover letter updates, call update_cover_letter with current cover letter and user's feedback.
+4. For any resume updates, call update_resume with the user's feedback; the tool already has the current resume.
+5. For any cover letter updates, call update_cover_letter with the user's feedback; the tool already has the current cover letter.
 
 If the user doesn't explicitly request an update, provide helpful advice about job applications.
 """
     )
     
-    # Prepare messages for the model
-    model_messages = [context_message] + messages
-    logger.info(f"Sending context message and user message to model")
+    # Prepare messages for the model, keeping the prompt within the token budget.
+    # Earlier copies of these documents are redundant with the system context.
+    model_messages, context_stats = build_context(
+        context_message,
+        messages,
+        {
+            "Job description": job_description,
+            "Original resume": resume,
+            "Personal summary": personal_summary,
+            "Optimized resume": optimized_resume,
+            "Cover letter": cover_letter
+        },
+        summarized_through=state.get("summarized_through")
+    )
+    logger.info("Sending context message and %s history messages to model", context_stats['messages_kept'])
     
-    # Call the model
-    response = llm.invoke(model_messages)
+    # Call the model, asking again if it produced a malformed tool call; retries
+    # skip the LLM cache so they always reach the model
+    response = await invoke_llm(llm, model_messages)
+    for attempt in range(MALFORMED_CALL_RETRIES):
+        if not is_malformed_call(response):
+            break
+        logger.info("Detected MALFORMED_FUNCTION_CALL, retrying model call (%s/%s)", attempt + 1, MALFORMED_CALL_RETRIES)
+        with bypass_llm_cache():
+            response = await invoke_llm(llm, model_messages)
     logger.info("Generated AI response")
     
     return {"messages": [response]}
 
 
+# State key each document tool edits, and how replies refer to that document
+DOCUMENT_TOOLS = {
+    "update_resume": ("optimized_resume", "resume"),
+    "update_cover_letter": ("cover_letter", "cover letter"),
+}
+
+# Model call failures that clients should retry later
+MODEL_UNAVAILABLE_ERRORS = (LLMOverloadedError, CircuitOpenError)
+
+
+def _tool_error_message(error: Exception) -> str:
+    """Report a failed tool call back to the model, except when the model itself is
+    unavailable: those errors end the turn so the client gets 429/503"""
+    if isinstance(error, MODEL_UNAVAILABLE_ERRORS):
+        raise error
+    return TOOL_CALL_ERROR_TEMPLATE.format(error=repr(error))
+
+
+# Runs one tool call at a time for run_tools, with ToolNode's state injection and error handling
+tool_node = ToolNode(tools, handle_tool_errors=_tool_error_message)
+
+
+def _tool_name(tool_message: ToolMessage) -> str:
+    """Name of the tool that produced a ToolMessage"""
+    tool_name = getattr(tool_message, "name", "unknown")
+    if not tool_name or tool_name == "unknown":
+        # Try to extract from tool_call_id
+        tool_call_id = getattr(tool_message, "tool_call_id", "")
+        if "update_resume" in tool_call_id:
+            tool_name = "update_resume"
+        elif "update_cover_letter" in tool_call_id:
+            tool_name = "update_cover_letter"
+    return tool_name
+
+
+def _trailing_tool_messages(messages: List[Any]) -> List[ToolMessage]:
+    """The ToolMessages answering the most recent AI message's tool calls, in call order"""
+    tool_messages = []
+    for msg in reversed(messages):
+        if not isinstance(msg, ToolMessage):
+            break
+        tool_messages.append(msg)
+    return list(reversed(tool_messages))
+
+
+async def run_tools(state: AgentState, config: RunnableConfig):
+    """Execute the tool calls of the last AI message.
+    
+    Calls that edit different documents run concurrently. Calls that edit the same
+    document run one after another, each seeing the document as the previous call
+    left it, so no edit is lost.
+    """
+    tool_calls = getattr(state["messages"][-1], "tool_calls", None) or []
+    groups = {}
+    for tool_call in tool_calls:
+        state_key = DOCUMENT_TOOLS.get(tool_call["name"], (tool_call["id"], None))[0]
+        groups.setdefault(state_key, []).append(tool_call)
+    logger.info("Running %s tool calls in %s concurrent groups", len(tool_calls), len(groups))
+    
+    async def run_group(state_key: str, calls: List[Dict[str, Any]]) -> List[ToolMessage]:
+        working_state = dict(state)
+        results = []
+        for tool_call in calls:
+            output = await tool_node.ainvoke(
+                {**working_state, "messages": [AIMessage(content="", tool_calls=[tool_call])]}, config
+            )
+            tool_message = output["messages"][0]
+            if getattr(tool_message, "status", "success") != "error":
+                working_state[state_key] = tool_message.content
+            results.append(tool_message)
+        return results
+    
+    grouped = await asyncio.gather(*(run_group(key, calls) for key, calls in groups.items()))
+    by_id = {msg.tool_call_id: msg for results in grouped for msg in results}
+    return {"messages": [by_id[tool_call["id"]] for tool_call in tool_calls]}
+
+
 # Define a function to handle tool results
 def handle_tool_results(state: AgentState):
     """Handle tool execution results and update state accordingly"""
     logger.info("Handling tool results")
-    messages = state["messages"]
+    updates = {}
     
-    # Check if the last message is a tool message
-    if isinstance(messages[-1], ToolMessage):
-        tool_message = messages[-1]
-        logger.info(f"Processing tool message: {tool_message}")
+    # Apply every tool result of this turn in call order; a failed call leaves the documents alone
+    for tool_message in _trailing_tool_messages(state["messages"]):
+        if getattr(tool_message, "status", "success") == "error":
+            continue
+        logger.debug("Processing tool message: %s", tool_message)
         
         # Extract tool name from the tool call ID if available
-        tool_call_name = getattr(tool_message, "name", "unknown")
-        logger.info(f"Tool call name: {tool_call_name}")
+        tool_call_name = _tool_name(tool_message)
+        logger.info("Tool call name: %s", tool_call_name)
         
         # Update state based on which tool was called
         if "update_resume" in tool_call_name:
             logger.info("Updating optimized_resume in state")
-            return {"optimized_resume": tool_message.content}
+            updates["optimized_resume"] = tool_message.content
         elif "update_cover_letter" in tool_call_name:
             logger.info("Updating cover_letter in state")
-            return {"cover_letter": tool_message.content}
+            updates["cover_letter"] = tool_message.content
     
     # If no updates needed, return empty dict
-    return {}
+    return updates
+
+
+def _document_edits(tool_messages: List[ToolMessage], resume: str) -> List[Dict[str, Any]]:
+    """Combine a turn's tool results into one before/after edit per document"""
+    edits = {}
+    for tool_message in tool_messages:
+        tool_name = _tool_name(tool_message)
+        is_resume = "resume" in tool_name
+        label = "resume" if is_resume else "cover letter"
+        edit = edits.setdefault(label, {"label": label, "tool": tool_name, "previous": None, "updated": None})
+        if getattr(tool_message, "status", "success") == "error":
+            continue
+        # The tool reports the document as it was before the edit
+        if edit["previous"] is None:
+            artifact = getattr(tool_message, "artifact", None) or {}
+            edit["previous"] = artifact.get("previous", resume if is_resume else "")
+        edit["updated"] = tool_message.content
+    return list(edits.values())
 
 
 # Add a new function to generate a response after tool execution
-def generate_tool_response(state: AgentState):
-    """Generate a response describing the action performed by the tool"""
+async def generate_tool_response(state: AgentState):
+    """Generate one response describing every change the tools made this turn"""
     logger.info("Generating response about tool execution")
     
     # Get information about what changed
     messages = state["messages"]
-    job_description = state["job_description"]
     resume = state["resume"]
-    optimized_resume = state.get("optimized_resume", "")
-    cover_letter = state.get("cover_letter", "")
     
-    # Find the tool message (should be the most recent ToolMessage)
-    tool_message = None
-    tool_name = "unknown"
-    for msg in reversed(messages):
-        if isinstance(msg, ToolMessage):
-            tool_message = msg
-            tool_name = getattr(tool_message, "name", "unknown")
-            if not tool_name or tool_name == "unknown":
-                # Try to extract from tool_call_id
-                tool_call_id = getattr(tool_message, "tool_call_id", "")
-                if "update_resume" in tool_call_id:
-                    tool_name = "update_resume"
-                elif "update_cover_letter" in tool_call_id:
-                    tool_name = "update_cover_letter"
-            break
-    
-    if not tool_message:
+    tool_messages = _trailing_tool_messages(messages)
+    if not tool_messages:
         logger.warning("No tool message found to generate response for")
         return {"messages": [AIMessage(content="I've updated the document as requested.")]}
     
+    edits = _document_edits(tool_messages, resume)
+    
+    if TOOL_RESPONSE_MODE != "llm":
+        sentences = []
+        for edit in edits:
+            if edit["updated"] is None:
+                sentences.append(f"I wasn't able to update your {edit['label']} this time. Please try again.")
+            else:
+                sentences.append(describe_changes(edit["label"], edit["previous"], edit["updated"]))
+        content = " ".join(sentences)
+        logger.info("Generated tool response from diff: %s", content)
+        return {"messages": [AIMessage(content=content)]}
+    
     # Find the user's request (previous HumanMessage)
     user_request = ""
     for msg in reversed(messages):
@@ -265,28 +517,34 @@ def generate_tool_response(state: AgentState):
             user_request = msg.content
             break
     
+    changes = "\n".join(
+        f"""
+    Tool used: {edit["tool"]}
+    
+    Document type: {edit["label"].title()}
+    Original Document: {edit["previous"]}
+    Document after update: {edit["updated"] if edit["updated"] is not None else "(the update failed; the document is unchanged)"}"""
+        for edit in edits
+    )
+    
     # Create prompt for the LLM to explain what was done
     summary_prompt = f"""
     You are a job application assistant. A user asked you to modify a document, and you need to explain what you did.
     
     User request: "{user_request}"
+    {changes}
     
-    Tool used: {tool_name}
-    
-    Document type: {"Resume" if "resume" in tool_name else "Cover Letter"}
-    Original Document: {resume if "resume" in tool_name else cover_letter}
-    Document after update: {tool_message.content}    
     Create a brief, helpful response (1-3 sentences) explaining what you changed in the document based on their request.
     Be specific about what was modified. Don't ask if they want to make more changes.
     """
     
     # Call the LLM to generate an explanation
     try:
-        response = llm.invoke([HumanMessage(content=summary_prompt)])
-        logger.info(f"Generated tool response: {response.content}")
+        response = await invoke_llm(llm, [HumanMessage(content=summary_prompt)])
+        logger.info("Generated tool response: %s", response.content)
         return {"messages": [AIMessage(content=response.content)]}
     except Exception as e:
-        logger.error(f"Error generating tool response: {str(e)}", exc_info=True)
+        logger.error("Error generating tool response: %s", e, exc_info=True)
         return {"messages": [AIMessage(content="I've updated the document as requested.")]}
 
 
@@ -296,17 +554,16 @@ def create_agent():
     workflow = StateGraph(AgentState)
     
     # Add the nodes
-    workflow.add_node("process_message", process_message)
+    workflow.add_node("process_message", timed(GRAPH_NODE_SECONDS, node="process_message")(process_message))
     
-    # Create ToolNode for tool execution
-    tool_node = ToolNode(tools)
-    workflow.add_node("tools", tool_node)
+    # Tool execution: independent documents are edited concurrently
+    workflow.add_node("tools", timed(GRAPH_NODE_SECONDS, node="tools")(run_tools))
     
     # Add node for handling tool results
-    workflow.add_node("handle_tool_results", handle_tool_results)
+    workflow.add_node("handle_tool_results", timed(GRAPH_NODE_SECONDS, node="handle_tool_results")(handle_tool_results))
     
     # Add new node for generating a response after tool execution
-    workflow.add_node("generate_tool_response", generate_tool_response)
+    workflow.add_node("generate_tool_response", timed(GRAPH_NODE_SECONDS, node="generate_tool_response")(generate_tool_response))
     
     # Connect START to process_message
     workflow.add_edge(START, "process_message")
@@ -340,7 +597,7 @@ def create_agent():
             if hasattr(last_message, "additional_kwargs") and last_message.additional_kwargs:
                 has_tool_calls = True
         
-        logger.info(f"Message has tool calls: {has_tool_calls}")
+        logger.info("Message has tool calls: %s", has_tool_calls)
         return "tools" if has_tool_calls else END
     
     # Connect process_message conditionally
@@ -369,11 +626,8 @@ def create_agent():
     return agent
 
 
-def create_initial_documents(job_description: str, resume: str, personal_summary: str):
-    """Create initial optimized resume and cover letter"""
-    logger.info("Creating initial optimized resume and cover letter")
-    # Generate optimized resume
-    resume_prompt = f"""
+def _initial_resume_prompt(job_description: str, resume: str, personal_summary: str) -> str:
+    return f"""
     You are a resume optimization expert. Your task is to optimize the following resume to better match the job description.
     
     Job Description: {job_description}
@@ -385,14 +639,10 @@ def create_initial_documents(job_description: str, resume: str, personal_summary
     Optimize the resume to highlight relevant skills and experience that match the job requirements.
     Return the complete optimized resume. Do not include any other text or comments. The format should be the same as the original resume. Render as well-formatted markdown. Don't put it in a code block.
     """
-    
-    # Fix: Use HumanMessage instead of SystemMessage for Gemini
-    optimized_resume_response = llm.invoke([HumanMessage(content=resume_prompt)])
-    optimized_resume = optimized_resume_response.content
-    logger.info("Initial optimized resume created")
-    
-    # Generate cover letter
-    cover_letter_prompt = f"""
+
+
+def _initial_cover_letter_prompt(job_description: str, resume: str, personal_summary: str) -> str:
+    return f"""
     You are a cover letter writing expert. Your task is to create a personalized cover letter based on the resume and job description.
     
     Job Description: {job_description}
@@ -404,13 +654,10 @@ def create_initial_documents(job_description: str, resume: str, personal_summary
     Create a professional cover letter that highlights relevant skills and experience while matching the applicant's personality.
     Return the complete cover letter. Do not include any other text or comments.
     """
-    
-    # Fix: Use HumanMessage instead of SystemMessage for Gemini
-    cover_letter_response = llm.invoke([HumanMessage(content=cover_letter_prompt)])
-    cover_letter = cover_letter_response.content
-    logger.info("Initial cover letter created")
-    
-    summary_prompt = f"""
+
+
+def _optimization_summary_prompt(job_description: str, resume: str, optimized_resume: str, cover_letter: str) -> str:
+    return f"""
         You are a job application assistant. Summarize the key optimizations made to this resume
         for the job description below. Be specific about what was improved and why.
         
@@ -428,14 +675,135 @@ def create_initial_documents(job_description: str, resume: str, personal_summary
         
         Provide a concise summary of the changes and improvements.
         """
-        
-    summary_response = llm.invoke([HumanMessage(content=summary_prompt)])
-    optimization_summary = summary_response.content
+
+
+async def acreate_initial_documents(job_description: str, resume: str, personal_summary: str,
+                                    on_document: Optional[Callable[[str, str], Awaitable[None]]] = None):
+    """Create initial optimized resume and cover letter.
+
+    The resume and cover letter don't depend on each other, so both calls run
+    concurrently; the summary starts as soon as both are available. If given,
+    `on_document(name, content)` is awaited as each of "optimized_resume",
+    "cover_letter" and "optimization_summary" completes.
+    """
+    logger.info("Creating initial optimized resume and cover letter")
+    
+    async def generate(document: str, prompt: str) -> str:
+        # Fix: Use HumanMessage instead of SystemMessage for Gemini
+        response = await invoke_llm(llm, [HumanMessage(content=prompt)])
+        if on_document is not None:
+            await on_document(document, response.content)
+        return response.content
+    
+    optimized_resume, cover_letter = await asyncio.gather(
+        generate("optimized_resume", _initial_resume_prompt(job_description, resume, personal_summary)),
+        generate("cover_letter", _initial_cover_letter_prompt(job_description, resume, personal_summary)),
+    )
+    logger.info("Initial optimized resume and cover letter created")
+    
+    summary_prompt = _optimization_summary_prompt(job_description, resume, optimized_resume, cover_letter)
+    optimization_summary = await generate("optimization_summary", summary_prompt)
     logger.info("Optimization summary created")
     
     return optimized_resume, cover_letter, optimization_summary
 
 
+async def astream_initial_documents(job_description: str, resume: str, personal_summary: str):
+    """Stream the initial documents as they are generated.
+    
+    Yields dicts: {"type": "token", "document", "delta"} for each text chunk, and
+    {"type": "document", "document", "content"} when a document is complete. The
+    documents are "optimized_resume", "cover_letter" and then "optimization_summary".
+    The resume and cover letter stream concurrently, so their tokens interleave.
+    """
+    logger.info("Streaming initial optimized resume and cover letter")
+    events = asyncio.Queue()
+    
+    async def generate(document: str, prompt: str) -> str:
+        try:
+            content = ""
+            async for chunk in stream_llm(llm, [HumanMessage(content=prompt)]):
+                if isinstance(chunk.content, str) and chunk.content:
+                    content += chunk.content
+                    await events.put({"type": "token", "document": document, "delta": chunk.content})
+            await events.put({"type": "document", "document": document, "content": content})
+            return content
+        except Exception as e:
+            await events.put(e)
+            raise
+    
+    tasks = [
+        asyncio.create_task(generate("optimized_resume", _initial_resume_prompt(job_description, resume, personal_summary))),
+        asyncio.create_task(generate("cover_letter", _initial_cover_letter_prompt(job_description, resume, personal_summary))),
+    ]
+    try:
+        # Relay events until both documents are complete
+        remaining = len(tasks)
+        while remaining:
+            event = await events.get()
+            if isinstance(event, Exception):
+                raise event
+            if event["type"] == "document":
+                remaining -= 1
+            yield event
+    finally:
+        for task in tasks:
+            task.cancel()
+    
+    optimized_resume, cover_letter = tasks[0].result(), tasks[1].result()
+    logger.info("Initial optimized resume and cover letter created")
+    
+    summary_prompt = _optimization_summary_prompt(job_description, resume, optimized_resume, cover_letter)
+    optimization_summary = ""
+    async for chunk in stream_llm(llm, [HumanMessage(content=summary_prompt)]):
+        if isinstance(chunk.content, str) and chunk.content:
+            optimization_summary += chunk.content
+            yield {"type": "token", "document": "optimization_summary", "delta": chunk.content}
+    logger.info("Optimization summary created")
+    yield {"type": "document", "document": "optimization_summary", "content": optimization_summary}
+
+
+def create_initial_documents(job_description: str, resume: str, personal_summary: str):
+    """Create initial optimized resume and cover letter (blocking wrapper for non-async callers)"""
+    return asyncio.run(acreate_initial_documents(job_description, resume, personal_summary))
+
+
+async def asummarize_conversation(previous_summary: str, messages: List[Dict[str, Any]]) -> str:
+    """Fold older chat messages into the running conversation summary.
+    
+    Args:
+        previous_summary: The current summary, empty if there is none yet
+        messages: Stored messages (dicts with role and content) to fold in, oldest first
+        
+    Returns:
+        The updated summary text
+    """
+    logger.info("Summarizing %s older messages", len(messages))
+    transcript = "\n\n".join(
+        f"{message['role'].upper()}: {message['content']}"
+        for message in messages
+        if message["role"] in ("human", "ai") and message["content"]
+    )
+    
+    prompt = f"""
+    You are maintaining a running summary of a conversation between a user and a job application assistant.
+    
+    Current Summary:
+    {previous_summary or "(none yet)"}
+    
+    New Messages:
+    {transcript}
+    
+    Update the summary with the new messages. Keep every instruction, preference and constraint the user
+    stated (tone, length, things to include or avoid) and every change already made to the documents.
+    Leave out the document text itself. Return only the updated summary.
+    """
+    
+    # The plain chat model is used so the summary never turns into a tool call
+    response = await invoke_llm(chat_model, [HumanMessage(content=prompt)])
+    return response.content.strip()
+
+
 # Initialize memory saver for conversation persistence
 memory = MemorySaver()
 logger.info("Memory saver initialized")
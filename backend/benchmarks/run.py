@@ -0,0 +1,281 @@
+# benchmarks/run.py
+"""End-to-end benchmark of the API against the fake chat model.
+
+Runs the FastAPI app in-process through httpx's ASGI transport, in a scratch
+directory with fresh databases, and reports latency percentiles, throughput and
+time spent in the conversation store for each scenario:
+
+    python benchmarks/run.py --scenario all --concurrency 16 --requests 200
+    python benchmarks/run.py --scenario chat --save baseline.json
+    python benchmarks/run.py --scenario chat --baseline baseline.json --tolerance 0.15
+
+With --baseline the run exits with status 1 if any scenario's p95 latency grew, or
+its throughput fell, by more than the tolerance.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+import tempfile
+import threading
+from typing import Any, Awaitable, Callable, Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ("process", "chat", "update", "history")
+
+CHAT_MESSAGES = (
+    "Make the summary of my resume more concise ({i})",
+    "Make the cover letter sound warmer ({i})",
+    "Which of my projects should I lead with? ({i})",
+    "Tighten the experience section of the resume ({i})",
+)
+
+
+class TimedStore:
+    """Wraps the synchronous conversation store to add up the time spent in its methods"""
+
+    def __init__(self, store):
+        self._store = store
+        self._lock = threading.Lock()
+        self.seconds = 0.0
+        self.calls = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self._store, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.seconds += time.perf_counter() - started
+                    self.calls += 1
+
+        return timed
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+async def wait_for_job(client, job_id: str, poll_seconds: float = 0.02) -> Dict[str, Any]:
+    while True:
+        response = await client.get(f"/api/jobs/{job_id}")
+        job = response.json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        await asyncio.sleep(poll_seconds)
+
+
+def application(i: int) -> Dict[str, str]:
+    return {
+        "job_description": f"Senior backend engineer, requisition {i}. Python, SQL, distributed systems.",
+        "resume": f"# Applicant {i}\n\n## Experience\nBuilt data pipelines in Python.\n\n## Skills\nPython, SQL",
+        "personal_summary": f"Engineer with {i % 15 + 3} years of experience."
+    }
+
+
+async def create_conversation(client, i: int) -> str:
+    response = await client.post("/api/process", json=application(i))
+    job = await wait_for_job(client, response.json()["job_id"])
+    if job["status"] != "succeeded":
+        raise RuntimeError(f"Setup job failed: {job.get('error')}")
+    return job["conversation_id"]
+
+
+async def run_scenario(name: str, request: Callable[[int, int], Awaitable[bool]], total: int,
+                       concurrency: int, store: TimedStore) -> Dict[str, Any]:
+    """Issue `total` requests from `concurrency` workers and summarize them"""
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker(index: int):
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                ok = await request(i, index)
+            except Exception as e:
+                logging.getLogger("benchmark").warning("%s request %s failed: %s", name, i, e)
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    db_seconds, db_calls = store.seconds, store.calls
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(index) for index in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    return {
+        "scenario": name,
+        "requests": len(ordered),
+        "errors": errors,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 1),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 1),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 1),
+        "max_ms": round(ordered[-1] * 1000, 1) if ordered else 0.0,
+        "db_ms_per_request": round((store.seconds - db_seconds) * 1000 / max(1, len(ordered)), 2),
+        "db_calls": store.calls - db_calls
+    }
+
+
+async def benchmark(args) -> List[Dict[str, Any]]:
+    import httpx
+    import server
+
+    store = TimedStore(server.conversation_store.store)
+    server.conversation_store.store = store
+
+    transport = httpx.ASGITransport(app=server.app)
+    results = []
+    async with server.lifespan(server.app), httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                                              timeout=args.timeout) as client:
+        # One conversation per worker, so workers don't queue on each other's conversation locks
+        conversations = await asyncio.gather(*(create_conversation(client, -1 - i) for i in range(args.concurrency)))
+        documents = {}
+        for cid in conversations:
+            documents[cid] = (await client.get(f"/api/documents/{cid}")).json()
+
+        async def process(i: int, worker: int) -> bool:
+            response = await client.post("/api/process", json=application(i))
+            if response.status_code != 202:
+                return False
+            return (await wait_for_job(client, response.json()["job_id"]))["status"] == "succeeded"
+
+        async def chat(i: int, worker: int) -> bool:
+            message = CHAT_MESSAGES[i % len(CHAT_MESSAGES)].format(i=i)
+            response = await client.post("/api/chat", json={"conversation_id": conversations[worker], "message": message})
+            return response.status_code == 200
+
+        async def update(i: int, worker: int) -> bool:
+            cid = conversations[worker]
+            document_type = "resume" if i % 2 == 0 else "cover_letter"
+            current = documents[cid]["optimized_resume" if document_type == "resume" else "cover_letter"] or ""
+            response = await client.post("/api/update", json={
+                "conversation_id": cid, "document_type": document_type, "content": f"{current}\n\nRevision {i}"
+            })
+            return response.status_code == 200
+
+        async def history(i: int, worker: int) -> bool:
+            cid = conversations[worker]
+            path = (f"/api/conversations/{cid}", f"/api/documents/{cid}",
+                    f"/api/document_history/{cid}/resume", "/api/conversations?limit=20")[i % 4]
+            return (await client.get(path)).status_code == 200
+
+        requests = {"process": process, "chat": chat, "update": update, "history": history}
+        for name in (SCENARIOS if args.scenario == "all" else (args.scenario,)):
+            result = await run_scenario(name, requests[name], args.requests, args.concurrency, store)
+            results.append(result)
+            print(format_row(result), flush=True)
+    return results
+
+
+HEADER = f"{'scenario':<10}{'reqs':>7}{'errs':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'db ms/req':>11}"
+
+
+def format_row(result: Dict[str, Any]) -> str:
+    return (f"{result['scenario']:<10}{result['requests']:>7}{result['errors']:>6}{result['rps']:>9.1f}"
+            f"{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+            f"{result['db_ms_per_request']:>11.2f}")
+
+
+def regressions(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float) -> List[str]:
+    """Scenarios whose p95 latency or throughput is worse than the baseline by more than `tolerance`"""
+    previous = {result["scenario"]: result for result in baseline}
+    found = []
+    for result in results:
+        before = previous.get(result["scenario"])
+        if not before:
+            continue
+        if result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            found.append(f"{result['scenario']}: p95 {before['p95_ms']}ms -> {result['p95_ms']}ms")
+        if result["rps"] < before["rps"] * (1 - tolerance):
+            found.append(f"{result['scenario']}: {before['rps']} -> {result['rps']} requests/sec")
+        if result["errors"] > before["errors"]:
+            found.append(f"{result['scenario']}: {before['errors']} -> {result['errors']} errors")
+    return found
+
+
+def configure_environment(args):
+    """Point the app at the fake model and a scratch directory before it is imported"""
+    os.environ.update({
+        "LLM_PROVIDER": "fake",
+        "LLM_CACHE": "true" if args.llm_cache else "false",
+        "FAKE_LLM_LATENCY_MS": str(args.latency_ms),
+        "FAKE_LLM_LATENCY_JITTER_MS": str(args.jitter_ms),
+        "FAKE_LLM_LATENCY_DISTRIBUTION": args.distribution,
+        "FAKE_LLM_OUTPUT_WORDS": str(args.output_words),
+        "FAKE_LLM_TOOL_CALL_RATE": str(args.tool_call_rate),
+        "FAKE_LLM_SEED": str(args.seed),
+    })
+    # The app opens its databases and log file relative to the working directory
+    workdir = tempfile.mkdtemp(prefix="hitch-bench-")
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+    return workdir
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="requests per scenario")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="median fake model latency")
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--distribution", default="normal", help="fixed, uniform, normal or lognormal")
+    parser.add_argument("--output-words", type=int, default=300)
+    parser.add_argument("--tool-call-rate", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--llm-cache", action="store_true", help="keep the LLM response cache enabled")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--save", help="write results as JSON to this path")
+    parser.add_argument("--baseline", help="compare against results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    save = os.path.abspath(args.save) if args.save else None
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    workdir = configure_environment(args)
+    print(f"Fake model: {args.distribution} latency {args.latency_ms}±{args.jitter_ms}ms, "
+          f"{args.output_words} words, tool call rate {args.tool_call_rate}; data in {workdir}")
+    print(HEADER)
+    import server  # noqa: F401 - configures logging on import
+    logging.getLogger().setLevel(args.log_level.upper())
+    results = asyncio.run(benchmark(args))
+
+    if save:
+        with open(save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {save}")
+    if baseline is not None:
+        found = regressions(results, baseline, args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} of the baseline")
+
+
+if __name__ == "__main__":
+    main()
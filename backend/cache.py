@@ -0,0 +1,212 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List
+
+from db import SQLiteConversationStore, ConcurrentModificationError, is_persisted_message, NON_STATE_DATA_KEYS
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+
+class _CacheEntry:
+    """A hydrated conversation state held by CachedConversationStore"""
+
+    __slots__ = ("state", "messages", "complete", "version", "size")
+
+    def __init__(self, state: Dict[str, Any], messages: Optional[List[Any]], complete: bool, version: int):
+        self.state = state            # State without messages
+        self.messages = messages      # Most recent messages, or None if never loaded
+        self.complete = complete      # Whether messages is the whole history
+        self.version = version
+        self.size = _estimate_size(state, messages)
+
+
+def _estimate_size(state: Dict[str, Any], messages: Optional[List[Any]]) -> int:
+    """Rough size in bytes of a cached state, counting only its text"""
+    size = sum(len(value) for value in state.values() if isinstance(value, str))
+    for msg in messages or []:
+        content = getattr(msg, "content", "")
+        size += len(content) if isinstance(content, str) else len(str(content))
+    return size
+
+
+def _recent_window(messages: List[Any], limit: int) -> List[Any]:
+    """The last `limit` messages, starting on a human message like SQLiteConversationStore.get"""
+    window = messages[-limit:] if limit > 0 else []
+    start = 0
+    while start < len(window) and getattr(window[start], "type", "") != "human":
+        start += 1
+    return window[start:]
+
+
+class CachedConversationStore:
+    """Bounded in-process LRU cache in front of SQLiteConversationStore.
+
+    Saves are written through to SQLite and then cached. Every cached read is
+    checked against the conversation's version stamp, so a save made by another
+    worker invalidates the entry instead of serving stale state. Methods this
+    class doesn't override go straight to the underlying store.
+    """
+
+    def __init__(self, store: SQLiteConversationStore, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024):
+        self.store = store
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # Store methods run on worker threads
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    def get(self, conversation_id: str, include_messages: bool = True,
+            message_limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Retrieve conversation state, from the cache when the cached version is current"""
+        entry = self._current_entry(conversation_id)
+        if entry is not None:
+            messages = self._serve_messages(entry, include_messages, message_limit)
+            if messages is not None:
+                with self._lock:
+                    self.hits += 1
+                return {**entry.state, "version": entry.version, "messages": messages}
+
+        with self._lock:
+            self.misses += 1
+        state = self.store.get(conversation_id, include_messages=include_messages, message_limit=message_limit)
+        if state is None:
+            self.invalidate(conversation_id)
+            return None
+
+        messages = list(state["messages"]) if include_messages else None
+        complete = include_messages and message_limit is None
+        if entry is not None and entry.version == state["version"] and messages is None:
+            # Keep the messages we already hold; only the state was missing
+            messages, complete = entry.messages, entry.complete
+        self._put(conversation_id, _CacheEntry(self._without_messages(state), messages, complete, state["version"]))
+        return state
+
+    def get_documents(self, conversation_id: str) -> Optional[Dict[str, str]]:
+        """Get only the current optimized resume and cover letter"""
+        entry = self._current_entry(conversation_id)
+        if entry is not None:
+            with self._lock:
+                self.hits += 1
+            return {
+                "optimized_resume": entry.state.get("optimized_resume") or "",
+                "cover_letter": entry.state.get("cover_letter") or ""
+            }
+        return self.store.get_documents(conversation_id)
+
+    def set(self, conversation_id: str, state: Dict[str, Any], expected_version: Optional[int] = None) -> Optional[int]:
+        """Write the state through to SQLite, then cache it under the new version"""
+        try:
+            version = self.store.set(conversation_id, state, expected_version=expected_version)
+        except ConcurrentModificationError:
+            # Our copy is behind whatever the other writer saved
+            self.invalidate(conversation_id)
+            raise
+        if version is None:
+            self.invalidate(conversation_id)
+            return None
+
+        saved = sum(1 for msg in state.get("messages", []) if is_persisted_message(msg))
+        with self._lock:
+            previous = self._entries.get(conversation_id)
+        if not saved:
+            # Nothing was appended, so whatever history we held is still accurate
+            messages = previous.messages if previous else None
+            complete = previous.complete if previous else False
+        else:
+            # Cache the messages as get() returns them (with revision links, tool
+            # messages as stored) rather than the caller's objects
+            messages = self.store.get_recent_messages(conversation_id, saved) or None
+            complete = bool(
+                messages and previous is not None and previous.complete and previous.messages and
+                getattr(previous.messages[0], "id", None) == getattr(messages[0], "id", None)
+            )
+        self._put(conversation_id, _CacheEntry(self._without_messages(state), messages, complete, version))
+        return version
+
+    def delete(self, conversation_id: str) -> bool:
+        """Delete a conversation and drop it from the cache"""
+        self.invalidate(conversation_id)
+        return self.store.delete(conversation_id)
+
+    def invalidate(self, conversation_id: str):
+        """Drop a conversation from the cache"""
+        with self._lock:
+            entry = self._entries.pop(conversation_id, None)
+            if entry is not None:
+                self._bytes -= entry.size
+
+    def stats(self) -> Dict[str, int]:
+        """Cache counters"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+    def _current_entry(self, conversation_id: str) -> Optional[_CacheEntry]:
+        """Return the cached entry if its version still matches the database"""
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+        if entry is None:
+            return None
+
+        if self.store.get_version(conversation_id) != entry.version:
+            logger.info("Cached state for conversation %s is stale, invalidating", conversation_id)
+            self.invalidate(conversation_id)
+            return None
+
+        with self._lock:
+            if conversation_id in self._entries:
+                self._entries.move_to_end(conversation_id)
+        return entry
+
+    @staticmethod
+    def _serve_messages(entry: _CacheEntry, include_messages: bool, message_limit: Optional[int]) -> Optional[List[Any]]:
+        """Messages to return for a request, or None if the entry can't answer it"""
+        if not include_messages:
+            return []
+        if entry.messages is None:
+            return None
+        if message_limit is None:
+            return list(entry.messages) if entry.complete else None
+        if entry.complete or len(entry.messages) >= message_limit:
+            return _recent_window(entry.messages, message_limit)
+        return None
+
+    @staticmethod
+    def _without_messages(state: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in state.items() if key not in NON_STATE_DATA_KEYS}
+
+    def _put(self, conversation_id: str, entry: _CacheEntry):
+        """Insert an entry and evict least recently used ones past the size limits"""
+        if entry.size > self.max_bytes:
+            self.invalidate(conversation_id)
+            return
+
+        with self._lock:
+            previous = self._entries.get(conversation_id)
+            if previous is not None and previous.version > entry.version:
+                # A concurrent save already cached a newer version
+                return
+            if previous is not None:
+                del self._entries[conversation_id]
+                self._bytes -= previous.size
+            self._entries[conversation_id] = entry
+            self._bytes += entry.size
+
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self.evictions += 1
@@ -0,0 +1,178 @@
+# concurrency.py
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from metrics import LLM_QUEUE_SECONDS
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into a single execution.
+
+    The first caller for a key starts the work; callers arriving while it runs
+    await the same result (or exception). The work is shielded, so a caller that
+    disconnects doesn't cancel it for the others.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            logger.info("Joining in-flight request %s", key)
+        return await asyncio.shield(task)
+
+
+class KeyedLocks:
+    """One asyncio.Lock per key, created on demand and dropped once nobody holds or awaits it"""
+
+    def __init__(self):
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._users: Dict[str, int] = {}
+
+    def locked(self, key: str) -> bool:
+        lock = self._locks.get(key)
+        return lock is not None and lock.locked()
+
+    @asynccontextmanager
+    async def hold(self, key: str):
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._users[key] = self._users.get(key, 0) + 1
+        try:
+            if lock.locked():
+                logger.info("Waiting for in-progress work on %s", key)
+            async with lock:
+                yield
+        finally:
+            self._users[key] -= 1
+            if not self._users[key]:
+                del self._users[key]
+                del self._locks[key]
+
+
+# Priority classes for model calls; lower values are admitted first
+INTERACTIVE = 0
+BATCH = 1
+
+# Priority of the model calls made in the current task
+_llm_priority = ContextVar("llm_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def llm_priority(priority: int):
+    """Run the model calls made inside this block at the given priority"""
+    token = _llm_priority.set(priority)
+    try:
+        yield
+    finally:
+        _llm_priority.reset(token)
+
+
+class LLMOverloadedError(Exception):
+    """Too many model calls are already waiting; retry after `retry_after` seconds"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PriorityLimiter:
+    """Caps concurrent model calls, admitting waiters by priority and then arrival.
+
+    At most `limit` calls run at once. When a priority class already has
+    `max_waiting[priority]` calls queued, further calls in that class fail
+    immediately with LLMOverloadedError instead of queueing behind them.
+    """
+
+    def __init__(self, limit: int, max_waiting: Dict[int, int]):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self._active = 0
+        self._waiters = []
+        self._waiting: Dict[int, int] = {}
+        self._sequence = itertools.count()
+        # Moving average of how long a call holds its slot, for Retry-After hints
+        self._average_hold = 5.0
+        self.rejected = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "active": self._active,
+            "waiting": dict(self._waiting),
+            "rejected": self.rejected,
+            "average_call_seconds": round(self._average_hold, 3)
+        }
+
+    def queued(self) -> int:
+        """Calls waiting for a slot, across all priorities"""
+        return sum(self._waiting.values())
+
+    def retry_after(self) -> int:
+        """Rough seconds until the current queue drains"""
+        return max(1, math.ceil(self._average_hold * (self.queued() + 1) / self.limit))
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[int] = None):
+        if priority is None:
+            priority = _llm_priority.get()
+        queued = time.monotonic()
+        await self._acquire(priority)
+        started = time.monotonic()
+        LLM_QUEUE_SECONDS.observe(started - queued, priority=priority)
+        try:
+            yield
+        finally:
+            self._average_hold = 0.9 * self._average_hold + 0.1 * (time.monotonic() - started)
+            self._release()
+
+    async def _acquire(self, priority: int):
+        if self._active < self.limit and not self._waiters:
+            self._active += 1
+            return
+
+        waiting = self._waiting.get(priority, 0)
+        if waiting >= self.max_waiting.get(priority, 0):
+            self.rejected += 1
+            raise LLMOverloadedError(
+                f"{waiting} model calls already waiting at priority {priority}", self.retry_after()
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self._waiting[priority] = waiting + 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we were cancelled; pass it on
+                self._release()
+            raise
+        finally:
+            self._waiting[priority] -= 1
+
+    def _release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # Hand the slot straight to the next waiter
+                future.set_result(None)
+                return
+        self._active -= 1
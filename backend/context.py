@@ -0,0 +1,160 @@
+# context.py
+import os
+import logging
+from typing import List, Dict, Any, Optional, Tuple
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Approximate prompt size, in tokens, allowed for one agent turn
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "16000"))
+
+# Documents shorter than this aren't worth deduplicating
+MIN_DEDUPE_CHARS = 200
+
+OMITTED_DOCUMENT = "[{label} omitted here; the current version is in the system context]"
+OMITTED_REVISION = "[Earlier document revision omitted; the current version is in the system context]"
+TRUNCATED = "\n[... {count} more characters truncated to fit the context]"
+
+
+class ContextTooLargeError(ValueError):
+    """The parts of a turn that can't be dropped don't fit the token budget"""
+
+
+def estimate_tokens(text: Any) -> int:
+    """Cheap token estimate (about four characters per token) that needs no API call"""
+    if not isinstance(text, str):
+        text = str(text)
+    return len(text) // 4 + 1
+
+
+def _split_turns(messages: List[Any]) -> List[List[Any]]:
+    """Group messages into turns that each start at a human message.
+
+    Dropping whole turns keeps every tool call next to its tool result.
+    """
+    turns = []
+    for msg in messages:
+        if getattr(msg, "type", "") == "human" or not turns:
+            turns.append([])
+        turns[-1].append(msg)
+    return turns
+
+
+def _dedupe(msg: Any, documents: Dict[str, str]) -> Any:
+    """Return msg with copies of documents already in the system context replaced by placeholders"""
+    content = getattr(msg, "content", "")
+    if not isinstance(content, str) or len(content) < MIN_DEDUPE_CHARS:
+        return msg
+
+    # Tool results from earlier turns are full document revisions
+    if getattr(msg, "type", "") == "tool":
+        return msg.model_copy(update={"content": OMITTED_REVISION})
+
+    deduped = content
+    for label, document in documents.items():
+        if document and len(document) >= MIN_DEDUPE_CHARS and document in deduped:
+            deduped = deduped.replace(document, OMITTED_DOCUMENT.format(label=label))
+    if deduped == content:
+        return msg
+    return msg.model_copy(update={"content": deduped})
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    return text[:max_chars] + TRUNCATED.format(count=len(text) - max_chars)
+
+
+def _fit_required(system_message: Any, current_turn: List[Any], documents: Dict[str, str],
+                  budget: int) -> Tuple[Any, List[Any]]:
+    """Shrink the system message and current turn until they fit `budget` tokens.
+
+    The largest document copies in the system message and tool results in the
+    current turn are truncated first; the tools read documents from state, so
+    edits still see the full text. Raises ContextTooLargeError if what's left
+    (e.g. a very long user message) still doesn't fit.
+    """
+    current_turn = list(current_turn)
+    system_texts = {document for document in documents.values()
+                    if document and len(document) > MIN_DEDUPE_CHARS and document in system_message.content}
+
+    def size() -> int:
+        return (estimate_tokens(system_message.content) +
+                sum(estimate_tokens(getattr(msg, "content", "")) for msg in current_turn))
+
+    while size() > budget:
+        candidates = [(len(text), "system", text) for text in system_texts]
+        candidates += [(len(msg.content), "tool", index) for index, msg in enumerate(current_turn)
+                       if getattr(msg, "type", "") == "tool" and isinstance(msg.content, str)
+                       and len(msg.content) > MIN_DEDUPE_CHARS]
+        if not candidates:
+            raise ContextTooLargeError(
+                f"The message needs about {size()} tokens of context, more than the {budget} allowed"
+            )
+
+        length, kind, target = max(candidates, key=lambda candidate: candidate[0])
+        # Cut by the overflow (four characters per token), but never below MIN_DEDUPE_CHARS
+        max_chars = max(MIN_DEDUPE_CHARS, length - (size() - budget) * 4 - len(TRUNCATED) - 8)
+        if kind == "system":
+            system_texts.discard(target)
+            system_message = system_message.model_copy(
+                update={"content": system_message.content.replace(target, _truncate(target, max_chars))}
+            )
+        else:
+            msg = current_turn[target]
+            current_turn[target] = msg.model_copy(update={"content": _truncate(msg.content, max_chars)})
+    return system_message, current_turn
+
+
+def build_context(system_message: Any, messages: List[Any], documents: Dict[str, str],
+                  budget: int = CONTEXT_TOKEN_BUDGET,
+                  summarized_through: Optional[str] = None) -> Tuple[List[Any], Dict[str, int]]:
+    """Assemble the messages for one agent turn within a token budget.
+
+    The system message is always kept. Messages up to and including the one whose
+    id is `summarized_through` are dropped, since the running summary covers them.
+    Earlier turns have copies of the documents in `documents` replaced by
+    placeholders, and the oldest turns are dropped once the budget is exhausted.
+    The current turn is always kept; if it and the system message alone exceed
+    the budget, the largest documents in them are truncated (see _fit_required).
+
+    Returns the messages to send and a dict of size statistics.
+    """
+    total = len(messages)
+    if summarized_through:
+        for index, msg in enumerate(messages):
+            if getattr(msg, "id", None) == summarized_through:
+                messages = messages[index + 1:]
+                break
+
+    turns = _split_turns(messages)
+    if turns:
+        system_message, turns[-1] = _fit_required(system_message, turns[-1], documents, budget)
+    system_tokens = estimate_tokens(system_message.content)
+    remaining = budget - system_tokens
+
+    kept_turns = []
+    for index in range(len(turns) - 1, -1, -1):
+        turn = turns[index]
+        if index < len(turns) - 1:
+            turn = [_dedupe(msg, documents) for msg in turn]
+        turn_tokens = sum(estimate_tokens(getattr(msg, "content", "")) for msg in turn)
+        if kept_turns and turn_tokens > remaining:
+            break
+        kept_turns.append(turn)
+        remaining -= turn_tokens
+
+    kept = [msg for turn in reversed(kept_turns) for msg in turn]
+    stats = {
+        "budget": budget,
+        "system_tokens": system_tokens,
+        "history_tokens": budget - system_tokens - remaining,
+        "prompt_tokens": budget - remaining,
+        "messages_kept": len(kept),
+        "messages_dropped": total - len(kept)
+    }
+    logger.info(
+        "Assembled context: ~%s/%s tokens (system %s, history %s), kept %s messages, dropped %s",
+        stats['prompt_tokens'], budget, stats['system_tokens'], stats['history_tokens'],
+        stats['messages_kept'], stats['messages_dropped']
+    )
+    return [system_message] + kept, stats
@@ -1,142 +1,425 @@
 import sqlite3
 import json
+import asyncio
+import functools
 import logging
-from datetime import datetime
+import threading
+import uuid
+from datetime import datetime, timedelta
 import os
 from typing import Dict, Any, Optional, List
 
+from metrics import timed, STORE_CALL_SECONDS, STATE_JSON_SECONDS, STATE_JSON_BYTES
+from revisions import SNAPSHOT, DELTA, encode_revision, decompress_text, apply_delta
+
 # Set up logger
 logger = logging.getLogger(__name__)
 
+def _migrate_initial_schema(cursor):
+    """Create the conversations, messages and document_revisions tables"""
+    # Create conversations table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS conversations (
+        conversation_id TEXT PRIMARY KEY,
+        created_at TIMESTAMP,
+        updated_at TIMESTAMP,
+        job_description TEXT,
+        resume TEXT,
+        personal_summary TEXT,
+        optimized_resume TEXT,
+        cover_letter TEXT,
+        state_data TEXT
+    )
+    ''')
+    
+    # Create messages table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        conversation_id TEXT,
+        timestamp TIMESTAMP,
+        role TEXT,
+        content TEXT,
+        metadata TEXT,
+        FOREIGN KEY (conversation_id) REFERENCES conversations (conversation_id)
+    )
+    ''')
+    
+    # Create document revisions table with message_id to link revisions to specific chat messages
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS document_revisions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        conversation_id TEXT,
+        document_type TEXT,  -- 'resume' or 'cover_letter'
+        content TEXT,
+        timestamp TIMESTAMP,
+        feedback TEXT,        -- The feedback that prompted this revision
+        message_id INTEGER,   -- Reference to the message that triggered this revision
+        FOREIGN KEY (conversation_id) REFERENCES conversations (conversation_id),
+        FOREIGN KEY (message_id) REFERENCES messages (id)
+    )
+    ''')
+
+
+def _migrate_revision_message_id(cursor):
+    """Add message_id to document_revisions tables created before it existed"""
+    cursor.execute("PRAGMA table_info(document_revisions)")
+    columns = [column[1] for column in cursor.fetchall()]
+    if "message_id" not in columns:
+        cursor.execute("ALTER TABLE document_revisions ADD COLUMN message_id INTEGER")
+
+
+def _migrate_message_keys(cursor):
+    """Add message_key (the LangChain message id) so set() can persist only unseen messages"""
+    cursor.execute("PRAGMA table_info(messages)")
+    columns = [column[1] for column in cursor.fetchall()]
+    if "message_key" not in columns:
+        cursor.execute("ALTER TABLE messages ADD COLUMN message_key TEXT")
+    cursor.execute("UPDATE messages SET message_key = 'msg_' || id WHERE message_key IS NULL")
+
+
+def _migrate_conversation_version(cursor):
+    """Add a version stamp to conversations that every save increments"""
+    cursor.execute("PRAGMA table_info(conversations)")
+    columns = [column[1] for column in cursor.fetchall()]
+    if "version" not in columns:
+        cursor.execute("ALTER TABLE conversations ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+
+def _migrate_conversation_summaries(cursor):
+    """Store a running summary of the older turns of each conversation"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS conversation_summaries (
+        conversation_id TEXT PRIMARY KEY,
+        summary TEXT,
+        summarized_through_id INTEGER,   -- Last message folded into the summary
+        summarized_through_key TEXT,     -- message_key of that message
+        updated_at TIMESTAMP,
+        FOREIGN KEY (conversation_id) REFERENCES conversations (conversation_id)
+    )
+    ''')
+
+
+def _migrate_idempotency_keys(cursor):
+    """Remember the response to each Idempotency-Key so retried requests don't run twice"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS idempotency_keys (
+        idempotency_key TEXT PRIMARY KEY,
+        request_hash TEXT,        -- Hash of the request body the key was first used with
+        conversation_id TEXT,
+        response TEXT,            -- JSON response body; NULL while the request is in progress
+        created_at TIMESTAMP
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created_at ON idempotency_keys (created_at)")
+
+
+def _migrate_jobs(cursor):
+    """Track background document generation jobs and their partial results"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS jobs (
+        job_id TEXT PRIMARY KEY,
+        status TEXT,               -- queued, running, succeeded or failed
+        request_hash TEXT,
+        request TEXT,              -- JSON request body
+        conversation_id TEXT,      -- Set once the job has saved its conversation
+        optimized_resume TEXT,
+        cover_letter TEXT,
+        optimization_summary TEXT,
+        error TEXT,
+        created_at TIMESTAMP,
+        updated_at TIMESTAMP
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, request_hash)")
+
+
+def _migrate_revision_deltas(cursor):
+    """Store document revisions as compressed snapshots and deltas instead of full text"""
+    cursor.execute("PRAGMA table_info(document_revisions)")
+    columns = {row[1] for row in cursor.fetchall()}
+    for column, column_type in (("encoding", "TEXT"), ("payload", "BLOB"), ("base_id", "INTEGER"),
+                                ("chain_depth", "INTEGER"), ("content_length", "INTEGER")):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE document_revisions ADD COLUMN {column} {column_type}")
+    
+    # Re-encode each document's existing revisions as a chain, oldest first
+    cursor.execute('''
+    SELECT id, conversation_id, document_type, content FROM document_revisions
+    WHERE encoding IS NULL
+    ORDER BY conversation_id, document_type, timestamp, id
+    ''')
+    previous_document, previous, previous_id, depth = None, None, None, 0
+    for revision_id, conversation_id, document_type, content in cursor.fetchall():
+        if (conversation_id, document_type) != previous_document:
+            previous, previous_id, depth = None, None, 0
+        content = content or ""
+        encoding, payload, depth = encode_revision(previous, content, depth, REVISION_SNAPSHOT_INTERVAL)
+        cursor.execute('''
+        UPDATE document_revisions
+        SET encoding = ?, payload = ?, base_id = ?, chain_depth = ?, content_length = ?, content = NULL
+        WHERE id = ?
+        ''', (encoding, payload, previous_id if encoding == DELTA else None, depth, len(content), revision_id))
+        previous_document, previous, previous_id = (conversation_id, document_type), content, revision_id
+
+
+def _migrate_state_data_documents(cursor):
+    """Drop the document texts that state_data duplicated from their own columns"""
+    cursor.execute("SELECT conversation_id, state_data FROM conversations WHERE state_data IS NOT NULL")
+    updates = []
+    for conversation_id, state_data in cursor.fetchall():
+        try:
+            state = json.loads(state_data)
+        except ValueError:
+            continue
+        if isinstance(state, dict) and any(key in state for key in DOCUMENT_COLUMNS):
+            remaining = {key: value for key, value in state.items() if key not in DOCUMENT_COLUMNS}
+            updates.append((json.dumps(remaining), conversation_id))
+    cursor.executemany("UPDATE conversations SET state_data = ? WHERE conversation_id = ?", updates)
+
+
+def _migrate_job_leases(cursor):
+    """Let server processes claim jobs, and hold them only while they keep renewing"""
+    cursor.execute("PRAGMA table_info(jobs)")
+    columns = {row[1] for row in cursor.fetchall()}
+    for column, column_type in (("owner", "TEXT"), ("lease_expires_at", "TIMESTAMP")):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+
+
+def _migrate_lookup_indexes(cursor):
+    """Index the per-conversation lookups so they don't scan whole tables"""
+    # get(), delete() and the last-saved-message lookup in set()
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages (conversation_id, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_conversation_key ON messages (conversation_id, message_key)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_conversation_role ON messages (conversation_id, role, id)")
+    # get_document_revisions() and delete()
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_document_revisions_lookup
+    ON document_revisions (conversation_id, document_type, timestamp)
+    ''')
+    # Covers the revision links that get() attaches to messages
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_document_revisions_message
+    ON document_revisions (conversation_id, message_id, document_type)
+    ''')
+    # Covers list_conversations()
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_conversations_updated_at
+    ON conversations (updated_at DESC, conversation_id, created_at)
+    ''')
+
+
+# Ordered schema migrations as (version, name, function). Each one runs once in its
+# own transaction and is recorded in schema_migrations. Append new migrations here;
+# never edit or reorder ones that have shipped.
+MIGRATIONS = [
+    (1, "initial schema", _migrate_initial_schema),
+    (2, "document revision message links", _migrate_revision_message_id),
+    (3, "message keys", _migrate_message_keys),
+    (4, "lookup indexes", _migrate_lookup_indexes),
+    (5, "conversation version stamps", _migrate_conversation_version),
+    (6, "rolling conversation summaries", _migrate_conversation_summaries),
+    (7, "idempotency keys", _migrate_idempotency_keys),
+    (8, "generation jobs", _migrate_jobs),
+    (9, "delta-encoded document revisions", _migrate_revision_deltas),
+    (10, "state data without document copies", _migrate_state_data_documents),
+    (11, "job leases", _migrate_job_leases),
+]
+
+# A document revision is stored in full (compressed) at least every this many
+# revisions; the ones in between are deltas against their predecessor
+REVISION_SNAPSHOT_INTERVAL = int(os.getenv("REVISION_SNAPSHOT_INTERVAL", "10"))
+
+# Columns of the jobs table that update_job may change
+JOB_UPDATE_COLUMNS = ("status", "conversation_id", "optimized_resume", "cover_letter", "optimization_summary", "error")
+
+class ConcurrentModificationError(Exception):
+    """A save expected a conversation version that another writer has already replaced"""
+
+
+# State keys that are stored outside conversations.state_data
+NON_STATE_DATA_KEYS = ("messages", "version", "conversation_summary", "summarized_through")
+
+# State keys with their own conversations columns; state_data never repeats them
+DOCUMENT_COLUMNS = ("job_description", "resume", "personal_summary", "optimized_resume", "cover_letter")
+
+
+def is_persisted_message(msg) -> bool:
+    """Whether set() stores this message; AI messages with empty content that aren't function calls are skipped"""
+    return not (getattr(msg, "type", "") == "ai" and
+                not getattr(msg, "content", "") and
+                "function_call" not in getattr(msg, "additional_kwargs", {}))
+
+
 class SQLiteConversationStore:
     """SQLite-based storage for conversation history and state"""
     
-    def __init__(self, db_path="conversations.db"):
+    def __init__(self, db_path="conversations.db", busy_timeout=5.0, cached_statements=256):
         """Initialize the SQLite conversation store"""
-        logger.info(f"Initializing SQLite conversation store at {db_path}")
+        logger.info("Initializing SQLite conversation store at %s", db_path)
         self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        # One connection per thread, reused across calls and closed by close()
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
         self._initialize_db()
     
     def _get_connection(self):
-        """Get a connection to the SQLite database"""
-        return sqlite3.connect(self.db_path)
+        """Get the calling thread's connection to the SQLite database, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+        
+        # check_same_thread is off only so close() can release connections owned by
+        # other threads; each connection is otherwise used by a single thread
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout,
+            cached_statements=self.cached_statements,
+            check_same_thread=False
+        )
+        # WAL lets readers proceed while a writer commits; NORMAL sync is durable
+        # across application crashes and much cheaper than FULL in WAL mode
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout * 1000)}")
+        
+        self._local.conn = conn
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+    
+    def close(self):
+        """Close every pooled connection"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception as e:
+                logger.warning("Error closing SQLite connection: %s", e)
+        # Threads that held a connection will reopen one on next use
+        self._local = threading.local()
+        logger.info("Closed %s SQLite connections", len(connections))
     
     def _initialize_db(self):
-        """Initialize the database schema if it doesn't exist"""
+        """Bring the database schema up to date by running pending migrations"""
         try:
             conn = self._get_connection()
             cursor = conn.cursor()
             
-            # Create conversations table
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS conversations (
-                conversation_id TEXT PRIMARY KEY,
-                created_at TIMESTAMP,
-                updated_at TIMESTAMP,
-                job_description TEXT,
-                resume TEXT,
-                personal_summary TEXT,
-                optimized_resume TEXT,
-                cover_letter TEXT,
-                state_data TEXT
-            )
-            ''')
-            
-            # Create messages table
             cursor.execute('''
-            CREATE TABLE IF NOT EXISTS messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                conversation_id TEXT,
-                timestamp TIMESTAMP,
-                role TEXT,
-                content TEXT,
-                metadata TEXT,
-                FOREIGN KEY (conversation_id) REFERENCES conversations (conversation_id)
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT,
+                applied_at TIMESTAMP
             )
             ''')
             
-            # Create document revisions table with message_id to link revisions to specific chat messages
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS document_revisions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                conversation_id TEXT,
-                document_type TEXT,  -- 'resume' or 'cover_letter'
-                content TEXT,
-                timestamp TIMESTAMP,
-                feedback TEXT,        -- The feedback that prompted this revision
-                message_id INTEGER,   -- Reference to the message that triggered this revision
-                FOREIGN KEY (conversation_id) REFERENCES conversations (conversation_id),
-                FOREIGN KEY (message_id) REFERENCES messages (id)
-            )
-            ''')
-            
-            # Check if message_id column exists, add it if it doesn't
-            cursor.execute("PRAGMA table_info(document_revisions)")
-            columns = [column[1] for column in cursor.fetchall()]
-            if "message_id" not in columns:
-                cursor.execute("ALTER TABLE document_revisions ADD COLUMN message_id INTEGER")
-                logger.info("Added message_id column to document_revisions table")
+            for version, name, migrate in MIGRATIONS:
+                # Take the write lock before checking so concurrent workers don't
+                # apply the same migration twice
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute("SELECT 1 FROM schema_migrations WHERE version = ?", (version,))
+                if cursor.fetchone():
+                    conn.rollback()
+                    continue
+                
+                migrate(cursor)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, name, applied_at) VALUES (?, ?, ?)",
+                    (version, name, datetime.now().isoformat())
+                )
+                conn.commit()
+                logger.info("Applied schema migration %s: %s", version, name)
             
-            conn.commit()
-            logger.info("Database schema initialized")
+            logger.info("Database schema initialized at version %s", self._schema_version(cursor))
         except Exception as e:
-            logger.error(f"Error initializing database: {str(e)}", exc_info=True)
-        finally:
+            # Refuse to start on a half-migrated schema
+            logger.error("Error initializing database: %s", e, exc_info=True)
             if 'conn' in locals():
-                conn.close()
+                conn.rollback()
+            raise
+    
+    @staticmethod
+    def _schema_version(cursor) -> int:
+        """Return the highest applied migration version"""
+        cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+        return cursor.fetchone()[0]
     
-    def set(self, conversation_id: str, state: Dict[str, Any]):
-        """Save or update conversation state"""
+    def set(self, conversation_id: str, state: Dict[str, Any], expected_version: Optional[int] = None) -> Optional[int]:
+        """Save or update conversation state and return its new version, or None if the save failed.
+        
+        With expected_version, the save only applies if the stored conversation is
+        still at that version; otherwise nothing is written and
+        ConcurrentModificationError is raised.
+        """
         try:
             now = datetime.now().isoformat()
             conn = self._get_connection()
             cursor = conn.cursor()
             
             # First, check if conversation exists
-            cursor.execute("SELECT conversation_id, optimized_resume, cover_letter FROM conversations WHERE conversation_id = ?", (conversation_id,))
+            cursor.execute("SELECT conversation_id, optimized_resume, cover_letter, version FROM conversations WHERE conversation_id = ?", (conversation_id,))
             existing = cursor.fetchone()
+            if expected_version is not None and (not existing or existing[3] != expected_version):
+                raise ConcurrentModificationError(
+                    f"Conversation {conversation_id} is no longer at version {expected_version}"
+                )
             
             # Convert LangChain message objects to serializable format
             messages = state.get("messages", [])
             serializable_messages = []
             for msg in messages:
                 # Skip AI messages with empty content that aren't function calls
-                if (getattr(msg, "type", "") == "ai" and 
-                    not getattr(msg, "content", "") and 
-                    "function_call" not in getattr(msg, "additional_kwargs", {})):
+                if not is_persisted_message(msg):
                     continue
+                
+                # Give every message a stable key so later saves can recognise it
+                if not getattr(msg, "id", None):
+                    msg.id = str(uuid.uuid4())
                     
                 msg_dict = {
+                    "key": msg.id,
                     "role": getattr(msg, "type", "unknown"),
                     "content": getattr(msg, "content", ""),
                     "metadata": json.dumps(getattr(msg, "additional_kwargs", {}))
                 }
                 serializable_messages.append(msg_dict)
             
-            # Remove messages from state data (we'll store them separately)
-            state_copy = state.copy()
-            if "messages" in state_copy:
-                del state_copy["messages"]
+            # Remove messages from state data (we'll store them separately), along
+            # with the other keys and the documents that have their own columns or tables
+            state_copy = {
+                key: value for key, value in state.items()
+                if key not in NON_STATE_DATA_KEYS and key not in DOCUMENT_COLUMNS
+            }
+            with STATE_JSON_SECONDS.time(operation="dumps"):
+                state_json = json.dumps(state_copy)
+            STATE_JSON_BYTES.inc(len(state_json), operation="write")
             
             # Get current document versions
             current_resume = state.get("optimized_resume", "")
             current_cover_letter = state.get("cover_letter", "")
             
-            # Clear existing messages and insert new ones
-            cursor.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+            # Only insert messages added since the last save; existing rows keep their ids
+            new_messages = self._unsaved_messages(cursor, conversation_id, serializable_messages)
             
             # Insert messages and get their IDs
             message_ids = []
-            for msg in serializable_messages:
+            for msg in new_messages:
                 cursor.execute('''
-                INSERT INTO messages (conversation_id, timestamp, role, content, metadata)
-                VALUES (?, ?, ?, ?, ?)
+                INSERT INTO messages (conversation_id, timestamp, role, content, metadata, message_key)
+                VALUES (?, ?, ?, ?, ?, ?)
                 ''', (
                     conversation_id,
                     now,
                     msg["role"],
                     msg["content"],
-                    msg["metadata"]
+                    msg["metadata"],
+                    msg["key"]
                 ))
                 message_ids.append(cursor.lastrowid)
             
@@ -145,30 +428,50 @@ class SQLiteConversationStore:
             last_human_content = ""
             last_ai_message_id = None
             
-            for i, msg in enumerate(serializable_messages):
+            for i, msg in enumerate(new_messages):
                 if msg["role"] == "human":
                     last_human_message_id = message_ids[i]
                     last_human_content = msg["content"]
                 elif msg["role"] == "ai":
                     last_ai_message_id = message_ids[i]
             
+            # Fall back to previously saved messages when this save added none
+            if existing and last_human_message_id is None:
+                cursor.execute('''
+                SELECT id, content FROM messages
+                WHERE conversation_id = ? AND role = 'human'
+                ORDER BY id DESC LIMIT 1
+                ''', (conversation_id,))
+                row = cursor.fetchone()
+                if row:
+                    last_human_message_id, last_human_content = row
+            if existing and last_ai_message_id is None:
+                cursor.execute('''
+                SELECT id FROM messages
+                WHERE conversation_id = ? AND role = 'ai'
+                ORDER BY id DESC LIMIT 1
+                ''', (conversation_id,))
+                row = cursor.fetchone()
+                if row:
+                    last_ai_message_id = row[0]
+            
             # Check for document updates and save revisions if needed
             if existing:
-                existing_id, existing_resume, existing_cover_letter = existing
+                existing_id, existing_resume, existing_cover_letter, _ = existing
                 
                 # Use the last human message as feedback for document revisions
                 feedback = last_human_content
                 
                 # Check if resume was updated
                 if current_resume and existing_resume != current_resume:
-                    logger.info(f"Detected resume update for conversation {conversation_id}")
+                    logger.info("Detected resume update for conversation %s", conversation_id)
                     self._save_document_revision(
                         cursor, conversation_id, "resume", current_resume, now, feedback, last_ai_message_id
                     )
                 
                 # Check if cover letter was updated
                 if current_cover_letter and existing_cover_letter != current_cover_letter:
-                    logger.info(f"Detected cover letter update for conversation {conversation_id}")
+                    logger.info("Detected cover letter update for conversation %s", conversation_id)
                     self._save_document_revision(
                         cursor, conversation_id, "cover_letter", current_cover_letter, now, feedback, last_ai_message_id
                     )
@@ -195,8 +498,9 @@ class SQLiteConversationStore:
                     personal_summary = ?,
                     optimized_resume = ?,
                     cover_letter = ?,
-                    state_data = ?
-                WHERE conversation_id = ?
+                    state_data = ?,
+                    version = version + 1
+                WHERE conversation_id = ? AND (? IS NULL OR version = ?)
                 ''', (
                     now,
                     state.get("job_description", ""),
@@ -204,17 +508,24 @@ class SQLiteConversationStore:
                     state.get("personal_summary", ""),
                     current_resume,
                     current_cover_letter,
-                    json.dumps(state_copy),
-                    conversation_id
+                    state_json,
+                    conversation_id,
+                    expected_version,
+                    expected_version
                 ))
-                logger.info(f"Updated conversation {conversation_id} in database")
+                if cursor.rowcount == 0:
+                    # Another writer saved between our read and this update
+                    raise ConcurrentModificationError(
+                        f"Conversation {conversation_id} is no longer at version {expected_version}"
+                    )
+                logger.info("Updated conversation %s in database", conversation_id)
             else:
                 # Insert new conversation
                 cursor.execute('''
                 INSERT INTO conversations (
                     conversation_id, created_at, updated_at, job_description, resume, 
-                    personal_summary, optimized_resume, cover_letter, state_data
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    personal_summary, optimized_resume, cover_letter, state_data, version
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
                 ''', (
                     conversation_id,
                     now,
@@ -224,27 +535,107 @@ class SQLiteConversationStore:
                     state.get("personal_summary", ""),
                     current_resume,
                     current_cover_letter,
-                    json.dumps(state_copy)
+                    state_json
                 ))
-                logger.info(f"Created new conversation {conversation_id} in database")
+                logger.info("Created new conversation %s in database", conversation_id)
+            
+            # Read the new version while the write lock is still held
+            cursor.execute("SELECT version FROM conversations WHERE conversation_id = ?", (conversation_id,))
+            version = cursor.fetchone()[0]
             
             conn.commit()
-            logger.info(f"Saved {len(serializable_messages)} messages for conversation {conversation_id}")
-        except Exception as e:
-            logger.error(f"Error saving conversation {conversation_id}: {str(e)}", exc_info=True)
+            logger.info("Saved %s new messages for conversation %s (version %s)", len(new_messages), conversation_id, version)
+            return version
+        except ConcurrentModificationError as e:
+            logger.warning("Rejected stale save: %s", e)
             if 'conn' in locals():
                 conn.rollback()
-        finally:
+            raise
+        except Exception as e:
+            logger.error("Error saving conversation %s: %s", conversation_id, e, exc_info=True)
             if 'conn' in locals():
-                conn.close()
+                conn.rollback()
+            return None
+    
+    def _unsaved_messages(self, cursor, conversation_id, serializable_messages):
+        """Return the messages that haven't been persisted yet, in order"""
+        if not serializable_messages:
+            return []
+        
+        cursor.execute('''
+        SELECT message_key FROM messages
+        WHERE conversation_id = ?
+        ORDER BY id DESC LIMIT 1
+        ''', (conversation_id,))
+        row = cursor.fetchone()
+        if not row:
+            return serializable_messages
+        
+        # Conversations only grow at the end, so everything after the most recently
+        # saved message is new
+        last_key = row[0]
+        for i in range(len(serializable_messages) - 1, -1, -1):
+            if serializable_messages[i]["key"] == last_key:
+                return serializable_messages[i + 1:]
+        
+        # The caller's history doesn't contain the last saved message; compare all keys
+        cursor.execute("SELECT message_key FROM messages WHERE conversation_id = ?", (conversation_id,))
+        saved_keys = {key for (key,) in cursor.fetchall()}
+        return [msg for msg in serializable_messages if msg["key"] not in saved_keys]
     
     def _save_document_revision(self, cursor, conversation_id, document_type, content, timestamp, feedback, message_id=None):
-        """Save a document revision with optional message_id"""
+        """Save a document revision with optional message_id, as a delta against the previous revision when that's smaller"""
         cursor.execute('''
-        INSERT INTO document_revisions (conversation_id, document_type, content, timestamp, feedback, message_id)
-        VALUES (?, ?, ?, ?, ?, ?)
-        ''', (conversation_id, document_type, content, timestamp, feedback, message_id))
-        logger.info(f"Saved {document_type} revision for conversation {conversation_id} linked to message {message_id}")
+        SELECT id, chain_depth FROM document_revisions
+        WHERE conversation_id = ? AND document_type = ?
+        ORDER BY timestamp DESC, id DESC
+        LIMIT 1
+        ''', (conversation_id, document_type))
+        latest = cursor.fetchone()
+        previous = self._revision_content(cursor, latest[0]) if latest else None
+        encoding, payload, depth = encode_revision(
+            previous, content, (latest[1] or 0) if latest else 0, REVISION_SNAPSHOT_INTERVAL
+        )
+        cursor.execute('''
+        INSERT INTO document_revisions (
+            conversation_id, document_type, timestamp, feedback, message_id,
+            encoding, payload, base_id, chain_depth, content_length
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            conversation_id, document_type, timestamp, feedback, message_id,
+            encoding, payload, latest[0] if encoding == DELTA else None, depth, len(content)
+        ))
+        logger.info("Saved %s revision for conversation %s linked to message %s", document_type, conversation_id, message_id)
+    
+    def _revision_content(self, cursor, revision_id: int, cache: Optional[Dict[int, str]] = None) -> Optional[str]:
+        """Rebuild a revision's text from its snapshot and the deltas after it.
+        
+        `cache` maps revision ids to text already rebuilt; passing the same dict while
+        walking a document's revisions in order makes each one a single delta step.
+        """
+        cache = {} if cache is None else cache
+        chain = []
+        current = revision_id
+        while current is not None and current not in cache:
+            cursor.execute(
+                "SELECT encoding, payload, content, base_id FROM document_revisions WHERE id = ?", (current,)
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            chain.append((current, row))
+            current = row[3] if row[0] == DELTA else None
+        
+        text = cache.get(current) if current is not None else None
+        for chained_id, (encoding, payload, content, _) in reversed(chain):
+            if encoding == DELTA:
+                text = apply_delta(text, payload)
+            elif encoding == SNAPSHOT:
+                text = decompress_text(payload)
+            else:
+                text = content
+            cache[chained_id] = text
+        return text
     
     def get_document_revisions(self, conversation_id: str, document_type: str) -> List[Dict[str, Any]]:
         """Get revision history for a document"""
@@ -253,31 +644,106 @@ class SQLiteConversationStore:
             cursor = conn.cursor()
             
             cursor.execute('''
-            SELECT id, content, timestamp, feedback, message_id
+            SELECT id, timestamp, feedback, message_id
             FROM document_revisions
             WHERE conversation_id = ? AND document_type = ?
-            ORDER BY timestamp ASC
+            ORDER BY timestamp ASC, id ASC
             ''', (conversation_id, document_type))
             
+            contents = {}
             revisions = [
                 {
                     "id": row[0],
-                    "content": row[1],
+                    "content": self._revision_content(cursor, row[0], contents),
+                    "timestamp": row[1],
+                    "feedback": row[2],
+                    "message_id": row[3]
+                }
+                for row in cursor.fetchall()
+            ]
+            
+            logger.info("Retrieved %s %s revisions for conversation %s", len(revisions), document_type, conversation_id)
+            return revisions
+        except Exception as e:
+            logger.error("Error retrieving document revisions: %s", e, exc_info=True)
+            return []
+    
+    def get_document_history(self, conversation_id: str, document_type: str, limit: Optional[int] = None,
+                             offset: int = 0, include_content: bool = True) -> List[Dict[str, Any]]:
+        """Get revision history for a document together with each revision's linked message.
+        
+        Revisions and messages come back from a single joined query. With
+        include_content=False only revision metadata and content_length are returned.
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+            SELECT r.id, r.content_length, r.timestamp, r.feedback, r.message_id,
+                   m.id, m.role, m.content, m.timestamp
+            FROM document_revisions r
+            LEFT JOIN messages m ON m.id = r.message_id
+            WHERE r.conversation_id = ? AND r.document_type = ?
+            ORDER BY r.timestamp ASC, r.id ASC
+            LIMIT ? OFFSET ?
+            ''', (conversation_id, document_type, -1 if limit is None else limit, offset))
+            
+            rows = cursor.fetchall()
+            contents = {}
+            revisions = []
+            for row in rows:
+                revision = {
+                    "id": row[0],
                     "timestamp": row[2],
                     "feedback": row[3],
                     "message_id": row[4]
                 }
-                for row in cursor.fetchall()
-            ]
+                if include_content:
+                    revision["content"] = self._revision_content(cursor, row[0], contents)
+                else:
+                    revision["content_length"] = row[1] or 0
+                if row[5] is not None:
+                    revision["message"] = {
+                        "content": row[7],
+                        "role": row[6],
+                        "timestamp": row[8]
+                    }
+                revisions.append(revision)
             
-            logger.info(f"Retrieved {len(revisions)} {document_type} revisions for conversation {conversation_id}")
+            logger.info("Retrieved %s %s revisions with messages for conversation %s", len(revisions), document_type, conversation_id)
             return revisions
         except Exception as e:
-            logger.error(f"Error retrieving document revisions: {str(e)}", exc_info=True)
+            logger.error("Error retrieving document history: %s", e, exc_info=True)
             return []
-        finally:
-            if 'conn' in locals():
-                conn.close()
+    
+    def get_document_revision(self, conversation_id: str, revision_id: int) -> Optional[Dict[str, Any]]:
+        """Get a single document revision, including its content"""
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+            SELECT id, document_type, timestamp, feedback, message_id
+            FROM document_revisions
+            WHERE conversation_id = ? AND id = ?
+            ''', (conversation_id, revision_id))
+            
+            row = cursor.fetchone()
+            if not row:
+                return None
+            
+            return {
+                "id": row[0],
+                "document_type": row[1],
+                "content": self._revision_content(cursor, row[0]),
+                "timestamp": row[2],
+                "feedback": row[3],
+                "message_id": row[4]
+            }
+        except Exception as e:
+            logger.error("Error retrieving document revision %s: %s", revision_id, e, exc_info=True)
+            return None
     
     def get_message_by_id(self, message_id: int) -> Optional[Dict[str, Any]]:
         """Get a message by its ID"""
@@ -306,34 +772,40 @@ class SQLiteConversationStore:
             
             return message
         except Exception as e:
-            logger.error(f"Error retrieving message {message_id}: {str(e)}", exc_info=True)
+            logger.error("Error retrieving message %s: %s", message_id, e, exc_info=True)
             return None
-        finally:
-            if 'conn' in locals():
-                conn.close()
     
-    def get(self, conversation_id: str) -> Optional[Dict[str, Any]]:
-        """Retrieve conversation state by ID"""
+    def get(self, conversation_id: str, include_messages: bool = True,
+            message_limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Retrieve conversation state by ID.
+        
+        Messages are only hydrated when asked for: include_messages=False returns the
+        state with an empty message list, and message_limit keeps only the most recent
+        messages. Either way the state can be passed back to set(), which only
+        appends messages it hasn't stored yet.
+        """
         try:
             conn = self._get_connection()
             cursor = conn.cursor()
             
             # Get conversation data
             cursor.execute('''
-            SELECT job_description, resume, personal_summary, optimized_resume, cover_letter, state_data
+            SELECT job_description, resume, personal_summary, optimized_resume, cover_letter, state_data, version
             FROM conversations
             WHERE conversation_id = ?
             ''', (conversation_id,))
             
             row = cursor.fetchone()
             if not row:
-                logger.warning(f"Conversation {conversation_id} not found in database")
+                logger.warning("Conversation %s not found in database", conversation_id)
                 return None
             
-            job_description, resume, personal_summary, optimized_resume, cover_letter, state_data = row
+            job_description, resume, personal_summary, optimized_resume, cover_letter, state_data, version = row
             
             # Parse state data
-            state = json.loads(state_data)
+            STATE_JSON_BYTES.inc(len(state_data), operation="read")
+            with STATE_JSON_SECONDS.time(operation="loads"):
+                state = json.loads(state_data)
             
             # Add core fields
             state["job_description"] = job_description
@@ -341,66 +813,457 @@ class SQLiteConversationStore:
             state["personal_summary"] = personal_summary
             state["optimized_resume"] = optimized_resume
             state["cover_letter"] = cover_letter
+            state["version"] = version
+            
+            if include_messages:
+                state["messages"] = self._load_messages(cursor, conversation_id, message_limit)
+            else:
+                state["messages"] = []
+            logger.info("Retrieved conversation %s with %s messages", conversation_id, len(state['messages']))
+            
+            return state
+        except Exception as e:
+            logger.error("Error retrieving conversation %s: %s", conversation_id, e, exc_info=True)
+            return None
+    
+    def get_version(self, conversation_id: str) -> Optional[int]:
+        """Get the conversation's version stamp, or None if it doesn't exist"""
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT version FROM conversations WHERE conversation_id = ?", (conversation_id,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+        except Exception as e:
+            logger.error("Error retrieving version for conversation %s: %s", conversation_id, e, exc_info=True)
+            return None
+    
+    def get_documents(self, conversation_id: str) -> Optional[Dict[str, str]]:
+        """Get only the current optimized resume and cover letter"""
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+            SELECT optimized_resume, cover_letter
+            FROM conversations
+            WHERE conversation_id = ?
+            ''', (conversation_id,))
+            
+            row = cursor.fetchone()
+            if not row:
+                logger.warning("Conversation %s not found in database", conversation_id)
+                return None
+            
+            return {"optimized_resume": row[0] or "", "cover_letter": row[1] or ""}
+        except Exception as e:
+            logger.error("Error retrieving documents for conversation %s: %s", conversation_id, e, exc_info=True)
+            return None
+    
+    def get_conversation_metadata(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Get timestamps and message count without loading any content"""
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+            SELECT created_at, updated_at,
+                   (SELECT COUNT(*) FROM messages WHERE conversation_id = c.conversation_id)
+            FROM conversations c
+            WHERE conversation_id = ?
+            ''', (conversation_id,))
+            
+            row = cursor.fetchone()
+            if not row:
+                return None
+            
+            return {
+                "id": conversation_id,
+                "created_at": row[0],
+                "updated_at": row[1],
+                "message_count": row[2]
+            }
+        except Exception as e:
+            logger.error("Error retrieving metadata for conversation %s: %s", conversation_id, e, exc_info=True)
+            return None
+    
+    def get_summary(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Get the running summary of a conversation's older turns"""
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+            SELECT summary, summarized_through_id, summarized_through_key, updated_at
+            FROM conversation_summaries
+            WHERE conversation_id = ?
+            ''', (conversation_id,))
+            
+            row = cursor.fetchone()
+            if not row:
+                return None
+            
+            return {
+                "summary": row[0],
+                "summarized_through_id": row[1],
+                "summarized_through_key": row[2],
+                "updated_at": row[3]
+            }
+        except Exception as e:
+            logger.error("Error retrieving summary for conversation %s: %s", conversation_id, e, exc_info=True)
+            return None
+    
+    def save_summary(self, conversation_id: str, summary: str, through_id: int, through_key: str,
+                     previous_through_id: Optional[int] = None) -> bool:
+        """Save a new running summary covering messages up to through_id.
+        
+        The write only succeeds if the stored summary still ends at previous_through_id,
+        so two summarizers racing on one conversation can't fold the same turns twice.
+        """
+        try:
+            now = datetime.now().isoformat()
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            if previous_through_id is None:
+                cursor.execute('''
+                INSERT OR IGNORE INTO conversation_summaries
+                    (conversation_id, summary, summarized_through_id, summarized_through_key, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ''', (conversation_id, summary, through_id, through_key, now))
+            else:
+                cursor.execute('''
+                UPDATE conversation_summaries SET
+                    summary = ?,
+                    summarized_through_id = ?,
+                    summarized_through_key = ?,
+                    updated_at = ?
+                WHERE conversation_id = ? AND summarized_through_id = ?
+                ''', (summary, through_id, through_key, now, conversation_id, previous_through_id))
             
-            # Get messages with their IDs and any linked document revisions
+            conn.commit()
+            saved = cursor.rowcount > 0
+            if saved:
+                logger.info("Saved summary for conversation %s through message %s", conversation_id, through_id)
+            else:
+                logger.info("Summary for conversation %s changed concurrently, discarding", conversation_id)
+            return saved
+        except Exception as e:
+            logger.error("Error saving summary for conversation %s: %s", conversation_id, e, exc_info=True)
+            if 'conn' in locals():
+                conn.rollback()
+            return False
+    
+    def get_messages_after(self, conversation_id: str, after_id: int = 0) -> List[Dict[str, Any]]:
+        """Get the raw messages stored after message row after_id, oldest first"""
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+            SELECT id, message_key, role, content
+            FROM messages
+            WHERE conversation_id = ? AND id > ?
+            ORDER BY id ASC
+            ''', (conversation_id, after_id))
+            
+            return [
+                {"id": row[0], "key": row[1], "role": row[2], "content": row[3]}
+                for row in cursor.fetchall()
+            ]
+        except Exception as e:
+            logger.error("Error retrieving messages for conversation %s: %s", conversation_id, e, exc_info=True)
+            return []
+    
+    def get_recent_messages(self, conversation_id: str, limit: int) -> List[Any]:
+        """Get the last `limit` messages of a conversation as LangChain message objects"""
+        try:
+            conn = self._get_connection()
+            return self._load_messages(conn.cursor(), conversation_id, limit)
+        except Exception as e:
+            logger.error("Error retrieving recent messages for %s: %s", conversation_id, e, exc_info=True)
+            return []
+    
+    def _load_messages(self, cursor, conversation_id: str, limit: Optional[int] = None) -> List[Any]:
+        """Hydrate messages (oldest first) into LangChain objects, optionally only the last `limit`"""
+        # Get messages with their IDs and any linked document revisions
+        if limit is None:
             cursor.execute('''
-            SELECT id, role, content, metadata
+            SELECT id, role, content, metadata, message_key
             FROM messages
             WHERE conversation_id = ?
             ORDER BY id ASC
             ''', (conversation_id,))
+        else:
+            cursor.execute('''
+            SELECT id, role, content, metadata, message_key FROM (
+                SELECT id, role, content, metadata, message_key
+                FROM messages
+                WHERE conversation_id = ?
+                ORDER BY id DESC
+                LIMIT ?
+            ) ORDER BY id ASC
+            ''', (conversation_id, limit))
+        
+        message_rows = cursor.fetchall()
+        if limit is not None:
+            # Don't start the window on an orphaned tool result or AI reply
+            while message_rows and message_rows[0][1] != "human":
+                message_rows.pop(0)
+        if not message_rows:
+            return []
+        
+        # Get document revisions linked to the loaded messages
+        cursor.execute('''
+        SELECT message_id, document_type, id
+        FROM document_revisions
+        WHERE conversation_id = ? AND message_id >= ?
+        ''', (conversation_id, message_rows[0][0]))
+        
+        # Create a mapping of message_id to document revisions
+        message_revisions = {}
+        for msg_id, doc_type, rev_id in cursor.fetchall():
+            if msg_id not in message_revisions:
+                message_revisions[msg_id] = []
+            message_revisions[msg_id].append({"type": doc_type, "revision_id": rev_id})
+        
+        from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, ToolMessage
+        
+        messages = []
+        for msg_id, role, content, metadata, message_key in message_rows:
+            # Convert back to LangChain message objects
+            metadata_dict = json.loads(metadata) if metadata else {}
             
-            message_rows = cursor.fetchall()
+            # Add document revision info to metadata if exists
+            if msg_id in message_revisions:
+                metadata_dict["document_revisions"] = message_revisions[msg_id]
+            
+            if role == "human":
+                msg = HumanMessage(content=content, additional_kwargs=metadata_dict, id=message_key)
+            elif role == "ai":
+                msg = AIMessage(content=content, additional_kwargs=metadata_dict, id=message_key)
+            elif role == "system":
+                msg = SystemMessage(content=content, additional_kwargs=metadata_dict, id=message_key)
+            elif role == "tool":
+                msg = ToolMessage(content=content, tool_call_id=metadata_dict.get("tool_call_id", "unknown"), id=message_key)
+            else:
+                # Default fallback
+                msg = AIMessage(content=content, additional_kwargs={"role": role, **metadata_dict}, id=message_key)
+            
+            messages.append(msg)
+        
+        return messages
+    
+    def claim_idempotency_key(self, idempotency_key: str, request_hash: str) -> Optional[Dict[str, Any]]:
+        """Claim an idempotency key for a new request.
+        
+        Returns None if the key was free and is now claimed by the caller. Otherwise
+        returns the existing record: its request_hash and, once the original request
+        has finished, its response (None while it is still in progress).
+        """
+        try:
+            now = datetime.now().isoformat()
+            conn = self._get_connection()
+            cursor = conn.cursor()
             
-            # Get document revisions linked to messages
             cursor.execute('''
-            SELECT message_id, document_type, id
-            FROM document_revisions
-            WHERE conversation_id = ? AND message_id IS NOT NULL
-            ''', (conversation_id,))
+            INSERT OR IGNORE INTO idempotency_keys (idempotency_key, request_hash, created_at)
+            VALUES (?, ?, ?)
+            ''', (idempotency_key, request_hash, now))
+            conn.commit()
+            if cursor.rowcount > 0:
+                return None
             
-            # Create a mapping of message_id to document revisions
-            message_revisions = {}
-            for msg_id, doc_type, rev_id in cursor.fetchall():
-                if msg_id not in message_revisions:
-                    message_revisions[msg_id] = []
-                message_revisions[msg_id].append({"type": doc_type, "revision_id": rev_id})
+            cursor.execute('''
+            SELECT request_hash, conversation_id, response
+            FROM idempotency_keys
+            WHERE idempotency_key = ?
+            ''', (idempotency_key,))
+            row = cursor.fetchone()
+            if not row:
+                # Released between the insert and the read; let the caller retry
+                return {"request_hash": request_hash, "conversation_id": None, "response": None}
             
-            from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, ToolMessage
+            return {
+                "request_hash": row[0],
+                "conversation_id": row[1],
+                "response": json.loads(row[2]) if row[2] else None
+            }
+        except Exception as e:
+            logger.error("Error claiming idempotency key %s: %s", idempotency_key, e, exc_info=True)
+            if 'conn' in locals():
+                conn.rollback()
+            raise
+    
+    def complete_idempotency_key(self, idempotency_key: str, conversation_id: str, response: Dict[str, Any],
+                                 retention_hours: int = 24):
+        """Store the response for a claimed key and drop keys older than retention_hours"""
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
             
-            messages = []
-            for msg_id, role, content, metadata in message_rows:
-                # Convert back to LangChain message objects
-                metadata_dict = json.loads(metadata) if metadata else {}
-                
-                # Add document revision info to metadata if exists
-                if msg_id in message_revisions:
-                    metadata_dict["document_revisions"] = message_revisions[msg_id]
-                
-                if role == "human":
-                    msg = HumanMessage(content=content, additional_kwargs=metadata_dict)
-                elif role == "ai":
-                    msg = AIMessage(content=content, additional_kwargs=metadata_dict)
-                elif role == "system":
-                    msg = SystemMessage(content=content, additional_kwargs=metadata_dict)
-                elif role == "tool":
-                    msg = ToolMessage(content=content, tool_call_id=metadata_dict.get("tool_call_id", "unknown"))
-                else:
-                    # Default fallback
-                    msg = AIMessage(content=content, additional_kwargs={"role": role, **metadata_dict})
-                
-                messages.append(msg)
+            cursor.execute('''
+            UPDATE idempotency_keys SET conversation_id = ?, response = ?
+            WHERE idempotency_key = ?
+            ''', (conversation_id, json.dumps(response), idempotency_key))
+            cutoff = (datetime.now() - timedelta(hours=retention_hours)).isoformat()
+            cursor.execute("DELETE FROM idempotency_keys WHERE created_at < ?", (cutoff,))
+            conn.commit()
+        except Exception as e:
+            logger.error("Error saving idempotent response for %s: %s", idempotency_key, e, exc_info=True)
+            if 'conn' in locals():
+                conn.rollback()
+    
+    def release_idempotency_key(self, idempotency_key: str):
+        """Release a claimed key whose request failed so it can be retried"""
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                "DELETE FROM idempotency_keys WHERE idempotency_key = ? AND response IS NULL", (idempotency_key,)
+            )
+            conn.commit()
+        except Exception as e:
+            logger.error("Error releasing idempotency key %s: %s", idempotency_key, e, exc_info=True)
+            if 'conn' in locals():
+                conn.rollback()
+    
+    def create_job(self, job_id: str, request_hash: str, request: Dict[str, Any], retention_hours: int = 24 * 7) -> bool:
+        """Record a queued job and drop finished jobs older than retention_hours"""
+        try:
+            now = datetime.now().isoformat()
+            conn = self._get_connection()
+            cursor = conn.cursor()
             
-            state["messages"] = messages
-            logger.info(f"Retrieved conversation {conversation_id} with {len(messages)} messages")
+            cursor.execute('''
+            INSERT INTO jobs (job_id, status, request_hash, request, created_at, updated_at)
+            VALUES (?, 'queued', ?, ?, ?, ?)
+            ''', (job_id, request_hash, json.dumps(request), now, now))
             
-            return state
+            cutoff = (datetime.now() - timedelta(hours=retention_hours)).isoformat()
+            cursor.execute(
+                "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND updated_at < ?", (cutoff,)
+            )
+            conn.commit()
+            return True
+        except Exception as e:
+            logger.error("Error creating job %s: %s", job_id, e, exc_info=True)
+            if 'conn' in locals():
+                conn.rollback()
+            return False
+    
+    def update_job(self, job_id: str, owner: Optional[str] = None, **fields) -> bool:
+        """Update a job's status and/or results. With `owner`, only while that owner
+        still holds the running job; False if it doesn't."""
+        try:
+            columns = [column for column in fields if column in JOB_UPDATE_COLUMNS]
+            if len(columns) != len(fields):
+                raise ValueError(f"Unknown job fields: {sorted(set(fields) - set(columns))}")
+            
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            assignments = ", ".join(f"{column} = ?" for column in columns)
+            params = [fields[column] for column in columns] + [datetime.now().isoformat(), job_id]
+            condition = "job_id = ?"
+            if owner is not None:
+                condition += " AND owner = ? AND status = 'running'"
+                params.append(owner)
+            cursor.execute(f"UPDATE jobs SET {assignments}, updated_at = ? WHERE {condition}", params)
+            conn.commit()
+            return cursor.rowcount > 0
+        except Exception as e:
+            logger.error("Error updating job %s: %s", job_id, e, exc_info=True)
+            if 'conn' in locals():
+                conn.rollback()
+            return False
+    
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job's status and whatever results it has produced so far"""
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+            SELECT job_id, status, conversation_id, optimized_resume, cover_letter,
+                   optimization_summary, error, created_at, updated_at
+            FROM jobs
+            WHERE job_id = ?
+            ''', (job_id,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            
+            return {
+                "job_id": row[0],
+                "status": row[1],
+                "conversation_id": row[2],
+                "optimized_resume": row[3],
+                "cover_letter": row[4],
+                "optimization_summary": row[5],
+                "error": row[6],
+                "created_at": row[7],
+                "updated_at": row[8]
+            }
         except Exception as e:
-            logger.error(f"Error retrieving conversation {conversation_id}: {str(e)}", exc_info=True)
+            logger.error("Error retrieving job %s: %s", job_id, e, exc_info=True)
             return None
-        finally:
+    
+    def claim_job(self, job_id: str, owner: str, lease_seconds: int) -> bool:
+        """Mark a job running under `owner` if it is queued or its last owner's lease
+        has expired. Only one caller can win the claim."""
+        try:
+            now = datetime.now()
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+            UPDATE jobs SET status = 'running', owner = ?, lease_expires_at = ?, updated_at = ?
+            WHERE job_id = ? AND (status = 'queued' OR (status = 'running' AND
+                                  (lease_expires_at IS NULL OR lease_expires_at < ?)))
+            ''', (owner, (now + timedelta(seconds=lease_seconds)).isoformat(), now.isoformat(),
+                  job_id, now.isoformat()))
+            conn.commit()
+            return cursor.rowcount > 0
+        except Exception as e:
+            logger.error("Error claiming job %s: %s", job_id, e, exc_info=True)
             if 'conn' in locals():
-                conn.close()
+                conn.rollback()
+            return False
+    
+    def renew_job_lease(self, job_id: str, owner: str, lease_seconds: int) -> bool:
+        """Extend a running job's lease; False if `owner` no longer holds it"""
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+            UPDATE jobs SET lease_expires_at = ?
+            WHERE job_id = ? AND owner = ? AND status = 'running'
+            ''', ((datetime.now() + timedelta(seconds=lease_seconds)).isoformat(), job_id, owner))
+            conn.commit()
+            return cursor.rowcount > 0
+        except Exception as e:
+            logger.error("Error renewing lease on job %s: %s", job_id, e, exc_info=True)
+            if 'conn' in locals():
+                conn.rollback()
+            return False
+    
+    def get_unfinished_jobs(self) -> List[Dict[str, Any]]:
+        """Jobs waiting to be claimed: queued ones, and running ones whose owner's
+        lease has expired (e.g. the process died), oldest first"""
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+            SELECT job_id, request FROM jobs
+            WHERE status = 'queued' OR (status = 'running' AND (lease_expires_at IS NULL OR lease_expires_at < ?))
+            ORDER BY created_at
+            ''', (datetime.now().isoformat(),))
+            return [{"job_id": row[0], "request": json.loads(row[1])} for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error("Error listing unfinished jobs: %s", e, exc_info=True)
+            return []
     
     def list_conversations(self, limit=100, offset=0):
         """List conversations with pagination"""
@@ -422,11 +1285,8 @@ class SQLiteConversationStore:
             
             return conversations
         except Exception as e:
-            logger.error(f"Error listing conversations: {str(e)}", exc_info=True)
+            logger.error("Error listing conversations: %s", e, exc_info=True)
             return []
-        finally:
-            if 'conn' in locals():
-                conn.close()
     
     def delete(self, conversation_id: str) -> bool:
         """Delete a conversation and its messages"""
@@ -440,22 +1300,46 @@ class SQLiteConversationStore:
             # Delete messages next (foreign key constraint)
             cursor.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
             
+            cursor.execute("DELETE FROM conversation_summaries WHERE conversation_id = ?", (conversation_id,))
+            
             # Delete conversation
             cursor.execute("DELETE FROM conversations WHERE conversation_id = ?", (conversation_id,))
             
             conn.commit()
             deleted = cursor.rowcount > 0
             if deleted:
-                logger.info(f"Deleted conversation {conversation_id}")
+                logger.info("Deleted conversation %s", conversation_id)
             else:
-                logger.warning(f"Attempted to delete non-existent conversation {conversation_id}")
+                logger.warning("Attempted to delete non-existent conversation %s", conversation_id)
             
             return deleted
         except Exception as e:
-            logger.error(f"Error deleting conversation {conversation_id}: {str(e)}", exc_info=True)
+            logger.error("Error deleting conversation %s: %s", conversation_id, e, exc_info=True)
             if 'conn' in locals():
                 conn.rollback()
             return False
-        finally:
-            if 'conn' in locals():
-                conn.close() 
\ No newline at end of file
+
+
+class AsyncConversationStore:
+    """Async facade over a conversation store.
+
+    Every store method is run in a worker thread via ``asyncio.to_thread`` so
+    SQLite I/O never blocks the event loop, e.g. ``await store.get(conversation_id)``.
+    """
+    
+    def __init__(self, store: SQLiteConversationStore):
+        self.store = store
+    
+    def __getattr__(self, name):
+        attr = getattr(self.store, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+        
+        # Timed inside the worker thread, so waiting for a free thread isn't counted as store time
+        timed_attr = timed(STORE_CALL_SECONDS, method=name)(attr)
+        
+        @functools.wraps(attr)
+        async def run_in_thread(*args, **kwargs):
+            return await asyncio.to_thread(timed_attr, *args, **kwargs)
+        
+        return run_in_thread
@@ -0,0 +1,184 @@
+# documents.py
+import re
+import difflib
+from typing import List, Dict, Any, Tuple
+
+# Markdown headings, ALL-CAPS headings ("EXPERIENCE", "SKILLS:") and bold-only lines ("**Education**")
+SECTION_HEADING = re.compile(r"^\s*(#{1,6}\s+\S.*|[A-Z][A-Z0-9 &/,-]{2,}:?|\*\*[^*]+\*\*:?)\s*$")
+
+
+# One edit in a model's patch reply; markers and the separator must be whole lines,
+# so text like a "==========" heading underline can't end the SEARCH part early
+PATCH_BLOCK = re.compile(r"^<{7} SEARCH\n(?:(.*?)\n)?={7}\n(.*?)^>{7} REPLACE$", re.DOTALL | re.MULTILINE)
+
+# Reply a model gives when the requested change is too broad to patch
+FULL_REWRITE = "FULL_REWRITE"
+
+ORDINALS = ("first", "second", "third", "fourth", "fifth", "sixth", "seventh", "eighth", "ninth", "tenth")
+
+
+def _heading_name(line: str) -> str:
+    return line.strip().lstrip("#").strip().strip("*").rstrip(":").strip()
+
+
+def split_sections(text: str) -> List[Tuple[str, str]]:
+    """Split a document into (name, body) sections.
+
+    Documents with headings are split at each heading; text before the first one
+    becomes a "header" section. Documents without headings (e.g. most cover
+    letters) are split into paragraphs named by position.
+    """
+    lines = (text or "").strip().splitlines()
+    if any(SECTION_HEADING.match(line) for line in lines):
+        sections = [("header", [])]
+        for line in lines:
+            if SECTION_HEADING.match(line):
+                sections.append((_heading_name(line), []))
+            else:
+                sections[-1][1].append(line)
+        return [(name, "\n".join(body).strip()) for name, body in sections if name != "header" or any(body)]
+
+    paragraphs = [paragraph.strip() for paragraph in re.split(r"\n\s*\n", (text or "").strip()) if paragraph.strip()]
+    names = []
+    for index in range(len(paragraphs)):
+        if index == 0 and len(paragraphs) > 1:
+            names.append("opening paragraph")
+        elif index == len(paragraphs) - 1 and len(paragraphs) > 2:
+            names.append("closing paragraph")
+        elif index < len(ORDINALS):
+            names.append(f"{ORDINALS[index]} paragraph")
+        else:
+            names.append(f"paragraph {index + 1}")
+    return list(zip(names, paragraphs))
+
+
+def _is_positional(name: str) -> bool:
+    """Whether a section name comes from its position rather than a heading"""
+    return name == "header" or name.endswith(" paragraph") or name.startswith("paragraph ")
+
+
+def _line_changes(before: str, after: str) -> Tuple[int, int]:
+    """Count lines added and removed between two section bodies"""
+    added = removed = 0
+    for line in difflib.ndiff(before.splitlines(), after.splitlines()):
+        if line.startswith("+ "):
+            added += 1
+        elif line.startswith("- "):
+            removed += 1
+    return added, removed
+
+
+def diff_sections(before: str, after: str) -> Dict[str, Any]:
+    """Section-level diff of two versions of a document.
+
+    Returns {"changed": [(name, lines_added, lines_removed)], "renamed": [(old_name, new_name)],
+    "added": [names], "removed": [names], "words_before": int, "words_after": int}.
+    """
+    old_sections = split_sections(before)
+    new_sections = split_sections(after)
+    diff = {
+        "changed": [],
+        "renamed": [],
+        "added": [],
+        "removed": [],
+        "words_before": len((before or "").split()),
+        "words_after": len((after or "").split())
+    }
+
+    # Align sections by name, falling back to content for unnamed paragraphs
+    old_keys = [body if _is_positional(name) else name for name, body in old_sections]
+    new_keys = [body if _is_positional(name) else name for name, body in new_sections]
+    matcher = difflib.SequenceMatcher(None, old_keys, new_keys, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            for (name, old_body), (_, new_body) in zip(old_sections[i1:i2], new_sections[j1:j2]):
+                if old_body != new_body:
+                    diff["changed"].append((name, *_line_changes(old_body, new_body)))
+        elif tag == "replace" and i2 - i1 == j2 - j1:
+            # Sections edited in place: paragraphs rewritten, or headings renamed over
+            # mostly the same text (a new heading over new text is a replacement)
+            for (old_name, old_body), (name, new_body) in zip(old_sections[i1:i2], new_sections[j1:j2]):
+                if (_is_positional(old_name) != _is_positional(name) or
+                        not _is_positional(name) and
+                        difflib.SequenceMatcher(None, old_body, new_body).ratio() < 0.5):
+                    diff["removed"].append(old_name)
+                    diff["added"].append(name)
+                    continue
+                if not _is_positional(name):
+                    diff["renamed"].append((old_name, name))
+                if old_body != new_body:
+                    diff["changed"].append((name, *_line_changes(old_body, new_body)))
+        else:
+            diff["removed"].extend(name for name, _ in old_sections[i1:i2])
+            diff["added"].extend(name for name, _ in new_sections[j1:j2])
+    return diff
+
+
+def _join(names: List[str]) -> str:
+    if len(names) <= 2:
+        return " and ".join(names)
+    return ", ".join(names[:-1]) + f" and {names[-1]}"
+
+
+def _describe(names: List[str]) -> str:
+    """Render section names, e.g. "the header and the Skills and Projects sections"."""
+    phrases = [f"the {name}" for name in names if _is_positional(name)]
+    headed = [name for name in names if not _is_positional(name)]
+    if headed:
+        phrases.append(f"the {_join(headed)} section{'s' if len(headed) > 1 else ''}")
+    return _join(phrases)
+
+
+def describe_changes(document_label: str, before: str, after: str) -> str:
+    """A short, template-based explanation of an edit, built from diff_sections"""
+    if (before or "").strip() == (after or "").strip():
+        return f"I reviewed your {document_label}, but the update didn't change its text."
+
+    diff = diff_sections(before, after)
+    parts = []
+    if diff["renamed"]:
+        parts.append("renamed " + _join([f"the {old} section to {new}" for old, new in diff["renamed"]]))
+    if diff["changed"]:
+        parts.append(f"revised {_describe([name for name, _, _ in diff['changed']])}")
+    if diff["added"]:
+        parts.append(f"added {_describe(diff['added'])}")
+    if diff["removed"]:
+        parts.append(f"removed {_describe(diff['removed'])}")
+    if not parts:
+        # Same sections with only whitespace or ordering differences
+        parts.append("reworked the wording and layout")
+
+    response = f"I've updated your {document_label}: I {_join(parts)}."
+    delta = diff["words_after"] - diff["words_before"]
+    if abs(delta) >= 10:
+        response += f" It's now about {abs(delta)} words {'longer' if delta > 0 else 'shorter'}."
+    return response
+
+
+class PatchError(ValueError):
+    """A model's patch reply can't be applied safely"""
+
+
+def parse_patches(reply: str) -> List[Tuple[str, str]]:
+    """Extract (search, replace) pairs from SEARCH/REPLACE blocks in a model reply"""
+    if FULL_REWRITE in (reply or ""):
+        raise PatchError("the model asked for a full rewrite")
+    patches = []
+    for search, replace in PATCH_BLOCK.findall(reply or ""):
+        if not search.strip():
+            raise PatchError("empty SEARCH block")
+        patches.append((search, replace[:-1] if replace.endswith("\n") else replace))
+    if not patches:
+        raise PatchError("no SEARCH/REPLACE blocks found")
+    return patches
+
+
+def apply_patches(document: str, patches: List[Tuple[str, str]]) -> str:
+    """Apply patches in order; each SEARCH text must occur exactly once in the document"""
+    for search, replace in patches:
+        occurrences = document.count(search)
+        if occurrences != 1:
+            preview = search.strip().splitlines()[0][:60]
+            raise PatchError(f"SEARCH text found {occurrences} times: {preview!r}")
+        document = document.replace(search, replace, 1)
+    return document
@@ -0,0 +1,131 @@
+# jobs.py
+import os
+import uuid
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFullError(Exception):
+    """The job queue already holds as many pending jobs as it accepts"""
+
+
+class JobQueue:
+    """Bounded pool of asyncio workers running jobs whose status lives in the store.
+
+    `handler(job_id, request)` does the work and returns a dict of result fields
+    for `store.update_job`; it may also record partial results as it goes. A worker
+    first claims its job in the store under a lease it renews while the job runs,
+    so server processes sharing the database never run the same job twice. Queued
+    jobs, and running jobs whose owner stopped renewing (e.g. the process died),
+    are picked up on start and by a sweep every `lease_seconds`.
+    """
+
+    def __init__(self, store, handler: Callable[[str, Dict[str, Any]], Awaitable[Dict[str, Any]]],
+                 workers: int = 4, max_pending: int = 100, lease_seconds: int = 60):
+        self.store = store
+        self.handler = handler
+        self.workers = workers
+        self.max_pending = max_pending
+        self.lease_seconds = lease_seconds
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:12]}"
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        # Jobs this process has queued or is running
+        self._known: Set[str] = set()
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        resumed = await self._enqueue_unfinished()
+        self._tasks = [asyncio.create_task(self._work(index)) for index in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweep()))
+        logger.info("Started %s job workers as %s (%s jobs resumed)", self.workers, self.owner, resumed)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        # Interrupted jobs stay "running" in the store until their lease expires,
+        # then the next process to start or sweep resumes them
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._known.clear()
+
+    async def submit(self, job_id: str, request_hash: str, request: Dict[str, Any]):
+        """Persist and enqueue a job, or raise JobQueueFullError"""
+        if self.pending() >= self.max_pending:
+            raise JobQueueFullError(f"{self.pending()} jobs already pending")
+        if not await self.store.create_job(job_id, request_hash, request):
+            raise RuntimeError(f"Could not record job {job_id}")
+        self._known.add(job_id)
+        self._queue.put_nowait((job_id, request))
+        logger.info("Queued job %s (%s pending)", job_id, self.pending())
+
+    async def _enqueue_unfinished(self) -> int:
+        """Queue claimable jobs this process doesn't already hold; workers claim them
+        before running, so another process picking up the same jobs is harmless"""
+        count = 0
+        for job in await self.store.get_unfinished_jobs():
+            if job["job_id"] in self._known or self.pending() >= self.max_pending:
+                continue
+            logger.info("Resuming job %s", job['job_id'])
+            self._known.add(job["job_id"])
+            self._queue.put_nowait((job["job_id"], job["request"]))
+            count += 1
+        return count
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds)
+            try:
+                await self._enqueue_unfinished()
+            except Exception as e:
+                logger.error("Error sweeping for unfinished jobs: %s", e, exc_info=True)
+
+    async def _renew_lease(self, job_id: str, handler_task: asyncio.Task):
+        """Keep the lease alive while the handler runs; if it's lost, another
+        process may already be rerunning the job, so stop this run"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not await self.store.renew_job_lease(job_id, self.owner, self.lease_seconds):
+                logger.warning("Lost the lease on job %s, stopping it", job_id)
+                handler_task.cancel()
+                return
+
+    async def _work(self, index: int):
+        while True:
+            job_id, request = await self._queue.get()
+            heartbeat = None
+            try:
+                if not await self.store.claim_job(job_id, self.owner, self.lease_seconds):
+                    logger.info("Job %s was claimed elsewhere, skipping", job_id)
+                    continue
+                logger.info("Worker %s running job %s", index, job_id)
+                handler_task = asyncio.create_task(self.handler(job_id, request))
+                heartbeat = asyncio.create_task(self._renew_lease(job_id, handler_task))
+                try:
+                    result = await handler_task
+                except asyncio.CancelledError:
+                    if heartbeat.done() and not heartbeat.cancelled():
+                        # Cancelled by the heartbeat, not by stop()
+                        continue
+                    raise
+                if await self.store.update_job(job_id, owner=self.owner, status="succeeded", **result):
+                    logger.info("Job %s succeeded", job_id)
+                else:
+                    logger.warning("Dropped the result of job %s, its lease was lost", job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Job %s failed: %s", job_id, e, exc_info=True)
+                await self.store.update_job(job_id, owner=self.owner, status="failed", error=str(e))
+            finally:
+                if heartbeat is not None:
+                    heartbeat.cancel()
+                self._known.discard(job_id)
+                self._queue.task_done()
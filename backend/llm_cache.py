@@ -0,0 +1,230 @@
+# llm_cache.py
+import os
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Sequence
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import Generation
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Set while a caller has opted out of the cache for the calls it makes
+_bypass = ContextVar("llm_cache_bypass", default=False)
+
+# Responses cut short like this are worth retrying, so they are never cached
+UNCACHEABLE_FINISH_REASONS = {"MALFORMED_FUNCTION_CALL", "SAFETY", "RECITATION", "OTHER"}
+
+
+@contextmanager
+def bypass_llm_cache():
+    """Skip the LLM cache (both lookup and store) for model calls made inside this block"""
+    token = _bypass.set(True)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def _normalize_prompt(prompt: str) -> str:
+    """The serialized messages reduced to what the model sees.
+
+    LangChain serializes whole message objects, including the fresh ids every
+    turn assigns to messages and tool calls, so keying on `prompt` as-is would
+    never match a repeated request. Only type, name, content, tool calls (name
+    and arguments) and a legacy `function_call` payload are kept.
+    """
+    try:
+        messages = json.loads(prompt)
+    except ValueError:
+        return prompt
+    if not isinstance(messages, list):
+        return prompt
+
+    normalized = []
+    for message in messages:
+        fields = message.get("kwargs", {}) if isinstance(message, dict) else {}
+        normalized.append([
+            fields.get("type"),
+            fields.get("name"),
+            fields.get("content"),
+            [[call.get("name"), call.get("args")] for call in fields.get("tool_calls") or []],
+            (fields.get("additional_kwargs") or {}).get("function_call")
+        ])
+    return json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+
+
+def _cache_key(prompt: str, llm_string: str) -> str:
+    # llm_string already encodes the model, its parameters (temperature etc.)
+    # and call kwargs such as bound tools; prompt is the serialized messages
+    key = f"{llm_string}\x00{_normalize_prompt(prompt)}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _cacheable(generations: Sequence[Generation]) -> bool:
+    for generation in generations:
+        message = getattr(generation, "message", None)
+        metadata = {**(getattr(message, "additional_kwargs", None) or {}),
+                    **(getattr(message, "response_metadata", None) or {})}
+        if metadata.get("finish_reason") in UNCACHEABLE_FINISH_REASONS:
+            return False
+        if not generation.text and not getattr(message, "tool_calls", None):
+            return False
+    return bool(generations)
+
+
+def _copy(generations: Sequence[Generation]):
+    # Callers mutate returned messages (e.g. LangGraph assigns ids), so the
+    # memory tier never hands out the objects it holds
+    return [generation.model_copy(deep=True) for generation in generations]
+
+
+def _with_fresh_ids(generations: Sequence[Generation]):
+    """Give a hit's messages and tool calls new ids. LangChain only assigns ids to
+    generated responses, and a cached one carrying the original call's id would
+    replace that message in graph state instead of being appended."""
+    run_id = uuid.uuid4()
+    for index, generation in enumerate(generations):
+        message = getattr(generation, "message", None)
+        if message is None:
+            continue
+        message.id = f"run-{run_id}-{index}"
+        for call in (getattr(message, "tool_calls", None) or []) + (getattr(message, "invalid_tool_calls", None) or []):
+            if call.get("id"):
+                call["id"] = f"call_{uuid.uuid4().hex[:24]}"
+    return generations
+
+
+class TieredLLMCache(BaseCache):
+    """Content-addressed cache of model responses.
+
+    Lookups check an in-memory LRU first and then a SQLite table, promoting hits
+    into memory. Entries expire after `ttl_seconds` in both tiers. Plug it in with
+    the chat model's `cache=` argument; LangChain then consults it for every
+    invoke/ainvoke (streaming calls are not cached).
+    """
+
+    def __init__(self, db_path: str = "llm_cache.db", max_entries: int = 512, ttl_seconds: int = 24 * 3600):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "bypassed": 0}
+        self._updates_since_prune = 0
+
+        # Async lookups run in executor threads, so the connection is shared behind the lock
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute('''
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            cache_key TEXT PRIMARY KEY,
+            generations TEXT,
+            created_at REAL,
+            expires_at REAL
+        )
+        ''')
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_expires_at ON llm_cache (expires_at)")
+        self._conn.commit()
+        logger.info("LLM response cache at %s (memory %s entries, ttl %ss)", db_path, max_entries, ttl_seconds)
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        if _bypass.get():
+            with self._lock:
+                self._counters["bypassed"] += 1
+            return None
+
+        key = _cache_key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, generations = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return _with_fresh_ids(_copy(generations))
+                del self._memory[key]
+
+            try:
+                row = self._conn.execute(
+                    "SELECT generations, expires_at FROM llm_cache WHERE cache_key = ?", (key,)
+                ).fetchone()
+            except Exception as e:
+                logger.error("Error reading LLM cache: %s", e, exc_info=True)
+                row = None
+
+            if row is None or row[1] <= now:
+                self._counters["misses"] += 1
+                return None
+
+            generations = loads(row[0])
+            self._remember(key, row[1], _copy(generations))
+            self._counters["disk_hits"] += 1
+            return _with_fresh_ids(generations)
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        if _bypass.get() or not _cacheable(return_val):
+            return
+
+        key = _cache_key(prompt, llm_string)
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        with self._lock:
+            self._remember(key, expires_at, _copy(return_val))
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (cache_key, generations, created_at, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, dumps(list(return_val)), now, expires_at)
+                )
+                # Expired rows are only ever skipped on read; sweep them now and then
+                self._updates_since_prune += 1
+                if self._updates_since_prune >= 100:
+                    self._conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+                    self._updates_since_prune = 0
+                self._conn.commit()
+                self._counters["stores"] += 1
+            except Exception as e:
+                logger.error("Error writing LLM cache: %s", e, exc_info=True)
+                self._conn.rollback()
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and the size of the memory tier"""
+        with self._lock:
+            return {**self._counters, "memory_entries": len(self._memory)}
+
+    def _remember(self, key: str, expires_at: float, generations: Sequence[Generation]):
+        """Put an entry in the memory tier, evicting the least recently used (lock held)"""
+        self._memory[key] = (expires_at, generations)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+
+def create_llm_cache() -> Optional[TieredLLMCache]:
+    """Build the LLM cache from the environment, or None if LLM_CACHE is disabled"""
+    if os.getenv("LLM_CACHE", "true").lower() in ("0", "false", "no", "off"):
+        logger.info("LLM response cache disabled")
+        return None
+    return TieredLLMCache(
+        db_path=os.getenv("LLM_CACHE_DB", "llm_cache.db"),
+        max_entries=int(os.getenv("LLM_CACHE_ENTRIES", "512")),
+        ttl_seconds=int(os.getenv("LLM_CACHE_TTL_SECONDS", str(24 * 3600)))
+    )
@@ -0,0 +1,112 @@
+# logging_config.py
+import os
+import sys
+import copy
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from typing import Optional
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# The running listener, so repeated configure_logging() calls (e.g. reloads) don't stack pipelines
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class TruncatingFilter(logging.Filter):
+    """Cut messages longer than `max_chars`, so one huge payload can't flood the sinks"""
+
+    def __init__(self, max_chars: int):
+        super().__init__()
+        self.max_chars = max_chars
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.max_chars <= 0:
+            return True
+        message = record.getMessage()
+        if len(message) > self.max_chars:
+            record.msg = f"{message[:self.max_chars]}... [{len(message) - self.max_chars} more characters]"
+            record.args = None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a `rate` fraction of records below WARNING; warnings and errors always pass"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Queues records with their message resolved but not yet formatted.
+
+    The stock QueueHandler runs the full formatter on the calling thread; here
+    only the message arguments (which may change after the call) and traceback
+    are rendered there, and timestamps and layout are left to the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging():
+    """Route all logging through a queue drained by a background thread.
+
+    Request handlers only enqueue records; writing to stderr and to a rotating log
+    file happens on the listener thread. Configured by LOG_LEVEL, LOG_FILE (empty
+    to disable), LOG_FILE_MAX_MB, LOG_FILE_BACKUPS, LOG_MAX_CHARS and LOG_SAMPLE_RATE.
+    """
+    global _listener
+    shutdown_logging()
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler(sys.stderr)]
+    log_file = os.getenv("LOG_FILE", "app.log")
+    if log_file:
+        handlers.append(logging.handlers.RotatingFileHandler(
+            log_file,
+            maxBytes=int(os.getenv("LOG_FILE_MAX_MB", "10")) * 1024 * 1024,
+            backupCount=int(os.getenv("LOG_FILE_BACKUPS", "5")),
+            encoding="utf-8"
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    queue_handler = _QueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(SamplingFilter(float(os.getenv("LOG_SAMPLE_RATE", "1"))))
+    queue_handler.addFilter(TruncatingFilter(int(os.getenv("LOG_MAX_CHARS", "2000"))))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+# Drain whatever is still queued when the process exits
+atexit.register(shutdown_logging)
@@ -0,0 +1,277 @@
+# metrics.py
+import time
+import asyncio
+import functools
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Bucket upper bounds in seconds, from sub-millisecond store calls up to slow model calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...], extra: Sequence[Tuple[str, str]] = ()) -> str:
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """A monotonically increasing count, e.g. tokens or bytes processed"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{self._labels(key)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    """A value read when metrics are rendered.
+
+    `function` returns a number, or for labelled gauges a dict mapping label value
+    tuples to numbers.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, function: Callable[[], Any], labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def samples(self) -> Iterator[str]:
+        value = self.function()
+        values = value.items() if isinstance(value, dict) else [((), value)]
+        for key, sample in sorted(values):
+            yield f"{self.name}{self._labels(tuple(str(part) for part in key))} {_format_value(sample)}"
+
+
+class Histogram(_Metric):
+    """Distribution of durations (or sizes) in cumulative buckets"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # Per label set: [bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return int(state[-1]) if state else 0
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block. If the histogram has an "outcome" label
+        and it isn't given, it is set to "ok" or "error" depending on how the block ends."""
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            yield
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            if "outcome" in self.labelnames and "outcome" not in labels:
+                labels["outcome"] = outcome
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted((key, list(state)) for key, state in self._values.items())
+        for key, state in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                yield f"{self.name}_bucket{self._labels(key, [('le', _format_value(bound))])} {cumulative}"
+            yield f"{self.name}_sum{self._labels(key)} {_format_value(state[-2])}"
+            yield f"{self.name}_count{self._labels(key)} {int(state[-1])}"
+
+
+class Registry:
+    """Named metrics rendered together in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> Any:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} is already registered differently")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, function: Callable[[], Any],
+              labelnames: Sequence[str] = ()) -> Gauge:
+        with self._lock:
+            # Gauges read live objects, so re-registering replaces the reader
+            gauge = self._metrics[name] = Gauge(name, documentation, function, labelnames)
+            return gauge
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+registry = Registry()
+
+# Metrics recorded across the app
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "hitch_http_request_seconds", "Time to complete an HTTP response, by route and status",
+    ("method", "route", "status")
+)
+GRAPH_NODE_SECONDS = registry.histogram(
+    "hitch_graph_node_seconds", "Time spent in each LangGraph node", ("node", "outcome")
+)
+LLM_CALL_SECONDS = registry.histogram(
+    "hitch_llm_call_seconds", "Model call time including queueing and retries", ("mode", "outcome")
+)
+LLM_QUEUE_SECONDS = registry.histogram(
+    "hitch_llm_queue_seconds", "Time model calls wait for a concurrency slot", ("priority",)
+)
+LLM_TOKENS = registry.counter(
+    "hitch_llm_tokens_total", "Tokens sent to and received from the model", ("direction",)
+)
+LLM_BYTES = registry.counter(
+    "hitch_llm_bytes_total", "Bytes of prompt and response text exchanged with the model", ("direction",)
+)
+STORE_CALL_SECONDS = registry.histogram(
+    "hitch_store_call_seconds", "Time spent in conversation store methods", ("method", "outcome")
+)
+STATE_JSON_SECONDS = registry.histogram(
+    "hitch_state_json_seconds", "Time spent serializing and parsing conversation state JSON", ("operation",)
+)
+STATE_JSON_BYTES = registry.counter(
+    "hitch_state_json_bytes_total", "Bytes of conversation state JSON written and read", ("operation",)
+)
+
+
+def timed(histogram: Histogram, **labels) -> Callable:
+    """Decorator recording each call's duration in `histogram`; works on sync and async functions"""
+    def decorate(fn: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with histogram.time(**labels):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware timing every HTTP request into HTTP_REQUEST_SECONDS.
+
+    Requests are labelled by route template (e.g. "/api/jobs/{job_id}") so ids in
+    paths don't multiply the series; streamed responses are timed to their last byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=scope["method"],
+                                         route=getattr(route, "path", "unmatched"), status=status)
+
+
+def record_llm_exchange(messages: Sequence[Any], response: Optional[Any]):
+    """Count the prompt and response bytes of a model call, and its tokens when the provider reports them"""
+    LLM_BYTES.inc(sum(len(str(getattr(m, "content", "")).encode("utf-8")) for m in messages), direction="prompt")
+    if response is None:
+        return
+    LLM_BYTES.inc(len(str(getattr(response, "content", "")).encode("utf-8")), direction="response")
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage:
+        LLM_TOKENS.inc(usage.get("input_tokens", 0), direction="input")
+        LLM_TOKENS.inc(usage.get("output_tokens", 0), direction="output")
@@ -0,0 +1,208 @@
+# providers.py
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+from typing import Any, Dict, Iterator, AsyncIterator, List, Optional, Sequence
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal")
+
+# Vocabulary the fake model writes its documents and replies from
+_WORDS = (
+    "designed built led shipped improved reduced scaled automated migrated mentored "
+    "platform service pipeline team customers latency reliability revenue costs api "
+    "python sql cloud data analytics product roadmap stakeholders release quality"
+).split()
+_SECTIONS = ("Summary", "Experience", "Projects", "Skills", "Education")
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic local stand-in for the Gemini model, for benchmarks and offline runs.
+
+    Each reply and its latency are derived from a hash of the prompt and `seed`, so
+    the same run produces the same traffic. Latency follows `latency_distribution`
+    around `latency_ms`; documents are about `output_words` words and chat replies
+    about `reply_words`. With tools bound, a chat turn asks for a document edit with
+    probability `tool_call_rate` (or a malformed call with `malformed_rate`), and
+    patch prompts are answered with a one-line patch with probability `patch_rate`.
+    """
+
+    latency_ms: float = 800.0
+    latency_jitter_ms: float = 200.0
+    latency_distribution: str = "normal"
+    output_words: int = 300
+    reply_words: int = 40
+    tool_call_rate: float = 0.5
+    malformed_rate: float = 0.0
+    patch_rate: float = 0.8
+    seed: int = 0
+    stream_chunk_words: int = 20
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "FakeChatModel":
+        distribution = os.getenv("FAKE_LLM_LATENCY_DISTRIBUTION", "normal").lower()
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"FAKE_LLM_LATENCY_DISTRIBUTION must be one of {', '.join(LATENCY_DISTRIBUTIONS)}")
+        return cls(
+            latency_ms=float(os.getenv("FAKE_LLM_LATENCY_MS", "800")),
+            latency_jitter_ms=float(os.getenv("FAKE_LLM_LATENCY_JITTER_MS", "200")),
+            latency_distribution=distribution,
+            output_words=int(os.getenv("FAKE_LLM_OUTPUT_WORDS", "300")),
+            reply_words=int(os.getenv("FAKE_LLM_REPLY_WORDS", "40")),
+            tool_call_rate=float(os.getenv("FAKE_LLM_TOOL_CALL_RATE", "0.5")),
+            malformed_rate=float(os.getenv("FAKE_LLM_MALFORMED_RATE", "0")),
+            patch_rate=float(os.getenv("FAKE_LLM_PATCH_RATE", "0.8")),
+            seed=int(os.getenv("FAKE_LLM_SEED", "0")),
+            **kwargs
+        )
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs):
+        tool_names = [convert_to_openai_tool(t)["function"]["name"] for t in tools]
+        return self.bind(tools=tool_names, **kwargs)
+
+    def _rng(self, messages: List[BaseMessage]) -> random.Random:
+        prompt = "\x00".join(f"{m.type}:{m.content}" for m in messages)
+        return random.Random(f"{self.seed}:{hashlib.sha256(prompt.encode('utf-8')).hexdigest()}")
+
+    def _latency(self, rng: random.Random) -> float:
+        """Seconds this call takes"""
+        mean, jitter = self.latency_ms, self.latency_jitter_ms
+        if self.latency_distribution == "fixed":
+            ms = mean
+        elif self.latency_distribution == "uniform":
+            ms = rng.uniform(mean - jitter, mean + jitter)
+        elif self.latency_distribution == "lognormal":
+            # Long right tail with the configured median
+            ms = mean * rng.lognormvariate(0, jitter / mean if mean else 0)
+        else:
+            ms = rng.gauss(mean, jitter)
+        return max(0.0, ms) / 1000
+
+    def _text(self, rng: random.Random, words: int) -> str:
+        return " ".join(rng.choice(_WORDS) for _ in range(max(1, words)))
+
+    def _document(self, rng: random.Random) -> str:
+        per_section = max(1, self.output_words // len(_SECTIONS))
+        parts = ["# Candidate Name"]
+        for section in _SECTIONS:
+            parts.append(f"## {section}\n{self._text(rng, per_section).capitalize()}.")
+        return "\n\n".join(parts)
+
+    def _patch(self, rng: random.Random, prompt: str) -> str:
+        """A SEARCH/REPLACE block rewriting one line of the document in a patch prompt"""
+        lines = prompt.splitlines()
+        start = next((i for i, line in enumerate(lines) if line.strip().startswith("Current ")), None)
+        end = next((i for i, line in enumerate(lines) if line.strip().startswith("Feedback")), None)
+        if start is None or end is None or rng.random() >= self.patch_rate:
+            return "FULL_REWRITE"
+        candidates = [line for line in lines[start + 2:end] if line.strip() and prompt.count(line) == 1]
+        if not candidates:
+            return "FULL_REWRITE"
+        line = rng.choice(candidates)
+        return f"<<<<<<< SEARCH\n{line}\n=======\n{line} {self._text(rng, 5)}\n>>>>>>> REPLACE"
+
+    def _reply(self, messages: List[BaseMessage], tools: Optional[List[str]]) -> AIMessage:
+        rng = self._rng(messages)
+        last = messages[-1].content if isinstance(messages[-1].content, str) else str(messages[-1].content)
+        is_chat_turn = messages[0].type == "system" and messages[-1].type == "human"
+        metadata = {"finish_reason": "STOP", "model_name": "fake"}
+
+        if tools and is_chat_turn:
+            roll = rng.random()
+            if roll < self.malformed_rate:
+                return AIMessage(content="", response_metadata={**metadata, "finish_reason": "MALFORMED_FUNCTION_CALL"})
+            if roll < self.malformed_rate + self.tool_call_rate:
+                name = "update_cover_letter" if "cover letter" in last.lower() else "update_resume"
+                if name not in tools:
+                    name = tools[0]
+                tool_call = {"name": name, "args": {"feedback": last[:500]}, "id": f"call_{rng.getrandbits(48):012x}"}
+                return AIMessage(content="", tool_calls=[tool_call], response_metadata=metadata)
+
+        if "SEARCH/REPLACE" in last:
+            content = self._patch(rng, last)
+        elif messages[0].type == "system":
+            content = self._text(rng, self.reply_words).capitalize() + "."
+        else:
+            content = self._document(rng)
+        return AIMessage(content=content, response_metadata=metadata)
+
+    def _usage(self, messages: List[BaseMessage], message: AIMessage) -> Dict[str, int]:
+        # Roughly four tokens for every three words, like most tokenizers on English text
+        input_tokens = sum(len(str(m.content).split()) for m in messages) * 4 // 3
+        output_tokens = len(str(message.content).split()) * 4 // 3 + 10 * len(message.tool_calls)
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens}
+
+    def _result(self, messages: List[BaseMessage], tools: Optional[List[str]]):
+        message = self._reply(messages, tools)
+        message.usage_metadata = self._usage(messages, message)
+        return message, self._latency(self._rng(messages))
+
+    def _generate(self, messages, stop=None, run_manager=None, tools=None, **kwargs) -> ChatResult:
+        message, latency = self._result(messages, tools)
+        time.sleep(latency)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, tools=None, **kwargs) -> ChatResult:
+        message, latency = self._result(messages, tools)
+        await asyncio.sleep(latency)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _chunks(self, message: AIMessage) -> List[AIMessageChunk]:
+        if message.tool_calls:
+            tool_call_chunks = [{"name": c["name"], "args": json.dumps(c["args"]), "id": c["id"], "index": i}
+                                for i, c in enumerate(message.tool_calls)]
+            return [AIMessageChunk(content="", tool_call_chunks=tool_call_chunks,
+                                   response_metadata=message.response_metadata)]
+        words = str(message.content).split(" ")
+        size = max(1, self.stream_chunk_words)
+        return [AIMessageChunk(content=" ".join(words[i:i + size]) + (" " if i + size < len(words) else ""))
+                for i in range(0, len(words), size)]
+
+    def _stream(self, messages, stop=None, run_manager=None, tools=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        message, latency = self._result(messages, tools)
+        chunks = self._chunks(message)
+        for chunk in chunks:
+            time.sleep(latency / len(chunks))
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(self, messages, stop=None, run_manager=None, tools=None,
+                       **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        message, latency = self._result(messages, tools)
+        chunks = self._chunks(message)
+        for chunk in chunks:
+            await asyncio.sleep(latency / len(chunks))
+            yield ChatGenerationChunk(message=chunk)
+
+
+def create_chat_model(cache=None) -> BaseChatModel:
+    """Build the chat model selected by LLM_PROVIDER ("gemini" or "fake")"""
+    provider = os.getenv("LLM_PROVIDER", "gemini").lower()
+    if provider == "fake":
+        logger.info("Using the fake chat model")
+        return FakeChatModel.from_env(cache=cache)
+    if provider == "gemini":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return ChatGoogleGenerativeAI(
+            model="gemini-2.0-flash",
+            google_api_key=os.getenv("GOOGLE_API_KEY"),
+            temperature=0.7,
+            convert_system_message_to_human=True,
+            cache=cache,
+        )
+    raise ValueError(f"Unknown LLM_PROVIDER {provider!r}; expected 'gemini' or 'fake'")
@@ -0,0 +1,229 @@
+# resilience.py
+import asyncio
+import random
+import time
+import logging
+from collections import deque
+from contextlib import nullcontext
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+try:
+    from google.api_core import exceptions as google_exceptions
+    _GOOGLE_TRANSIENT_ERRORS = (
+        google_exceptions.TooManyRequests,
+        google_exceptions.ResourceExhausted,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.InternalServerError,
+        google_exceptions.DeadlineExceeded,
+    )
+except ImportError:
+    _GOOGLE_TRANSIENT_ERRORS = ()
+
+# Errors worth retrying: timeouts, dropped connections and provider overload/outages
+TRANSIENT_ERRORS = (TimeoutError, asyncio.TimeoutError, ConnectionError) + _GOOGLE_TRANSIENT_ERRORS
+
+
+class CircuitOpenError(Exception):
+    """The circuit breaker is open; calls fail fast for `retry_after` seconds"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Stops calling a dependency after repeated transient failures.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    fail immediately with CircuitOpenError. Once `reset_seconds` have passed, one
+    trial call is let through; its success closes the circuit again, its failure
+    re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def before_call(self):
+        state = self.state
+        if state == "closed":
+            return
+        if state == "half_open" and not self._trial_running:
+            self._trial_running = True
+            return
+        retry_after = max(1, int(self.reset_seconds - (time.monotonic() - self.opened_at)) + 1)
+        raise CircuitOpenError(f"Circuit open after {self.failures} consecutive failures", retry_after)
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info("Circuit closed after a successful trial call")
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def release_trial(self):
+        """Let another trial call through after one that ended without a verdict"""
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_running or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self._trial_running:
+                logger.warning("Circuit opened after %s consecutive failures", self.failures)
+            self.opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class LatencyTracker:
+    """Sliding window of recent call durations"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """The given percentile of recent durations, or None until there are enough samples"""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+        return ordered[index]
+
+
+class ResilientCaller:
+    """Runs calls with per-attempt timeouts, retries and optional hedging.
+
+    Each attempt gets at most `timeout` seconds, and all attempts together at most
+    `deadline` seconds. Transient errors are retried up to `max_attempts` times
+    with exponential backoff and full jitter. With `hedge_percentile` set, an
+    attempt still running after that percentile of recent latencies gets a second,
+    identical request and the first to succeed wins. An attempt's clock, hedge
+    timer included, starts once it holds its `guard` slot, and no hedge is sent
+    while `busy()` is true (e.g. other calls are queued for a slot). All attempts
+    report to the circuit breaker.
+    """
+
+    def __init__(self, timeout: float = 60.0, deadline: float = 150.0, max_attempts: int = 3,
+                 base_delay: float = 0.5, max_delay: float = 8.0, hedge_percentile: Optional[float] = None,
+                 breaker: Optional[CircuitBreaker] = None, latency: Optional[LatencyTracker] = None,
+                 busy: Optional[Callable[[], bool]] = None):
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_percentile = hedge_percentile
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = latency or LatencyTracker()
+        self.busy = busy
+        self._counters = {"calls": 0, "retries": 0, "timeouts": 0, "hedges": 0, "hedge_wins": 0,
+                          "failures": 0, "circuit_rejections": 0}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._counters,
+            "circuit": self.breaker.state,
+            "p95_seconds": self.latency.percentile(95)
+        }
+
+    async def call(self, fn: Callable[[], Awaitable[Any]], guard: Optional[Callable[[], Any]] = None) -> Any:
+        """Run `fn` with retries. `guard` is an async context manager factory entered
+        around each request (e.g. a concurrency slot); time spent entering it doesn't
+        count against the timeout."""
+        self._counters["calls"] += 1
+        started = time.monotonic()
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError:
+                self._counters["circuit_rejections"] += 1
+                raise
+
+            remaining = self.deadline - (time.monotonic() - started)
+            try:
+                result = await self._attempt(fn, guard, min(self.timeout, remaining))
+            except TRANSIENT_ERRORS as e:
+                self.breaker.record_failure()
+                if isinstance(e, (TimeoutError, asyncio.TimeoutError)):
+                    self._counters["timeouts"] += 1
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                if attempt == self.max_attempts or time.monotonic() - started + delay >= self.deadline:
+                    self._counters["failures"] += 1
+                    raise
+                logger.warning("Model call failed (%s: %s), retry %s in %.2fs", type(e).__name__, e, attempt, delay)
+                self._counters["retries"] += 1
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Bad requests, local overload and cancellation say nothing about the provider's health
+                self.breaker.release_trial()
+                raise
+
+            self.breaker.record_success()
+            return result
+
+    async def _timed(self, fn, guard, timeout: float, started: Optional[asyncio.Event] = None):
+        async with (guard() if guard else nullcontext()):
+            if started is not None:
+                started.set()
+            began = time.monotonic()
+            result = await asyncio.wait_for(fn(), timeout)
+            self.latency.record(time.monotonic() - began)
+            return result
+
+    def _can_hedge(self) -> bool:
+        return not (self.busy and self.busy())
+
+    async def _attempt(self, fn, guard, timeout: float):
+        hedge_after = self.latency.percentile(self.hedge_percentile) if self.hedge_percentile else None
+        if hedge_after is None or hedge_after >= timeout or not self._can_hedge():
+            return await self._timed(fn, guard, timeout)
+
+        started = asyncio.Event()
+        primary = asyncio.ensure_future(self._timed(fn, guard, timeout, started))
+        hedge = None
+        try:
+            # Waiting for a slot isn't provider latency, so the hedge timer starts with the request
+            waiter = asyncio.ensure_future(started.wait())
+            try:
+                await asyncio.wait({primary, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                waiter.cancel()
+            if not primary.done():
+                await asyncio.wait({primary}, timeout=hedge_after)
+            if primary.done() or not self._can_hedge():
+                return await primary
+
+            self._counters["hedges"] += 1
+            hedge = asyncio.ensure_future(self._timed(fn, guard, timeout - hedge_after))
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._counters["hedge_wins"] += 1
+                        return task.result()
+            # Both requests failed; report the original one
+            return primary.result()
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
@@ -0,0 +1,61 @@
+# revisions.py
+import json
+import zlib
+import difflib
+from typing import Optional, Tuple
+
+# How a document revision's payload is stored
+SNAPSHOT = "zlib"   # the whole document, zlib-compressed
+DELTA = "delta"     # zlib-compressed line edits against the revision it is based on
+
+
+def compress_text(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), 9)
+
+
+def decompress_text(payload: bytes) -> str:
+    return zlib.decompress(payload).decode("utf-8")
+
+
+def make_delta(base: str, target: str) -> bytes:
+    """Line-level edit script turning `base` into `target`.
+
+    The script is a JSON list where [start, end] copies base lines start..end and a
+    string inserts new text.
+    """
+    base_lines = base.splitlines(keepends=True)
+    target_lines = target.splitlines(keepends=True)
+    ops = []
+    matcher = difflib.SequenceMatcher(None, base_lines, target_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif tag in ("replace", "insert"):
+            ops.append("".join(target_lines[j1:j2]))
+    return zlib.compress(json.dumps(ops, separators=(",", ":")).encode("utf-8"), 9)
+
+
+def apply_delta(base: str, payload: bytes) -> str:
+    base_lines = base.splitlines(keepends=True)
+    parts = []
+    for op in json.loads(zlib.decompress(payload)):
+        parts.append("".join(base_lines[op[0]:op[1]]) if isinstance(op, list) else op)
+    return "".join(parts)
+
+
+def encode_revision(previous: Optional[str], content: str, previous_depth: int,
+                    snapshot_interval: int) -> Tuple[str, bytes, int]:
+    """Choose how to store a new revision: (encoding, payload, chain depth).
+
+    A delta against the previous revision is used unless there is none, the chain
+    of deltas since the last snapshot is already `snapshot_interval` long, or the
+    delta wouldn't be smaller than a compressed snapshot. Reading a revision
+    therefore never applies more than `snapshot_interval - 1` deltas.
+    """
+    snapshot = compress_text(content)
+    if previous is None or previous_depth + 1 >= snapshot_interval:
+        return SNAPSHOT, snapshot, 0
+    delta = make_delta(previous, content)
+    if len(delta) >= len(snapshot):
+        return SNAPSHOT, snapshot, 0
+    return DELTA, delta, previous_depth + 1
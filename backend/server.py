@@ -1,43 +1,63 @@
 # server.py
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Header, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
+from contextlib import asynccontextmanager
 from datetime import datetime
 import os
 import logging
 import json
+import uuid
+import hashlib
 from dotenv import load_dotenv
 from langchain_core.messages import HumanMessage, AIMessage
 
 # Import the agent module
-from agent import create_agent, create_initial_documents
-from db import SQLiteConversationStore
+from agent import (create_agent, acreate_initial_documents, astream_initial_documents, asummarize_conversation,
+                   is_malformed_call, llm_cache, llm_limiter, llm_caller, MODEL_UNAVAILABLE_ERRORS)
+from resilience import CircuitOpenError
+from context import ContextTooLargeError
+from db import SQLiteConversationStore, AsyncConversationStore, ConcurrentModificationError
+from cache import CachedConversationStore
+from concurrency import SingleFlight, KeyedLocks, llm_priority, BATCH
+from jobs import JobQueue, JobQueueFullError
+from metrics import registry, RequestMetricsMiddleware
+from logging_config import configure_logging
 
-# Create SQLite-based conversation store instead of in-memory dict
-conversation_store = SQLiteConversationStore("conversations.db")
+# Create SQLite-based conversation store instead of in-memory dict, fronted by an
+# LRU cache of hydrated conversations. Store calls are offloaded to worker threads
+# so they never block the event loop.
+conversation_store = AsyncConversationStore(CachedConversationStore(
+    SQLiteConversationStore("conversations.db"),
+    max_entries=int(os.getenv("STATE_CACHE_ENTRIES", "256")),
+    max_bytes=int(os.getenv("STATE_CACHE_MB", "64")) * 1024 * 1024
+))
 
 # Set up logger
 logger = logging.getLogger(__name__)
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler("app.log")
-    ]
-)
+# Configure logging: records are queued here and written by a background thread
+configure_logging()
 
 # Load environment variables
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+    # Release pooled SQLite connections on shutdown
+    await conversation_store.close()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Job Application Assistant API",
     description="API for optimizing resumes and generating cover letters",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Enable CORS
@@ -49,9 +69,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Time every request by route
+app.add_middleware(RequestMetricsMiddleware)
+
 # Create the agent
 agent = create_agent()
 
+# Number of most recent messages loaded as chat history for each agent turn
+CHAT_HISTORY_MESSAGES = int(os.getenv("CHAT_HISTORY_MESSAGES", "50"))
+
+# Once this many messages are newer than the running summary, older ones are folded
+# into it, keeping at least SUMMARY_KEEP_RECENT messages verbatim. Both must stay
+# below CHAT_HISTORY_MESSAGES so unsummarized messages are always loaded.
+SUMMARY_TRIGGER_MESSAGES = int(os.getenv("SUMMARY_TRIGGER_MESSAGES", "20"))
+SUMMARY_KEEP_RECENT = int(os.getenv("SUMMARY_KEEP_RECENT", "8"))
+
+# How long a stored Idempotency-Key response is replayed for
+IDEMPOTENCY_RETENTION_HOURS = int(os.getenv("IDEMPOTENCY_RETENTION_HOURS", "24"))
+
+# Concurrent identical /api/process requests share one generation
+process_flights = SingleFlight()
+
+# Turns and edits on one conversation run one at a time in this process; saves
+# are also version-checked, which catches conflicting writes from other workers
+conversation_locks = KeyedLocks()
+
 # Request and response models
 class JobApplicationInput(BaseModel):
     job_description: str = Field(..., description="The job description")
@@ -73,129 +115,422 @@ class ConversationResponse(BaseModel):
     optimized_resume: Optional[str] = None
     cover_letter: Optional[str] = None
 
-@app.post("/api/process", response_model=ConversationResponse)
-async def process_application(input_data: JobApplicationInput):
-    """Process a new job application with resume and job description"""
-    logger.info("Processing new job application")
-    try:
-        # Generate a unique conversation ID
-        conversation_id = f"conv_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        logger.info(f"Created conversation ID: {conversation_id}")
-        
-        # Create initial drafts of optimized resume and cover letter
-        logger.info("Creating initial document drafts")
-        optimized_resume, cover_letter, optimization_summary = create_initial_documents(
+class JobStatus(BaseModel):
+    job_id: str
+    status: str = Field(..., description="queued, running, succeeded or failed")
+    status_url: str
+    conversation_id: Optional[str] = None
+    response: Optional[str] = None
+    optimized_resume: Optional[str] = None
+    cover_letter: Optional[str] = None
+    error: Optional[str] = None
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# Headers that stop proxies from buffering an event stream
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def _unavailable_body(error: Exception) -> Dict[str, Any]:
+    if isinstance(error, CircuitOpenError):
+        status, detail = 503, "The assistant is temporarily unavailable, please retry shortly"
+    else:
+        status, detail = 429, "The assistant is handling too many requests, please retry shortly"
+    return {"status": status, "detail": detail, "retry_after": error.retry_after}
+
+
+def _new_conversation_id() -> str:
+    # The timestamp keeps ids sortable; the random suffix keeps them unique
+    return f"conv_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex}"
+
+
+def _request_hash(input_data: JobApplicationInput) -> str:
+    """Fingerprint of an application payload"""
+    payload = json.dumps(input_data.model_dump(), sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def _save_new_application(conversation_id: str, input_data: JobApplicationInput, optimized_resume: str,
+                                cover_letter: str, optimization_summary: str):
+    """Create and persist the initial state for a processed application"""
+    # Create initial state with the generated documents
+    initial_state = {
+        "messages": [
+            HumanMessage(content="I need help optimizing my resume and creating a cover letter for this job. Can you please help me with that?"),
+            AIMessage(content=f"I've created an optimized version of your resume and a cover letter tailored to the job description. Here's a summary of the optimizations: \n\n{optimization_summary}\n\nHow would you like to proceed? Would you like to make any specific changes to either document?")
+        ],
+        "job_description": input_data.job_description,
+        "resume": input_data.resume,
+        "personal_summary": input_data.personal_summary,
+        "optimized_resume": optimized_resume,
+        "cover_letter": cover_letter
+    }
+    
+    # Save state to SQLite store
+    await conversation_store.set(conversation_id, initial_state)
+
+
+async def _run_application_job(job_id: str, request: Dict[str, Any]) -> Dict[str, Any]:
+    """Job handler: generate the initial documents for an application and save the new conversation"""
+    input_data = JobApplicationInput(**request)
+    
+    async def save_partial(document: str, content: str):
+        # Make each document visible to pollers as soon as it exists
+        await conversation_store.update_job(job_id, **{document: content})
+    
+    # Create initial drafts of optimized resume and cover letter; nobody is waiting
+    # on the connection, so interactive chat turns get the model first
+    logger.info("Creating initial document drafts for job %s", job_id)
+    with llm_priority(BATCH):
+        optimized_resume, cover_letter, optimization_summary = await acreate_initial_documents(
             input_data.job_description,
             input_data.resume,
-            input_data.personal_summary
+            input_data.personal_summary,
+            on_document=save_partial
         )
-        
-        # optimized_resume = initial_documents.get("optimized_resume", "")    
-        # cover_letter = initial_documents.get("cover_letter", "")
-        
-        # Create a summary of the optimizations made
-        logger.info("Creating optimization summary")
-        
-        
-        # Create initial state with the generated documents
-        initial_state = {
-            "messages": [
-                HumanMessage(content="I need help optimizing my resume and creating a cover letter for this job. Can you please help me with that?"),
-                AIMessage(content=f"I've created an optimized version of your resume and a cover letter tailored to the job description. Here's a summary of the optimizations: \n\n{optimization_summary}\n\nHow would you like to proceed? Would you like to make any specific changes to either document?")
-            ],
-            "job_description": input_data.job_description,
-            "resume": input_data.resume,
-            "personal_summary": input_data.personal_summary,
-            "optimized_resume": optimized_resume,
-            "cover_letter": cover_letter
-        }
-        
-        # Save state to SQLite store
-        conversation_store.set(conversation_id, initial_state)
-        
-        logger.info(f"Successfully processed application for conversation: {conversation_id}")
-        return {
-            "conversation_id": conversation_id,
-            "response": optimization_summary,
-            "optimized_resume": optimized_resume,
-            "cover_letter": cover_letter
-        }
+    
+    # Generate a unique conversation ID
+    conversation_id = _new_conversation_id()
+    logger.info("Created conversation ID: %s", conversation_id)
+    await _save_new_application(conversation_id, input_data, optimized_resume, cover_letter, optimization_summary)
+    
+    logger.info("Successfully processed application for conversation: %s", conversation_id)
+    return {"conversation_id": conversation_id}
+
+
+# Generation runs on a bounded pool of background workers instead of in the request
+job_queue = JobQueue(
+    conversation_store,
+    _run_application_job,
+    workers=int(os.getenv("JOB_WORKERS", "4")),
+    max_pending=int(os.getenv("JOB_QUEUE_SIZE", "100")),
+    lease_seconds=int(os.getenv("JOB_LEASE_SECONDS", "60"))
+)
+
+
+def _job_body(job_id: str, status: str) -> Dict[str, Any]:
+    return {"job_id": job_id, "status": status, "status_url": f"/api/jobs/{job_id}"}
+
+
+async def _submit_application(request_hash: str, input_data: JobApplicationInput) -> Dict[str, Any]:
+    """Queue a generation job. Every submission gets its own job and conversation;
+    identical ones still share model responses through the LLM cache."""
+    job_id = f"job_{uuid.uuid4().hex}"
+    await job_queue.submit(job_id, request_hash, input_data.model_dump())
+    return _job_body(job_id, "queued")
+
+
+async def _submit_idempotent_application(idempotency_key: str, request_hash: str,
+                                         input_data: JobApplicationInput) -> Dict[str, Any]:
+    """Submit an application at most once per Idempotency-Key, replaying the stored response on retries"""
+    existing = await conversation_store.claim_idempotency_key(idempotency_key, request_hash)
+    if existing is not None:
+        if existing["request_hash"] != request_hash:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+        if existing["response"] is None:
+            # Claimed by a request still running in another worker
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is in progress",
+                                headers={"Retry-After": "5"})
+        logger.info("Replaying stored response for Idempotency-Key %s", idempotency_key)
+        return existing["response"]
+    
+    try:
+        response = await _submit_application(request_hash, input_data)
+    except BaseException:
+        # Free the key so the client can retry a failed request
+        await conversation_store.release_idempotency_key(idempotency_key)
+        raise
+    
+    await conversation_store.complete_idempotency_key(
+        idempotency_key, None, response, retention_hours=IDEMPOTENCY_RETENTION_HOURS
+    )
+    return response
+
+
+@app.post("/api/process", status_code=202, response_model=JobStatus, response_model_exclude_none=True)
+async def process_application(input_data: JobApplicationInput, response: Response,
+                              idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    """Queue a new job application for processing and return its job id.
+    
+    Poll GET /api/jobs/{job_id} for progress and the generated documents. Retries
+    carrying the same Idempotency-Key get the original job instead of a new one.
+    """
+    logger.info("Processing new job application")
+    try:
+        request_hash = _request_hash(input_data)
+        if idempotency_key:
+            body = await process_flights.do(
+                f"key:{idempotency_key}:{request_hash}",
+                lambda: _submit_idempotent_application(idempotency_key, request_hash, input_data)
+            )
+        else:
+            # Without a key, identical payloads may come from unrelated clients, so they aren't merged
+            body = await _submit_application(request_hash, input_data)
+        response.headers["Location"] = body["status_url"]
+        return body
+    except HTTPException:
+        raise
+    except JobQueueFullError as e:
+        logger.warning("Rejecting application, job queue is full: %s", e)
+        raise HTTPException(status_code=429, detail="Too many applications are being processed, please retry shortly",
+                            headers={"Retry-After": "30"})
     except Exception as e:
-        logger.error(f"Error processing application: {str(e)}", exc_info=True)
+        logger.error("Error processing application: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/chat", response_model=ConversationResponse)
-async def chat(message_data: ChatMessage):
-    """Continue a conversation with the assistant"""
-    logger.info(f"Received chat message for conversation: {message_data.conversation_id}")
+@app.get("/api/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    """Get a generation job's status, with any documents generated so far.
+    
+    Once the job has succeeded, conversation_id refers to the new conversation and
+    response holds the optimization summary.
+    """
+    job = await conversation_store.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "status_url": f"/api/jobs/{job_id}",
+        "conversation_id": job["conversation_id"],
+        "response": job["optimization_summary"],
+        "optimized_resume": job["optimized_resume"],
+        "cover_letter": job["cover_letter"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"]
+    }
+
+
+@app.post("/api/process/stream")
+async def process_application_stream(input_data: JobApplicationInput):
+    """Process a new job application, streaming generation progress as Server-Sent Events.
+    
+    Emits `start`, then `token` events ({"document", "delta"}) and a `document` event as
+    each of optimized_resume, cover_letter and optimization_summary completes, and
+    finally `done` with the conversation id, summary and documents (or `error`).
+    """
+    logger.info("Processing new job application (streaming)")
+    conversation_id = _new_conversation_id()
+    
+    async def event_stream():
+        try:
+            yield _sse("start", {"conversation_id": conversation_id})
+            documents = {}
+            async for event in astream_initial_documents(
+                input_data.job_description,
+                input_data.resume,
+                input_data.personal_summary
+            ):
+                if event["type"] == "token":
+                    yield _sse("token", {"document": event["document"], "delta": event["delta"]})
+                elif event["type"] == "document":
+                    documents[event["document"]] = event["content"]
+                    yield _sse("document", {"document": event["document"], "content": event["content"]})
+            
+            await _save_new_application(
+                conversation_id, input_data, documents["optimized_resume"], documents["cover_letter"],
+                documents["optimization_summary"]
+            )
+            logger.info("Successfully processed application for conversation: %s", conversation_id)
+            yield _sse("done", {
+                "conversation_id": conversation_id,
+                "response": documents["optimization_summary"],
+                "optimized_resume": documents["optimized_resume"],
+                "cover_letter": documents["cover_letter"]
+            })
+        except MODEL_UNAVAILABLE_ERRORS as e:
+            logger.warning("Rejecting application, model is unavailable: %s", e)
+            yield _sse("error", _unavailable_body(e))
+        except Exception as e:
+            logger.error("Error processing application: %s", e, exc_info=True)
+            yield _sse("error", {"detail": str(e)})
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+async def refresh_conversation_summary(conversation_id: str):
+    """Fold older messages into the conversation's running summary once enough have accumulated"""
     try:
-        # Get the conversation state from SQLite store
-        conversation_id = message_data.conversation_id
-        state = conversation_store.get(conversation_id)
+        summary = await conversation_store.get_summary(conversation_id)
+        previous_through_id = summary["summarized_through_id"] if summary else None
+        pending = await conversation_store.get_messages_after(conversation_id, previous_through_id or 0)
+        if len(pending) < SUMMARY_TRIGGER_MESSAGES:
+            return
         
-        if not state:
-            logger.warning(f"Conversation not found: {conversation_id}")
-            raise HTTPException(status_code=404, detail="Conversation not found")
+        # Fold everything but the most recent messages, ending just before a human
+        # message so the turns left verbatim are whole
+        cutoff = len(pending) - SUMMARY_KEEP_RECENT
+        while cutoff > 0 and pending[cutoff]["role"] != "human":
+            cutoff -= 1
+        if cutoff <= 0:
+            return
         
-        # Add the new message
-        new_state = {
-            **state,
-            "messages": state["messages"] + [HumanMessage(content=message_data.message)]
-        }
-        
-        # Run the agent
-        logger.info(f"Invoking agent for chat in conversation: {conversation_id}")
-        # First attempt to invoke the agent
-        result = agent.invoke(
-            new_state,
-            config={"configurable": {"thread_id": conversation_id}}
+        folded = pending[:cutoff]
+        with llm_priority(BATCH):
+            new_summary = await asummarize_conversation(summary["summary"] if summary else "", folded)
+        await conversation_store.save_summary(
+            conversation_id, new_summary, folded[-1]["id"], folded[-1]["key"], previous_through_id
         )
+    except Exception as e:
+        logger.error("Error summarizing conversation %s: %s", conversation_id, e, exc_info=True)
+
+
+async def _load_chat_state(message_data: ChatMessage) -> Dict[str, Any]:
+    """Load a conversation and append the user's new message, ready for the agent"""
+    # Get the conversation state from SQLite store
+    conversation_id = message_data.conversation_id
+    state = await conversation_store.get(conversation_id, message_limit=CHAT_HISTORY_MESSAGES)
+    
+    if not state:
+        logger.warning("Conversation not found: %s", conversation_id)
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    
+    # Older turns reach the agent through the running summary
+    summary = await conversation_store.get_summary(conversation_id)
+    
+    # Add the new message
+    return {
+        **state,
+        "messages": state["messages"] + [HumanMessage(content=message_data.message)],
+        "conversation_summary": summary["summary"] if summary else "",
+        "summarized_through": summary["summarized_through_key"] if summary else ""
+    }
+
+
+def _has_malformed_call(result: Dict[str, Any]) -> bool:
+    """Check if there was a malformed function call"""
+    return any(is_malformed_call(msg) for msg in result["messages"])
+
+
+async def _finish_chat(conversation_id: str, new_state: Dict[str, Any], result: Dict[str, Any],
+                       background_tasks: BackgroundTasks) -> Dict[str, Any]:
+    """Pick the reply, save the agent's result and build the chat response body"""
+    # Extract non-empty AI messages for the response
+    ai_messages = [msg for msg in result["messages"] if isinstance(msg, AIMessage) and msg.content]
+    
+    # Handle case where there might still be issues after the agent's own retries
+    if not ai_messages:
+        if _has_malformed_call(result):
+            response_content = "I'm having trouble processing your request. Let me try a different approach."
+            # Add this message to the result so it's saved in the state
+            result["messages"].append(AIMessage(content=response_content))
+        else:
+            response_content = "I couldn't process your request properly. Please try with different wording."
+            # Add this message to the result so it's saved in the state
+            result["messages"].append(AIMessage(content=response_content))
+    else:
+        response_content = ai_messages[-1].content
         
-        # Check if there was a malformed function call
-        has_malformed_call = any(hasattr(msg, "additional_kwargs") and 
-                               msg.additional_kwargs.get("finish_reason") == "MALFORMED_FUNCTION_CALL" 
-                               for msg in result["messages"])
-        
-        # Retry once if we got a malformed function call
-        if has_malformed_call:
-            logger.info("Detected MALFORMED_FUNCTION_CALL, attempting retry")
-            # Retry with the same state
-            result = agent.invoke(
+    # Save the updated state, unless someone else saved since we loaded it
+    await conversation_store.set(conversation_id, result, expected_version=new_state["version"])
+    
+    # Fold older turns into the summary after the response has been sent
+    background_tasks.add_task(refresh_conversation_summary, conversation_id)
+    
+    logger.info("Successfully processed chat for conversation: %s", conversation_id)
+    return {
+        "conversation_id": conversation_id,
+        "response": response_content,
+        "optimized_resume": result.get("optimized_resume", new_state.get("optimized_resume", "")),
+        "cover_letter": result.get("cover_letter", new_state.get("cover_letter", ""))
+    }
+
+
+@app.post("/api/chat", response_model=ConversationResponse)
+async def chat(message_data: ChatMessage, background_tasks: BackgroundTasks):
+    """Continue a conversation with the assistant"""
+    logger.info("Received chat message for conversation: %s", message_data.conversation_id)
+    try:
+        conversation_id = message_data.conversation_id
+        async with conversation_locks.hold(conversation_id):
+            new_state = await _load_chat_state(message_data)
+            
+            # Run the agent; a malformed tool call is retried inside the agent node
+            logger.info("Invoking agent for chat in conversation: %s", conversation_id)
+            result = await agent.ainvoke(
                 new_state,
                 config={"configurable": {"thread_id": conversation_id}}
             )
-        
-        # Extract non-empty AI messages for the response
-        ai_messages = [msg for msg in result["messages"] if isinstance(msg, AIMessage) and msg.content]
-        
-        # Handle case where there might still be issues after retry
-        if not ai_messages:
-            if has_malformed_call:
-                response_content = "I'm having trouble processing your request. Let me try a different approach."
-                # Add this message to the result so it's saved in the state
-                result["messages"].append(AIMessage(content=response_content))
-            else:
-                response_content = "I couldn't process your request properly. Please try with different wording."
-                # Add this message to the result so it's saved in the state
-                result["messages"].append(AIMessage(content=response_content))
-        else:
-            response_content = ai_messages[-1].content
             
-        # Save the updated state 
-        conversation_store.set(conversation_id, result)
-        
-        logger.info(f"Successfully processed chat for conversation: {conversation_id}")
-        return {
-            "conversation_id": conversation_id,
-            "response": response_content,
-            "optimized_resume": result.get("optimized_resume", state.get("optimized_resume", "")),
-            "cover_letter": result.get("cover_letter", state.get("cover_letter", ""))
-        }
+            return await _finish_chat(conversation_id, new_state, result, background_tasks)
+    except HTTPException:
+        raise
+    except ConcurrentModificationError as e:
+        logger.warning("Chat turn lost a race with another writer: %s", e)
+        raise HTTPException(status_code=409, detail="The conversation was modified concurrently, please retry")
+    except ContextTooLargeError as e:
+        logger.warning("Rejecting chat turn, context too large: %s", e)
+        raise HTTPException(status_code=413, detail=str(e))
+    except MODEL_UNAVAILABLE_ERRORS as e:
+        logger.warning("Rejecting chat turn, model is unavailable: %s", e)
+        body = _unavailable_body(e)
+        raise HTTPException(status_code=body["status"], detail=body["detail"],
+                            headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
-        logger.error(f"Error processing chat: {str(e)}", exc_info=True)
+        logger.error("Error processing chat: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@app.post("/api/chat/stream")
+async def chat_stream(message_data: ChatMessage, background_tasks: BackgroundTasks):
+    """Continue a conversation, streaming the agent run as Server-Sent Events.
+    
+    Emits `node` events as each graph node finishes, `token` events ({"node", "delta"})
+    as the model generates text, and finally `done` with the same body /api/chat
+    returns (or `error`).
+    """
+    logger.info("Received streaming chat message for conversation: %s", message_data.conversation_id)
+    conversation_id = message_data.conversation_id
+    # Check before streaming starts so a missing conversation is still a plain 404
+    if await conversation_store.get_version(conversation_id) is None:
+        logger.warning("Conversation not found: %s", conversation_id)
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    
+    async def event_stream():
+        try:
+            async with conversation_locks.hold(conversation_id):
+                new_state = await _load_chat_state(message_data)
+                config = {"configurable": {"thread_id": conversation_id}}
+                result = None
+                async for mode, chunk in agent.astream(new_state, config=config, stream_mode=["updates", "messages", "values"]):
+                    if mode == "messages":
+                        message_chunk, metadata = chunk
+                        if isinstance(message_chunk.content, str) and message_chunk.content:
+                            yield _sse("token", {"node": metadata.get("langgraph_node", ""), "delta": message_chunk.content})
+                    elif mode == "updates":
+                        for node in chunk:
+                            yield _sse("node", {"node": node})
+                    elif mode == "values":
+                        result = chunk
+                
+                response = await _finish_chat(conversation_id, new_state, result, background_tasks)
+            yield _sse("done", response)
+        except ConcurrentModificationError as e:
+            logger.warning("Chat turn lost a race with another writer: %s", e)
+            yield _sse("error", {"status": 409, "detail": "The conversation was modified concurrently, please retry"})
+        except ContextTooLargeError as e:
+            logger.warning("Rejecting chat turn, context too large: %s", e)
+            yield _sse("error", {"status": 413, "detail": str(e)})
+        except MODEL_UNAVAILABLE_ERRORS as e:
+            logger.warning("Rejecting chat turn, model is unavailable: %s", e)
+            yield _sse("error", _unavailable_body(e))
+        except HTTPException as e:
+            yield _sse("error", {"status": e.status_code, "detail": e.detail})
+        except Exception as e:
+            logger.error("Error processing chat: %s", e, exc_info=True)
+            yield _sse("error", {"detail": str(e)})
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS,
+                             background=background_tasks)
+
 @app.post("/api/update", response_model=ConversationResponse)
 async def update_document(update_data: UpdateRequest):
     """Update the resume or cover letter with new content directly without LLM processing"""
@@ -203,103 +538,108 @@ async def update_document(update_data: UpdateRequest):
     document_type = update_data.document_type
     content = update_data.content
     
-    logger.info(f"Received direct update request for conversation: {conversation_id}, type: {document_type}")
+    logger.info("Received direct update request for conversation: %s, type: %s", conversation_id, document_type)
     
     try:
-        # Get the conversation state from SQLite store
-        state = conversation_store.get(conversation_id)
-        
-        if not state:
-            logger.warning(f"Conversation not found: {conversation_id}")
-            raise HTTPException(status_code=404, detail="Conversation not found")
-        
-        # Update the appropriate document in the state directly
-        if document_type == "resume":
-            state["optimized_resume"] = content
-            logger.info("Updated resume content directly")
-        elif document_type == "cover_letter":
-            state["cover_letter"] = content
-            logger.info("Updated cover letter content directly")
-        else:
-            logger.warning(f"Invalid document type: {document_type}")
-            raise HTTPException(status_code=400, detail="Invalid document type")
-        
-        # Save updated state to SQLite store
-        conversation_store.set(conversation_id, state)
+        async with conversation_locks.hold(conversation_id):
+            # Get the conversation state from SQLite store; a direct edit doesn't need the history
+            state = await conversation_store.get(conversation_id, include_messages=False)
+            
+            if not state:
+                logger.warning("Conversation not found: %s", conversation_id)
+                raise HTTPException(status_code=404, detail="Conversation not found")
+            
+            # Update the appropriate document in the state directly
+            if document_type == "resume":
+                state["optimized_resume"] = content
+                logger.info("Updated resume content directly")
+            elif document_type == "cover_letter":
+                state["cover_letter"] = content
+                logger.info("Updated cover letter content directly")
+            else:
+                logger.warning("Invalid document type: %s", document_type)
+                raise HTTPException(status_code=400, detail="Invalid document type")
+            
+            # Save updated state to SQLite store, unless someone else saved since we loaded it
+            await conversation_store.set(conversation_id, state, expected_version=state["version"])
         
-        logger.info(f"Successfully processed direct document update for conversation: {conversation_id}")
+        logger.info("Successfully processed direct document update for conversation: %s", conversation_id)
         return {
             "conversation_id": conversation_id,
             "response": f"{document_type.replace('_', ' ').title()} updated successfully",
             "optimized_resume": state.get("optimized_resume", ""),
             "cover_letter": state.get("cover_letter", "")
         }
+    except HTTPException:
+        raise
+    except ConcurrentModificationError as e:
+        logger.warning("Document update lost a race with another writer: %s", e)
+        raise HTTPException(status_code=409, detail="The conversation was modified concurrently, please retry")
     except Exception as e:
-        logger.error(f"Error updating document: {str(e)}", exc_info=True)
+        logger.error("Error updating document: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/documents/{conversation_id}")
 async def get_documents(conversation_id: str):
     """Get the current optimized resume and cover letter for a conversation"""
-    logger.info(f"Retrieving documents for conversation: {conversation_id}")
+    logger.info("Retrieving documents for conversation: %s", conversation_id)
     try:
-        # Get the conversation state from SQLite store
-        state = conversation_store.get(conversation_id)
+        # Only the two documents are needed, not the hydrated conversation
+        documents = await conversation_store.get_documents(conversation_id)
         
-        if not state:
-            logger.warning(f"Conversation not found: {conversation_id}")
+        if not documents:
+            logger.warning("Conversation not found: %s", conversation_id)
             raise HTTPException(status_code=404, detail="Conversation not found")
         
-        logger.info(f"Successfully retrieved documents for conversation: {conversation_id}")
-        return {
-            "optimized_resume": state.get("optimized_resume", ""),
-            "cover_letter": state.get("cover_letter", "")
-        }
+        logger.info("Successfully retrieved documents for conversation: %s", conversation_id)
+        return documents
     except Exception as e:
-        logger.error(f"Error retrieving documents: {str(e)}", exc_info=True)
+        logger.error("Error retrieving documents: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 # Add a new endpoint to list conversations
 @app.get("/api/conversations")
 async def list_conversations(limit: int = 100, offset: int = 0):
     """List all conversations with pagination"""
-    logger.info(f"Retrieving conversation list (limit={limit}, offset={offset})")
+    logger.info("Retrieving conversation list (limit=%s, offset=%s)", limit, offset)
     try:
-        conversations = conversation_store.list_conversations(limit, offset)
+        conversations = await conversation_store.list_conversations(limit, offset)
         return {"conversations": conversations}
     except Exception as e:
-        logger.error(f"Error listing conversations: {str(e)}", exc_info=True)
+        logger.error("Error listing conversations: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 # Add a new endpoint to delete a conversation
 @app.delete("/api/conversations/{conversation_id}")
 async def delete_conversation(conversation_id: str):
     """Delete a conversation"""
-    logger.info(f"Deleting conversation: {conversation_id}")
+    logger.info("Deleting conversation: %s", conversation_id)
     try:
-        success = conversation_store.delete(conversation_id)
+        success = await conversation_store.delete(conversation_id)
         if not success:
             raise HTTPException(status_code=404, detail="Conversation not found")
         return {"status": "success", "message": f"Conversation {conversation_id} deleted"}
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error deleting conversation: {str(e)}", exc_info=True)
+        logger.error("Error deleting conversation: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 # Add a new endpoint to view a specific conversation
 @app.get("/api/conversations/{conversation_id}")
 async def get_conversation(conversation_id: str):
     """Get details of a specific conversation"""
-    logger.info(f"Retrieving details for conversation: {conversation_id}")
+    logger.info("Retrieving details for conversation: %s", conversation_id)
     try:
         # Get the conversation state from SQLite store
-        state = conversation_store.get(conversation_id)
+        state = await conversation_store.get(conversation_id)
         
         if not state:
-            logger.warning(f"Conversation not found: {conversation_id}")
+            logger.warning("Conversation not found: %s", conversation_id)
             raise HTTPException(status_code=404, detail="Conversation not found")
         
+        metadata = await conversation_store.get_conversation_metadata(conversation_id) or {}
+        
         # Extract messages and convert to serializable format
         messages = []
         for msg in state.get("messages", []):
@@ -332,55 +672,101 @@ async def get_conversation(conversation_id: str):
                 "optimized_resume": state.get("optimized_resume", ""),
                 "cover_letter": state.get("cover_letter", "")
             },
-            "created_at": "", # This would come from metadata in the full implementation
-            "updated_at": ""  # This would come from metadata in the full implementation
+            "created_at": metadata.get("created_at", ""),
+            "updated_at": metadata.get("updated_at", "")
         }
         
-        logger.info(f"Successfully retrieved details for conversation: {conversation_id}")
+        logger.info("Successfully retrieved details for conversation: %s", conversation_id)
         return response
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error retrieving conversation details: {str(e)}", exc_info=True)
+        logger.error("Error retrieving conversation details: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/document_history/{conversation_id}/{document_type}")
-async def get_document_history(conversation_id: str, document_type: str):
-    """Get revision history for a document"""
-    logger.info(f"Retrieving {document_type} history for conversation: {conversation_id}")
+async def get_document_history(conversation_id: str, document_type: str, limit: Optional[int] = None,
+                               offset: int = 0, include_content: bool = True):
+    """Get revision history for a document.
+    
+    Pass limit/offset to page through long histories and include_content=false to
+    get only revision metadata; fetch a revision's content from the revision endpoint.
+    """
+    logger.info("Retrieving %s history for conversation: %s", document_type, conversation_id)
     
     # Validate document_type
     if document_type not in ["resume", "cover_letter"]:
         raise HTTPException(status_code=400, detail="Invalid document type. Must be 'resume' or 'cover_letter'")
     
     try:
-        revisions = conversation_store.get_document_revisions(conversation_id, document_type)
+        # Revisions and their linked messages come back from one joined query
+        revisions = await conversation_store.get_document_history(
+            conversation_id, document_type, limit=limit, offset=offset, include_content=include_content
+        )
         
         if not revisions:
-            logger.warning(f"No revisions found for {document_type} in conversation {conversation_id}")
+            logger.warning("No revisions found for %s in conversation %s", document_type, conversation_id)
             return {"revisions": []}
         
-        # For each revision, get associated message content if available
-        for revision in revisions:
-            if revision.get("message_id"):
-                message_info = conversation_store.get_message_by_id(revision["message_id"])
-                if message_info:
-                    revision["message"] = {
-                        "content": message_info.get("content", ""),
-                        "role": message_info.get("role", ""),
-                        "timestamp": message_info.get("timestamp", "")
-                    }
-        
-        logger.info(f"Successfully retrieved {len(revisions)} {document_type} revisions for conversation: {conversation_id}")
+        logger.info("Successfully retrieved %s %s revisions for conversation: %s", len(revisions), document_type, conversation_id)
         return {
             "conversation_id": conversation_id,
             "document_type": document_type,
             "revisions": revisions
         }
     except Exception as e:
-        logger.error(f"Error retrieving document history: {str(e)}", exc_info=True)
+        logger.error("Error retrieving document history: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/document_history/{conversation_id}/{document_type}/{revision_id}")
+async def get_document_revision(conversation_id: str, document_type: str, revision_id: int):
+    """Get a single document revision with its full content"""
+    logger.info("Retrieving %s revision %s for conversation: %s", document_type, revision_id, conversation_id)
+    try:
+        revision = await conversation_store.get_document_revision(conversation_id, revision_id)
+        if not revision or revision["document_type"] != document_type:
+            raise HTTPException(status_code=404, detail="Revision not found")
+        return revision
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error retrieving document revision: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/llm_cache/stats")
+async def get_llm_cache_stats():
+    """Get LLM response cache hit/miss counters"""
+    if llm_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **llm_cache.stats()}
+
+@app.get("/api/llm_limiter/stats")
+async def get_llm_limiter_stats():
+    """Get the model call limiter's active and queued calls"""
+    return llm_limiter.stats()
+
+@app.get("/api/llm_resilience/stats")
+async def get_llm_resilience_stats():
+    """Get model call retry, timeout and hedging counters and the circuit breaker state"""
+    return llm_caller.stats()
+
+# Live readings rendered alongside the recorded metrics
+registry.gauge("hitch_llm_active_calls", "Model calls holding a concurrency slot",
+               lambda: llm_limiter.stats()["active"])
+registry.gauge("hitch_llm_waiting_calls", "Model calls waiting for a concurrency slot, by priority",
+               lambda: {(priority,): waiting for priority, waiting in llm_limiter.stats()["waiting"].items()},
+               ("priority",))
+registry.gauge("hitch_llm_circuit_open", "1 while the model circuit breaker is rejecting calls",
+               lambda: int(llm_caller.breaker.state == "open"))
+registry.gauge("hitch_jobs_pending", "Generation jobs waiting for a worker", job_queue.pending)
+registry.gauge("hitch_state_cache_bytes", "Approximate size of the cached conversation states",
+               lambda: conversation_store.store.stats()["bytes"])
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus-style request, graph node, model call and store timings, plus token and byte counters"""
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Run the application
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,17 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+# The backend modules import each other by bare name, as when run from backend/
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture
+def store(tmp_path):
+    from db import SQLiteConversationStore
+    store = SQLiteConversationStore(str(tmp_path / "conversations.db"))
+    yield store
+    store.close()
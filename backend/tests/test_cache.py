@@ -0,0 +1,60 @@
+# tests/test_cache.py
+from langchain_core.messages import HumanMessage, AIMessage
+
+from cache import CachedConversationStore
+from db import SQLiteConversationStore
+
+
+def _state(resume="# Resume", messages=None):
+    return {
+        "job_description": "Backend engineer",
+        "resume": "# Resume",
+        "optimized_resume": resume,
+        "cover_letter": "",
+        "messages": messages if messages is not None else [HumanMessage(content="Hi"), AIMessage(content="Hello")],
+    }
+
+
+def _dump(state):
+    messages = [(type(m).__name__, m.content, m.id, m.additional_kwargs) for m in state["messages"]]
+    return {**state, "messages": messages}
+
+
+def test_cached_reads_match_the_store(store):
+    cached = CachedConversationStore(store)
+    cached.set("c1", _state())
+    state = cached.get("c1")
+    state["optimized_resume"] = "# Resume v2"
+    state["messages"] += [HumanMessage(content="Edit"), AIMessage(content="Done")]
+    cached.set("c1", state, expected_version=state["version"])
+
+    hits = cached.hits
+    assert _dump(cached.get("c1")) == _dump(store.get("c1"))
+    assert _dump(cached.get("c1", message_limit=2)) == _dump(store.get("c1", message_limit=2))
+    assert cached.hits == hits + 2
+
+
+def test_write_from_another_worker_invalidates(store, tmp_path):
+    cached = CachedConversationStore(store)
+    cached.set("c1", _state())
+    cached.get("c1")
+
+    other = SQLiteConversationStore(store.db_path)
+    try:
+        state = other.get("c1")
+        state["optimized_resume"] = "# Written elsewhere"
+        other.set("c1", state, expected_version=state["version"])
+    finally:
+        other.close()
+
+    assert cached.get("c1")["optimized_resume"] == "# Written elsewhere"
+    assert cached.get_documents("c1")["optimized_resume"] == "# Written elsewhere"
+
+
+def test_eviction_respects_the_entry_limit(store):
+    cached = CachedConversationStore(store, max_entries=2)
+    for conversation_id in ("c1", "c2", "c3"):
+        cached.set(conversation_id, _state())
+    assert cached.stats()["entries"] == 2
+    assert cached.stats()["evictions"] == 1
+    assert cached.get("c1")["optimized_resume"] == "# Resume"
@@ -0,0 +1,139 @@
+# tests/test_concurrency.py
+import asyncio
+
+import pytest
+
+from concurrency import BATCH, INTERACTIVE, KeyedLocks, LLMOverloadedError, PriorityLimiter, SingleFlight
+
+
+def test_limiter_admits_by_priority_then_arrival():
+    async def scenario():
+        limiter = PriorityLimiter(1, {INTERACTIVE: 10, BATCH: 10})
+        order = []
+        release = asyncio.Event()
+
+        async def call(name, priority):
+            async with limiter.slot(priority):
+                order.append(name)
+                await release.wait()
+
+        holder = asyncio.ensure_future(call("holder", BATCH))
+        await asyncio.sleep(0)
+        tasks = [asyncio.ensure_future(call(name, priority)) for name, priority in
+                 [("batch-1", BATCH), ("chat-1", INTERACTIVE), ("batch-2", BATCH), ("chat-2", INTERACTIVE)]]
+        await asyncio.sleep(0)
+        assert limiter.queued() == 4
+        release.set()
+        await asyncio.gather(holder, *tasks)
+        return order, limiter.stats()
+
+    order, stats = asyncio.run(scenario())
+    assert order == ["holder", "chat-1", "chat-2", "batch-1", "batch-2"]
+    assert stats["active"] == 0
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    async def scenario():
+        limiter = PriorityLimiter(1, {INTERACTIVE: 10})
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.slot(INTERACTIVE):
+                await release.wait()
+
+        holder = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        release.set()
+        await holder
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        # The slot is free again
+        async with limiter.slot(INTERACTIVE):
+            pass
+        return limiter.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["active"] == 0
+    assert stats["waiting"] == {INTERACTIVE: 0}
+
+
+def test_waiter_cancelled_after_handover_passes_the_slot_on():
+    async def scenario():
+        limiter = PriorityLimiter(1, {INTERACTIVE: 10})
+        async with limiter.slot(INTERACTIVE):
+            first = asyncio.ensure_future(limiter._acquire(INTERACTIVE))
+            second = asyncio.ensure_future(limiter._acquire(INTERACTIVE))
+            await asyncio.sleep(0)
+        # The slot went to `first`, which is cancelled before it resumes
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        await asyncio.wait_for(second, 1)
+        return limiter.stats()["active"]
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_full_queue_rejects_immediately():
+    async def scenario():
+        limiter = PriorityLimiter(1, {INTERACTIVE: 1, BATCH: 0})
+        release = asyncio.Event()
+
+        async def hold(priority):
+            async with limiter.slot(priority):
+                await release.wait()
+
+        tasks = [asyncio.ensure_future(hold(INTERACTIVE)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(LLMOverloadedError) as overloaded:
+            await hold(INTERACTIVE)
+        with pytest.raises(LLMOverloadedError):
+            await hold(BATCH)
+        release.set()
+        await asyncio.gather(*tasks)
+        return overloaded.value.retry_after, limiter.rejected
+
+    retry_after, rejected = asyncio.run(scenario())
+    assert retry_after >= 1
+    assert rejected == 2
+
+
+def test_single_flight_shares_one_execution():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        results = await asyncio.gather(*[flight.do("key", work) for _ in range(3)])
+        return results, calls, flight.in_flight("key")
+
+    results, calls, in_flight = asyncio.run(scenario())
+    assert results == ["result"] * 3
+    assert calls == [1]
+    assert not in_flight
+
+
+def test_keyed_locks_serialize_and_clean_up():
+    async def scenario():
+        locks = KeyedLocks()
+        events = []
+
+        async def work(name):
+            async with locks.hold("key"):
+                events.append(f"{name}-start")
+                await asyncio.sleep(0.01)
+                events.append(f"{name}-end")
+
+        await asyncio.gather(work("a"), work("b"))
+        return events, locks._locks
+
+    events, remaining = asyncio.run(scenario())
+    assert events == ["a-start", "a-end", "b-start", "b-end"]
+    assert remaining == {}
@@ -0,0 +1,68 @@
+# tests/test_context.py
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from context import ContextTooLargeError, OMITTED_DOCUMENT, build_context, estimate_tokens
+
+RESUME = "# Resume\n\n" + "Shipped a service that does many things. " * 20
+
+
+def _size(messages):
+    return sum(estimate_tokens(msg.content) for msg in messages)
+
+
+def _turns(count, words=50):
+    messages = []
+    for index in range(count):
+        messages += [HumanMessage(content=f"question {index} " + "word " * words, id=f"h{index}"),
+                     AIMessage(content=f"answer {index} " + "word " * words, id=f"a{index}")]
+    return messages
+
+
+def test_everything_is_kept_within_budget():
+    system = SystemMessage(content="You are helpful.")
+    messages = _turns(3)
+    kept, stats = build_context(system, messages, {}, budget=10000)
+    assert kept == [system] + messages
+    assert stats["messages_dropped"] == 0
+
+
+def test_oldest_turns_are_dropped_first():
+    system = SystemMessage(content="You are helpful.")
+    messages = _turns(10)
+    kept, stats = build_context(system, messages, {}, budget=400)
+    assert _size(kept) <= 400
+    assert kept[-2:] == messages[-2:]
+    assert kept[1].type == "human"
+    assert stats["messages_dropped"] == len(messages) - (len(kept) - 1)
+
+
+def test_summarized_messages_are_skipped():
+    messages = _turns(3)
+    kept, _ = build_context(SystemMessage(content="s"), messages, {}, summarized_through="a0")
+    assert [msg.id for msg in kept[1:]] == ["h1", "a1", "h2", "a2"]
+
+
+def test_earlier_document_copies_are_replaced():
+    messages = [HumanMessage(content="Improve it"), AIMessage(content=f"Here it is:\n{RESUME}"),
+                HumanMessage(content="Thanks")]
+    kept, _ = build_context(SystemMessage(content=f"Resume:\n{RESUME}"), messages, {"resume": RESUME})
+    assert RESUME not in kept[2].content
+    assert OMITTED_DOCUMENT.format(label="resume") in kept[2].content
+
+
+def test_oversized_documents_are_truncated_to_fit():
+    resume = "# Resume\n\n" + "Long experience line. " * 2000
+    system = SystemMessage(content=f"Resume:\n{resume}")
+    messages = [HumanMessage(content="Shorten it"),
+                AIMessage(content="", tool_calls=[{"name": "edit", "args": {}, "id": "call_1"}]),
+                ToolMessage(content=resume, tool_call_id="call_1")]
+    kept, _ = build_context(system, messages, {"resume": resume}, budget=2000)
+    assert _size(kept) <= 2000
+    assert "truncated to fit the context" in kept[0].content
+    assert kept[-1].content.startswith("# Resume")
+
+
+def test_oversized_user_message_is_rejected():
+    with pytest.raises(ContextTooLargeError):
+        build_context(SystemMessage(content="s"), [HumanMessage(content="x" * 20000)], {}, budget=1000)
@@ -0,0 +1,160 @@
+# tests/test_db.py
+import os
+import json
+import shutil
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+from langchain_core.messages import HumanMessage, AIMessage
+
+import db
+from db import SQLiteConversationStore, ConcurrentModificationError, MIGRATIONS
+from conftest import BACKEND_DIR
+
+
+def _state(resume="# Resume\n\n## Skills\nPython", cover_letter="Dear team,\n\nHire me.", messages=None):
+    return {
+        "job_description": "Backend engineer",
+        "resume": "# Resume",
+        "personal_summary": "Engineer",
+        "optimized_resume": resume,
+        "cover_letter": cover_letter,
+        "messages": messages if messages is not None else [HumanMessage(content="Hi"), AIMessage(content="Hello")],
+    }
+
+
+def test_upgrade_from_baseline_database(tmp_path):
+    path = str(tmp_path / "baseline.db")
+    shutil.copy(os.path.join(BACKEND_DIR, "conversations.db"), path)
+    conn = sqlite3.connect(path)
+    revisions = dict(conn.execute("SELECT id, content FROM document_revisions").fetchall())
+    documents = {row[0]: row[1:] for row in conn.execute(
+        "SELECT conversation_id, optimized_resume, cover_letter FROM conversations")}
+    conn.close()
+
+    store = SQLiteConversationStore(path)
+    try:
+        cursor = store._get_connection().cursor()
+        assert store._schema_version(cursor) == MIGRATIONS[-1][0]
+        for revision_id, content in revisions.items():
+            conversation_id = cursor.execute(
+                "SELECT conversation_id FROM document_revisions WHERE id = ?", (revision_id,)
+            ).fetchone()[0]
+            assert store.get_document_revision(conversation_id, revision_id)["content"] == (content or "")
+        for conversation_id, (resume, cover_letter) in documents.items():
+            state = store.get(conversation_id)
+            assert (state["optimized_resume"], state["cover_letter"]) == (resume or "", cover_letter or "")
+            state_data = cursor.execute(
+                "SELECT state_data FROM conversations WHERE conversation_id = ?", (conversation_id,)
+            ).fetchone()[0]
+            assert "optimized_resume" not in json.loads(state_data or "{}")
+    finally:
+        store.close()
+
+    # Running the migrations again is a no-op
+    SQLiteConversationStore(path).close()
+
+
+def test_partially_applied_migration_is_resumed(tmp_path):
+    path = str(tmp_path / "partial.db")
+    SQLiteConversationStore(path).close()
+    conn = sqlite3.connect(path)
+    conn.execute("DELETE FROM schema_migrations WHERE version = ?", (MIGRATIONS[-1][0],))
+    conn.commit()
+    conn.close()
+    SQLiteConversationStore(path).close()
+
+
+def test_failed_migration_stops_startup(tmp_path, monkeypatch):
+    def broken(cursor):
+        cursor.execute("SELECT * FROM missing_table")
+
+    monkeypatch.setattr(db, "MIGRATIONS", MIGRATIONS + [(MIGRATIONS[-1][0] + 1, "broken", broken)])
+    with pytest.raises(sqlite3.OperationalError):
+        SQLiteConversationStore(str(tmp_path / "broken.db"))
+
+
+def test_round_trip_and_version_stamps(store):
+    version = store.set("c1", _state())
+    state = store.get("c1")
+    assert state["version"] == version
+    assert [m.content for m in state["messages"]] == ["Hi", "Hello"]
+
+    state["messages"] += [HumanMessage(content="More"), AIMessage(content="Sure")]
+    new_version = store.set("c1", state, expected_version=version)
+    assert new_version == version + 1
+    assert [m.content for m in store.get("c1")["messages"]] == ["Hi", "Hello", "More", "Sure"]
+
+
+def test_stale_save_is_rejected(store):
+    version = store.set("c1", _state())
+    store.set("c1", _state(resume="# Resume v2"), expected_version=version)
+    with pytest.raises(ConcurrentModificationError):
+        store.set("c1", _state(resume="# Resume v3"), expected_version=version)
+    assert store.get("c1")["optimized_resume"] == "# Resume v2"
+
+
+def test_document_revisions_survive_delta_chains(store, monkeypatch):
+    monkeypatch.setattr(db, "REVISION_SNAPSHOT_INTERVAL", 3)
+    versions = [f"# Resume\n\n## Skills\nPython\n{'x' * i}\n## Projects\n" + "line\n" * 20 for i in range(8)]
+    state = _state(resume=versions[0])
+    store.set("c1", state)
+    for resume in versions[1:]:
+        state = store.get("c1")
+        state["optimized_resume"] = resume
+        state["messages"] += [HumanMessage(content="Edit"), AIMessage(content="Done")]
+        store.set("c1", state)
+
+    revisions = store.get_document_revisions("c1", "resume")
+    assert [revision["content"] for revision in revisions] == versions
+    encodings = store._get_connection().execute(
+        "SELECT encoding, chain_depth FROM document_revisions WHERE document_type = 'resume' ORDER BY id"
+    ).fetchall()
+    assert max(depth for _, depth in encodings) < 3
+    assert {encoding for encoding, _ in encodings} == {"zlib", "delta"}
+
+
+def test_revision_links_are_attached_to_messages(store):
+    store.set("c1", _state())
+    state = store.get("c1")
+    links = state["messages"][-1].additional_kwargs["document_revisions"]
+    assert sorted(links, key=lambda link: link["revision_id"]) == [
+        {"type": "resume", "revision_id": 1},
+        {"type": "cover_letter", "revision_id": 2},
+    ]
+
+
+def _expire_lease(store, job_id):
+    conn = store._get_connection()
+    conn.execute("UPDATE jobs SET lease_expires_at = ? WHERE job_id = ?",
+                 ((datetime.now() - timedelta(seconds=1)).isoformat(), job_id))
+    conn.commit()
+
+
+def test_jobs_are_claimed_once(store):
+    store.create_job("j1", "hash", {"resume": "r"})
+    assert store.claim_job("j1", "worker-a", 60)
+    assert not store.claim_job("j1", "worker-b", 60)
+    assert store.get_unfinished_jobs() == []
+    assert store.renew_job_lease("j1", "worker-a", 60)
+    assert not store.renew_job_lease("j1", "worker-b", 60)
+
+
+def test_expired_lease_can_be_taken_over(store):
+    store.create_job("j1", "hash", {"resume": "r"})
+    store.claim_job("j1", "worker-a", 60)
+    _expire_lease(store, "j1")
+    assert [job["job_id"] for job in store.get_unfinished_jobs()] == ["j1"]
+    assert store.claim_job("j1", "worker-b", 60)
+
+    # The previous owner can no longer renew or record a result
+    assert not store.renew_job_lease("j1", "worker-a", 60)
+    assert not store.update_job("j1", owner="worker-a", status="succeeded")
+    assert store.update_job("j1", owner="worker-b", status="succeeded")
+    assert store.get_job("j1")["status"] == "succeeded"
+
+
+def test_update_job_rejects_unknown_fields(store):
+    store.create_job("j1", "hash", {})
+    assert not store.update_job("j1", bogus="x")
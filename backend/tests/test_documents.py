@@ -0,0 +1,89 @@
+# tests/test_documents.py
+import pytest
+
+from documents import split_sections, diff_sections, describe_changes, parse_patches, apply_patches, PatchError
+
+RESUME = "# Jane Doe\n\n## Experience\nBuilt things.\n\n## Skills\nPython"
+
+
+def test_patch_with_setext_heading_underline():
+    document = "Jane Doe\n==========\n\nExperience\n----------\nBuilt things.\n"
+    reply = (
+        "<<<<<<< SEARCH\nJane Doe\n==========\n=======\n"
+        "Jane Q. Doe\n==========\n>>>>>>> REPLACE"
+    )
+    patches = parse_patches(reply)
+    assert patches == [("Jane Doe\n==========", "Jane Q. Doe\n==========")]
+    assert apply_patches(document, patches) == "Jane Q. Doe\n==========\n\nExperience\n----------\nBuilt things.\n"
+
+
+def test_parse_several_blocks_around_prose():
+    reply = (
+        "Here you go:\n<<<<<<< SEARCH\na\n=======\nb\n>>>>>>> REPLACE\n"
+        "<<<<<<< SEARCH\nc\nd\n=======\n>>>>>>> REPLACE\n"
+    )
+    assert parse_patches(reply) == [("a", "b"), ("c\nd", "")]
+
+
+@pytest.mark.parametrize("reply", [
+    "FULL_REWRITE",
+    "no blocks here",
+    "<<<<<<< SEARCH\n=======\nb\n>>>>>>> REPLACE",
+])
+def test_parse_rejects_unusable_replies(reply):
+    with pytest.raises(PatchError):
+        parse_patches(reply)
+
+
+@pytest.mark.parametrize("document", ["nothing to find", "x\nx"])
+def test_apply_requires_exactly_one_match(document):
+    with pytest.raises(PatchError):
+        apply_patches(document, [("x", "y")])
+
+
+def test_split_sections_by_heading():
+    assert split_sections(RESUME) == [("Jane Doe", ""), ("Experience", "Built things."), ("Skills", "Python")]
+    assert split_sections("Intro line\nEXPERIENCE\nBuilt things.") == [("header", "Intro line"),
+                                                                      ("EXPERIENCE", "Built things.")]
+
+
+def test_split_sections_by_paragraph():
+    letter = "Dear team,\n\nI am keen.\n\nI ship.\n\nThanks"
+    names = [name for name, _ in split_sections(letter)]
+    assert names == ["opening paragraph", "second paragraph", "third paragraph", "closing paragraph"]
+
+
+def test_diff_reports_changed_added_and_removed():
+    after = RESUME.replace("Python", "Python, SQL").replace("## Experience\nBuilt things.\n\n", "")
+    after += "\n\n## Projects\nHitch"
+    diff = diff_sections(RESUME, after)
+    assert diff["changed"] == [("Skills", 1, 1)]
+    assert diff["added"] == ["Projects"]
+    assert diff["removed"] == ["Experience"]
+    assert diff["renamed"] == []
+
+
+def test_diff_reports_a_heading_edit_as_a_rename():
+    diff = diff_sections(RESUME, RESUME.replace("## Experience", "## Work History"))
+    assert diff["renamed"] == [("Experience", "Work History")]
+    assert (diff["added"], diff["removed"], diff["changed"]) == ([], [], [])
+    assert describe_changes("resume", RESUME, RESUME.replace("## Experience", "## Work History")) == (
+        "I've updated your resume: I renamed the Experience section to Work History."
+    )
+
+
+def test_diff_reports_a_new_heading_over_new_text_as_a_replacement():
+    diff = diff_sections(RESUME, RESUME.replace("## Skills\nPython", "## Education\nBSc Physics"))
+    assert diff["renamed"] == []
+    assert (diff["added"], diff["removed"]) == (["Education"], ["Skills"])
+
+
+def test_diff_aligns_rewritten_paragraphs():
+    before = "Dear team,\n\nI am keen.\n\nThanks"
+    diff = diff_sections(before, before.replace("I am keen.", "I am very keen."))
+    assert diff["changed"] == [("second paragraph", 1, 1)]
+    assert (diff["added"], diff["removed"]) == ([], [])
+
+
+def test_describe_unchanged_document():
+    assert "didn't change" in describe_changes("resume", RESUME, RESUME + "\n")
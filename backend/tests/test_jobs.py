@@ -0,0 +1,83 @@
+# tests/test_jobs.py
+import asyncio
+
+from db import AsyncConversationStore, SQLiteConversationStore
+from jobs import JobQueue
+
+
+async def _wait_for(predicate, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not await predicate():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_job_runs_once_across_queues(store):
+    async def scenario():
+        runs = []
+
+        async def handler(job_id, request):
+            runs.append(job_id)
+            await asyncio.sleep(0.05)
+            return {"conversation_id": request["conversation_id"]}
+
+        async_store = AsyncConversationStore(store)
+        other_store = SQLiteConversationStore(store.db_path)
+        queues = [JobQueue(async_store, handler, workers=2),
+                  JobQueue(AsyncConversationStore(other_store), handler, workers=2)]
+        try:
+            for queue in queues:
+                await queue.start()
+            for index in range(4):
+                await queues[0].submit(f"j{index}", f"hash{index}", {"conversation_id": f"c{index}"})
+            # The second queue picks the same jobs up as if sweeping for unfinished work
+            await queues[1]._enqueue_unfinished()
+
+            async def finished():
+                jobs = [await async_store.get_job(f"j{index}") for index in range(4)]
+                return all(job["status"] == "succeeded" for job in jobs)
+
+            await _wait_for(finished)
+        finally:
+            for queue in queues:
+                await queue.stop()
+            other_store.close()
+        return runs, await async_store.get_job("j0")
+
+    runs, job = asyncio.run(scenario())
+    assert sorted(runs) == ["j0", "j1", "j2", "j3"]
+    assert job["conversation_id"] == "c0"
+
+
+def test_lost_lease_stops_the_handler(store):
+    async def scenario():
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def handler(job_id, request):
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return {}
+
+        async_store = AsyncConversationStore(store)
+        queue = JobQueue(async_store, handler, workers=1, lease_seconds=0.15)
+        await queue.start()
+        try:
+            await queue.submit("j1", "hash", {})
+            await asyncio.wait_for(started.wait(), 5)
+            # Another process takes the job over
+            conn = store._get_connection()
+            conn.execute("UPDATE jobs SET owner = 'other' WHERE job_id = 'j1'")
+            conn.commit()
+            await asyncio.wait_for(cancelled.wait(), 5)
+        finally:
+            await queue.stop()
+
+    asyncio.run(scenario())
+    # The stopped run recorded nothing; the job is left to its new owner
+    row = store._get_connection().execute("SELECT status, owner FROM jobs WHERE job_id = 'j1'").fetchone()
+    assert tuple(row) == ("running", "other")
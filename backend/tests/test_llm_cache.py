@@ -0,0 +1,74 @@
+# tests/test_llm_cache.py
+from langchain_core.load import dumps
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration
+
+from llm_cache import TieredLLMCache, bypass_llm_cache
+from providers import FakeChatModel
+
+
+def _model(cache):
+    return FakeChatModel(latency_ms=1, latency_jitter_ms=0, cache=cache)
+
+
+def test_repeated_prompt_is_served_from_memory(tmp_path):
+    cache = TieredLLMCache(str(tmp_path / "llm_cache.db"))
+    model = _model(cache)
+    first = model.invoke([HumanMessage(content="Hello", id="a")])
+    # Message ids differ every turn and must not affect the key
+    second = model.invoke([HumanMessage(content="Hello", id="b")])
+    assert second.content == first.content
+    assert second.id != first.id
+    assert cache.stats()["memory_hits"] == 1
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    path = str(tmp_path / "llm_cache.db")
+    first = _model(TieredLLMCache(path)).invoke("Hello")
+    cache = TieredLLMCache(path)
+    second = _model(cache).invoke("Hello")
+    assert second.content == first.content
+    assert second.id != first.id
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_cached_tool_calls_get_fresh_ids(tmp_path):
+    cache = TieredLLMCache(str(tmp_path / "llm_cache.db"))
+    reply = AIMessage(content="", tool_calls=[{"name": "edit", "args": {"x": 1}, "id": "call_1"}])
+    prompt = dumps([HumanMessage(content="Edit")])
+    cache.update(prompt, "model", [ChatGeneration(message=reply)])
+
+    hits = [cache.lookup(prompt, "model")[0].message for _ in range(2)]
+    ids = {call["id"] for hit in hits for call in hit.tool_calls}
+    assert len(ids) == 2 and "call_1" not in ids
+    assert all(hit.tool_calls[0]["args"] == {"x": 1} for hit in hits)
+
+
+def test_function_call_payload_is_part_of_the_key(tmp_path):
+    cache = TieredLLMCache(str(tmp_path / "llm_cache.db"))
+
+    def prompt(arguments):
+        call = {"function_call": {"name": "edit", "arguments": arguments}}
+        return dumps([AIMessage(content="", additional_kwargs=call), HumanMessage(content="Go on")])
+
+    cache.update(prompt('{"x": 1}'), "model", [ChatGeneration(message=AIMessage(content="one"))])
+    assert cache.lookup(prompt('{"x": 2}'), "model") is None
+    assert cache.lookup(prompt('{"x": 1}'), "model")[0].text == "one"
+
+
+def test_truncated_responses_are_not_cached(tmp_path):
+    cache = TieredLLMCache(str(tmp_path / "llm_cache.db"))
+    reply = AIMessage(content="partial", response_metadata={"finish_reason": "SAFETY"})
+    cache.update("prompt", "model", [ChatGeneration(message=reply)])
+    cache.update("empty", "model", [ChatGeneration(message=AIMessage(content=""))])
+    assert cache.stats()["stores"] == 0
+
+
+def test_bypass_skips_lookup_and_store(tmp_path):
+    cache = TieredLLMCache(str(tmp_path / "llm_cache.db"))
+    model = _model(cache)
+    with bypass_llm_cache():
+        model.invoke("Hello")
+        model.invoke("Hello")
+    assert cache.stats()["stores"] == 0
+    assert cache.stats()["bypassed"] == 2
@@ -0,0 +1,137 @@
+# tests/test_resilience.py
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+import resilience
+from resilience import CircuitBreaker, CircuitOpenError, LatencyTracker, ResilientCaller
+
+
+def test_breaker_opens_after_threshold_and_recovers(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=10)
+
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError) as rejected:
+        breaker.before_call()
+    assert rejected.value.retry_after >= 1
+
+    now[0] += 10
+    assert breaker.state == "half_open"
+    breaker.before_call()
+    # Only one trial call at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_failed_trial_reopens_the_circuit(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=10)
+    breaker.record_failure()
+    now[0] += 10
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def _flaky(failures, error=ConnectionError):
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise error("boom")
+        return "ok"
+
+    return fn, calls
+
+
+def test_transient_errors_are_retried():
+    fn, calls = _flaky(2)
+    caller = ResilientCaller(max_attempts=3, base_delay=0, max_delay=0)
+    assert asyncio.run(caller.call(fn)) == "ok"
+    assert len(calls) == 3
+    assert caller.stats()["retries"] == 2
+    assert caller.breaker.state == "closed"
+
+
+def test_retries_stop_at_max_attempts():
+    fn, calls = _flaky(5)
+    caller = ResilientCaller(max_attempts=3, base_delay=0, max_delay=0)
+    with pytest.raises(ConnectionError):
+        asyncio.run(caller.call(fn))
+    assert len(calls) == 3
+    assert caller.stats()["failures"] == 1
+
+
+def test_other_errors_are_not_retried():
+    fn, calls = _flaky(1, error=ValueError)
+    caller = ResilientCaller(max_attempts=3, base_delay=0, max_delay=0)
+    with pytest.raises(ValueError):
+        asyncio.run(caller.call(fn))
+    assert len(calls) == 1
+    assert caller.breaker.failures == 0
+
+
+def test_attempts_time_out():
+    async def slow():
+        await asyncio.sleep(1)
+
+    caller = ResilientCaller(timeout=0.01, max_attempts=2, base_delay=0, max_delay=0)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(caller.call(slow))
+    assert caller.stats()["timeouts"] == 2
+
+
+def _warm_latency(seconds=0.01):
+    latency = LatencyTracker(min_samples=1)
+    latency.record(seconds)
+    return latency
+
+
+def _slow_then_fast():
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.2 if len(calls) == 1 else 0)
+        return len(calls)
+
+    return fn, calls
+
+
+def test_slow_request_is_hedged():
+    fn, calls = _slow_then_fast()
+    caller = ResilientCaller(timeout=1, hedge_percentile=95, latency=_warm_latency())
+    assert asyncio.run(caller.call(fn)) == 2
+    assert caller.stats()["hedges"] == 1
+    assert caller.stats()["hedge_wins"] == 1
+
+
+def test_time_waiting_for_a_slot_does_not_trigger_a_hedge():
+    @asynccontextmanager
+    async def slow_slot():
+        await asyncio.sleep(0.1)
+        yield
+
+    async def fn():
+        return "ok"
+
+    caller = ResilientCaller(timeout=1, hedge_percentile=95, latency=_warm_latency())
+    assert asyncio.run(caller.call(fn, guard=slow_slot)) == "ok"
+    assert caller.stats()["hedges"] == 0
+
+
+def test_no_hedge_while_busy():
+    fn, calls = _slow_then_fast()
+    caller = ResilientCaller(timeout=1, hedge_percentile=95, latency=_warm_latency(), busy=lambda: True)
+    assert asyncio.run(caller.call(fn)) == 1
+    assert caller.stats()["hedges"] == 0
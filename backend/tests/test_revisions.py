@@ -0,0 +1,47 @@
+# tests/test_revisions.py
+import pytest
+
+from revisions import SNAPSHOT, DELTA, compress_text, decompress_text, make_delta, apply_delta, encode_revision
+
+BASE = "# Jane Doe\n\n## Experience\nBuilt pipelines.\nLed a team.\n\n## Skills\nPython, SQL\n"
+
+
+@pytest.mark.parametrize("target", [
+    BASE,
+    BASE.replace("Led a team.", "Led a team of five."),
+    BASE + "\n## Projects\nHitch\n",
+    "## Skills\nPython, SQL\n",
+    "",
+    "no trailing newline",
+    "naïve résumé ✓\r\nwindows line\r\n",
+])
+def test_delta_round_trip(target):
+    assert apply_delta(BASE, make_delta(BASE, target)) == target
+
+
+def test_compress_round_trip():
+    assert decompress_text(compress_text(BASE)) == BASE
+
+
+def test_first_revision_is_a_snapshot():
+    encoding, payload, depth = encode_revision(None, BASE, 0, 10)
+    assert (encoding, depth) == (SNAPSHOT, 0)
+    assert decompress_text(payload) == BASE
+
+
+def test_small_edit_is_a_delta():
+    target = BASE.replace("Python, SQL", "Python, SQL, Go")
+    encoding, payload, depth = encode_revision(BASE, target, 0, 10)
+    assert (encoding, depth) == (DELTA, 1)
+    assert apply_delta(BASE, payload) == target
+
+
+def test_chain_is_cut_at_the_snapshot_interval():
+    encoding, _, depth = encode_revision(BASE, BASE + "x\n", 9, 10)
+    assert (encoding, depth) == (SNAPSHOT, 0)
+
+
+def test_full_rewrite_falls_back_to_a_snapshot():
+    target = "\n".join(f"completely different line {i}" for i in range(50))
+    encoding, _, depth = encode_revision("short", target, 0, 10)
+    assert (encoding, depth) == (SNAPSHOT, 0)
@@ -2,14 +2,48 @@ import axios from 'axios';
 
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000/api';
 
+const JOB_POLL_INTERVAL_MS = 1000;
+
+// Get the status of a document generation job, with any documents generated so far
+export const getJobStatus = async (jobId) => {
+  try {
+    const response = await axios.get(`${API_URL}/jobs/${jobId}`);
+    return response.data;
+  } catch (error) {
+    console.error('API Error fetching job status:', error.response?.data || error.message);
+    throw error;
+  }
+};
+
+// Poll a job until it finishes; onProgress receives each intermediate status
+const waitForJob = async (jobId, onProgress) => {
+  for (;;) {
+    const job = await getJobStatus(jobId);
+    if (job.status === 'succeeded') {
+      return job;
+    }
+    if (job.status === 'failed') {
+      throw new Error(job.error || 'Processing the application failed');
+    }
+    if (onProgress) {
+      onProgress(job);
+    }
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+  }
+};
+
 // Process job application data
-export const processApplication = async (jobDescription, resume, personalSummary) => {
+export const processApplication = async (jobDescription, resume, personalSummary, onProgress) => {
   try {
     const response = await axios.post(`${API_URL}/process`, {
       job_description: jobDescription,
       resume: resume,
       personal_summary: personalSummary
     });
+    // The server queues generation and answers 202 with a job to poll
+    if (response.status === 202) {
+      return await waitForJob(response.data.job_id, onProgress);
+    }
     return response.data;
   } catch (error) {
     console.error('API Error processing application:', error.response?.data || error.message);